@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+_WHITESPACE_RE = re.compile(r'[ \t]+')
+
+
+def normalize_transcript(transcript: str) -> str:
+    """
+    Normalize a transcript so trivially different deliveries share a cache key
+
+    Line endings are unified, runs of spaces/tabs collapsed, each line stripped
+    and blank lines dropped.
+    """
+    lines = transcript.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    normalized = (_WHITESPACE_RE.sub(' ', line).strip() for line in lines)
+    return '\n'.join(line for line in normalized if line)
+
+
+def make_cache_key(transcript: str, system_prompt: str, model: str, temperature: float) -> str:
+    """Content hash of everything that determines the analysis output"""
+    payload = json.dumps(
+        [normalize_transcript(transcript), system_prompt, model, temperature],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for analysis results
+
+    An in-memory LRU tier answers repeated lookups within a process and a
+    SQLite tier shares results across processes and restarts. Both tiers
+    expire entries after ``ttl_seconds`` and evict least-recently-used entries
+    once they exceed their size limit.
+
+    Args:
+        path (str): SQLite database path, or None for a memory-only cache
+        memory_size (int): Maximum number of entries in the memory tier
+        disk_size (int): Maximum number of entries in the SQLite tier
+        ttl_seconds (float): Entry lifetime (0 disables expiry)
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 256,
+                 disk_size: int = 10000, ttl_seconds: float = 7 * 24 * 3600):
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl_seconds = ttl_seconds
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_cache ('
+                ' key TEXT PRIMARY KEY,'
+                ' value TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            )
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache (accessed_at)'
+            )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached result, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return json.loads(value)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT value, created_at FROM analysis_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._expired(created_at, now):
+                        self._db.execute(
+                            'UPDATE analysis_cache SET accessed_at = ? WHERE key = ?', (now, key)
+                        )
+                        self._remember(key, value, created_at)
+                        self.disk_hits += 1
+                        return json.loads(value)
+                    self._db.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        """Store an analysis result in both tiers"""
+        value = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO analysis_cache (key, value, created_at, accessed_at)'
+                    ' VALUES (?, ?, ?, ?)',
+                    (key, value, now, now)
+                )
+                self._evict_disk(now)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM analysis_cache')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self, now: float):
+        if self.ttl_seconds:
+            cursor = self._db.execute(
+                'DELETE FROM analysis_cache WHERE created_at < ?', (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+        count = self._db.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+        if count > self.disk_size:
+            cursor = self._db.execute(
+                'DELETE FROM analysis_cache WHERE key IN ('
+                ' SELECT key FROM analysis_cache ORDER BY accessed_at LIMIT ?)',
+                (count - self.disk_size,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+
+def cache_from_env() -> Optional[AnalysisCache]:
+    """Build the analysis cache from environment settings (None when disabled)"""
+    if os.environ.get('ANALYSIS_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+    return AnalysisCache(
+        path=os.environ.get('ANALYSIS_CACHE_PATH', 'cache/analysis_cache.db') or None,
+        memory_size=int(os.environ.get('ANALYSIS_CACHE_MEMORY_SIZE', '256')),
+        disk_size=int(os.environ.get('ANALYSIS_CACHE_DISK_SIZE', '10000')),
+        ttl_seconds=float(os.environ.get('ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+    )
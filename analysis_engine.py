@@ -1,26 +1,45 @@
-import openai
+import asyncio
 import json
 import os
-from typing import Dict, Any
-
-# Initialize OpenAI client
-client = openai.OpenAI(
-    api_key=os.environ.get('OPENAI_API_KEY'),
-    base_url=os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from analysis_cache import make_cache_key, cache_from_env
+from analysis_schema import (
+    ANALYSIS_SCHEMA, CATEGORY_SCHEMA, SUMMARY_SCHEMA,
+    response_format, validate_category, invalid_categories, without_properties
+)
+from rate_limiter import backoff_delay, limiter_from_env
+from resilience import (
+    CircuitOpenError, DeadlineExceeded, breaker_from_env, hedge_policy_from_env,
+    hedged_call, hedged_call_async
 )
+from metrics import record_openai_response
+from model_router import router_from_env
+from streaming_parser import IncrementalAnalysisParser, salvage_categories
+from token_counter import count_tokens
+from pre_analysis import PRE_ANALYSIS, pre_analyze, format_hints, apply_pre_analysis
+from rubric import CATEGORY_WEIGHTS, CATEGORY_CRITERIA, apply_rubric, overall_score, prompt_lines
+from transcript_formatter import split_legend
+from transcript_chunker import chunk_transcript, reduce_chunk_results
 
-def analyze_call(transcript: str) -> Dict[str, Any]:
-    """
-    Analyze a sales call transcript using OpenAI API
-    
-    Args:
-        transcript (str): The formatted transcript text
-        
-    Returns:
-        Dict containing analysis results with scores and feedback
-    """
-    
-    system_prompt = """You are a sales coaching expert specializing in fitness coaching. Your task is to analyze a transcript of a sales call and evaluate the coach's performance based on a provided sales framework and scoring rubric. Your analysis should be objective, insightful, and actionable.
+# Per-attempt timeout and overall deadline (including retries) for OpenAI calls
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', '60'))
+OPENAI_DEADLINE = float(os.environ.get('OPENAI_DEADLINE', '180'))
+
+# The openai package (httpx, pydantic) is imported on first use, so workers
+# can answer /health before it has loaded; see get_client()
+_client = None
+_client_lock = threading.Lock()
+
+# Model settings (part of the analysis cache key); MODEL is the full route of the model router
+MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4.1-mini')
+TEMPERATURE = 0.3
+MAX_TOKENS = 4000
+
+SYSTEM_PROMPT = """You are a sales coaching expert specializing in fitness coaching. Your task is to analyze a transcript of a sales call and evaluate the coach's performance based on a provided sales framework and scoring rubric. Your analysis should be objective, insightful, and actionable.
 
 The coach follows this sales framework:
 - Where are they now?: Understand current situation
@@ -31,12 +50,7 @@ The coach follows this sales framework:
 - Reinforce their decision: Reassure them after they commit
 
 Scoring Categories (weights):
-- Needs Discovery (25 points): Did the coach effectively uncover the client's goals, struggles, and current situation?
-- Pain Point Exploration (25 points): How well did the coach dig into the client's pain points and their impact?
-- Consequence & Urgency (15 points): Did the coach effectively communicate consequences of inaction and create urgency?
-- Obstacle Handling (15 points): How well did the coach address potential obstacles and concerns before the pitch?
-- Objection Handling (10 points): How effectively did the coach handle objections after the pitch?
-- Next Steps & Closing (10 points): How clearly were next steps outlined and buying decision reinforced?
+""" + prompt_lines() + """
 
 For each category, provide:
 1. Score (1-10)
@@ -62,53 +76,827 @@ Return your analysis as a JSON object with this structure:
   "summary": "Overall assessment of the call..."
 }"""
 
-    user_prompt = f"""Please analyze this fitness coaching sales call transcript:
+CATEGORY_SYSTEM_PROMPT = """You are a sales coaching expert specializing in fitness coaching. Your task is to evaluate ONE category of the coach's performance in a sales call transcript. Your analysis should be objective, insightful, and actionable.
+
+The coach follows this sales framework: Where are they now?, Clarify & Label, Overview Past Experiences, Sell the Vacation, Explain away their concerns, Reinforce their decision.
+
+Category: {category} ({weight} points)
+{criteria}
+{extra}
+Return only a JSON object with this structure, with at most 3 concise items per list:
+{{
+  "score": 8,
+  "highlights": ["Specific examples..."],
+  "missed_opportunities": ["Specific examples..."],
+  "feedback": ["Specific suggestions..."]
+}}"""
+
+SUMMARY_SYSTEM_PROMPT = """You are a sales coaching expert specializing in fitness coaching. Read the sales call transcript and return only a JSON object with this structure:
+{
+  "payment_detected": "PIF",
+  "summary": "Two or three sentence overall assessment of the call..."
+}
+
+payment_detected must be one of "PIF" (Pay In Full), "Split Pay", "Monthly" or "Unknown" if no payment method was agreed."""
+
+# Analysis mode: "single" sends one request for the whole rubric, "per_category"
+# sends one small request per category plus a summary request, concurrently
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'single')
+CATEGORY_MAX_TOKENS = int(os.environ.get('CATEGORY_MAX_TOKENS', '600'))
+SUMMARY_MAX_TOKENS = int(os.environ.get('SUMMARY_MAX_TOKENS', '300'))
+
+# Structured output: "json_schema" (strict schema), "json_object" (JSON mode) or "off"
+STRUCTURED_OUTPUT = os.environ.get('STRUCTURED_OUTPUT', 'json_schema')
+
+# Long-transcript (map-reduce) mode settings
+LONG_TRANSCRIPT_TOKENS = int(os.environ.get('LONG_TRANSCRIPT_TOKENS', '12000'))
+CHUNK_TOKENS = int(os.environ.get('CHUNK_TOKENS', '6000'))
+CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', '2000'))
+CHUNK_WORKERS = int(os.environ.get('CHUNK_WORKERS', '4'))
+
+# Retries for rate-limited or transient API failures
+MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', '5'))
+_retryable_errors: Optional[tuple] = None
+
+# Shared analysis result cache (None when disabled)
+analysis_cache = cache_from_env()
+
+# Shared request/token budget for every OpenAI call made by this process
+rate_limiter = limiter_from_env()
+
+# Fails fast while the API is degraded; see resilience.py
+circuit_breaker = breaker_from_env()
+
+# Optional hedged requests against tail latency, and the threads that run them
+hedge_policy = hedge_policy_from_env()
+hedge_executor = ThreadPoolExecutor(max_workers=rate_limiter.max_in_flight * 2, thread_name_prefix='openai-hedge')
+
+# Picks a fast or full model per call from local features (None unless MODEL_ROUTING is on)
+model_router = router_from_env(MODEL, MAX_TOKENS)
+
+# Async clients are bound to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+def _openai():
+    """Import and return the openai module (cached in sys.modules after the first call)"""
+    import openai
+    return openai
+
+def retryable_errors() -> tuple:
+    """OpenAI exception types worth retrying (rate limits and transient failures)"""
+    global _retryable_errors
+    if _retryable_errors is None:
+        openai = _openai()
+        _retryable_errors = (
+            openai.RateLimitError,
+            openai.APIConnectionError,
+            openai.APITimeoutError,
+            openai.InternalServerError
+        )
+    return _retryable_errors
+
+def _is_rate_limit(error: BaseException) -> bool:
+    return isinstance(error, _openai().RateLimitError)
+
+def get_client():
+    """Return the shared synchronous OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _openai().OpenAI(
+                    api_key=os.environ.get('OPENAI_API_KEY'),
+                    base_url=os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+                    max_retries=0,  # retries are handled below so they respect the shared rate limiter
+                    timeout=OPENAI_TIMEOUT
+                )
+    return _client
+
+def get_async_client():
+    """Return the AsyncOpenAI client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        async_client = _openai().AsyncOpenAI(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            base_url=os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+            max_retries=0,
+            timeout=OPENAI_TIMEOUT
+        )
+        _async_clients[loop] = async_client
+    return async_client
+
+def _run_async(coro):
+    """
+    Run a coroutine from sync code on a fresh event loop (asyncio.run)
+
+    The loop's AsyncOpenAI client is closed before the loop is, so its
+    connection pool does not outlive the run.
+    """
+    async def run():
+        try:
+            return await coro
+        finally:
+            async_client = _async_clients.pop(asyncio.get_running_loop(), None)
+            if async_client is not None:
+                await async_client.close()
+    return asyncio.run(run())
+
+def analyze_call(transcript: str, use_cache: bool = True, mode: Optional[str] = None,
+                 defer_when_open: bool = False) -> Dict[str, Any]:
+    """
+    Analyze a sales call transcript using OpenAI API
+    
+    Transcripts longer than LONG_TRANSCRIPT_TOKENS are split into chunks that
+    are analyzed concurrently and reduced into a single result.
+    
+    Args:
+        transcript (str): The formatted transcript text
+        use_cache (bool): Set to False to bypass the analysis cache
+        mode (str): "single" or "per_category" (defaults to ANALYSIS_MODE)
+        defer_when_open (bool): Raise CircuitOpenError instead of returning an
+            error result while the circuit breaker is open, so the caller can retry later
+        
+    Returns:
+        Dict containing analysis results with scores and feedback
+    """
+    
+    mode = mode or ANALYSIS_MODE
+    facts = pre_analyze(transcript) if PRE_ANALYSIS else None
+    try:
+        # Cached results are re-finalized too, so a malformed entry fails like a fresh result would
+        cache_key, cached = _lookup_cache(transcript, use_cache, mode)
+        if cached is not None:
+            return _finalize(cached, facts)
+        
+        if count_tokens(transcript) > LONG_TRANSCRIPT_TOKENS:
+            analysis_results = analyze_long_call(transcript)
+        elif mode == 'per_category':
+            analysis_results = _run_async(analyze_per_category_async(transcript))
+        else:
+            analysis_results = analyze_single(transcript, facts)
+        
+        analysis_results = _finalize(analysis_results, facts)
+        _store_cache(cache_key, analysis_results)
+        return analysis_results
+        
+    except CircuitOpenError as e:
+        if defer_when_open:
+            raise
+        return _analysis_error(e, facts)
+    except Exception as e:
+        return _analysis_error(e, facts)
+
+async def analyze_call_async(transcript: str, use_cache: bool = True,
+                             mode: Optional[str] = None, defer_when_open: bool = False) -> Dict[str, Any]:
+    """
+    Async version of analyze_call built on AsyncOpenAI
+    
+    Shares the cache and rate limiter with analyze_call, so sync and async
+    callers in the same process draw from one request/token budget.
+    
+    Args:
+        transcript (str): The formatted transcript text
+        use_cache (bool): Set to False to bypass the analysis cache
+        mode (str): "single" or "per_category" (defaults to ANALYSIS_MODE)
+        defer_when_open (bool): Raise CircuitOpenError while the circuit breaker is open
+        
+    Returns:
+        Dict containing analysis results with scores and feedback
+    """
+    
+    mode = mode or ANALYSIS_MODE
+    facts = pre_analyze(transcript) if PRE_ANALYSIS else None
+    try:
+        cache_key, cached = _lookup_cache(transcript, use_cache, mode)
+        if cached is not None:
+            return _finalize(cached, facts)
+        
+        if count_tokens(transcript) > LONG_TRANSCRIPT_TOKENS:
+            analysis_results = await analyze_long_call_async(transcript)
+        elif mode == 'per_category':
+            analysis_results = await analyze_per_category_async(transcript)
+        else:
+            analysis_results = await analyze_single_async(transcript, facts)
+        
+        analysis_results = _finalize(analysis_results, facts)
+        _store_cache(cache_key, analysis_results)
+        return analysis_results
+        
+    except CircuitOpenError as e:
+        if defer_when_open:
+            raise
+        return _analysis_error(e, facts)
+    except Exception as e:
+        return _analysis_error(e, facts)
+
+def analyze_single(transcript: str, facts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Analyze the whole rubric in one request, on the model the router picks
+
+    Without a router every call goes to MODEL. A fast-route result that
+    fails validation is redone on the full route when escalation is on;
+    whatever is still invalid is then repaired category by category.
+    """
+    prompt = build_user_prompt(transcript, facts)
+    schema = analysis_schema(facts)
+    if model_router is None:
+        analysis_results = request_analysis(prompt, schema=schema)
+    else:
+        route, score = model_router.choose(transcript, facts)
+        analysis_results, seconds, usage = _routed_request(route, prompt, schema)
+        escalate = route['name'] == 'fast' and model_router.escalate and any(_repair_needed(analysis_results))
+        model_router.record(route, seconds, usage, escalated=escalate)
+        if escalate:
+            print(f"Fast route output failed validation (complexity {score:.2f}), escalating to {MODEL}")
+            route = model_router.routes['full']
+            analysis_results, seconds, usage = _routed_request(route, prompt, schema)
+            model_router.record(route, seconds, usage)
+    if any(_repair_needed(analysis_results)):
+        analysis_results = _run_async(repair_analysis_async(analysis_results, transcript))
+    return analysis_results
+
+async def analyze_single_async(transcript: str, facts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Async variant of analyze_single"""
+    prompt = build_user_prompt(transcript, facts)
+    schema = analysis_schema(facts)
+    if model_router is None:
+        analysis_results = await request_analysis_async(prompt, schema=schema)
+    else:
+        route, score = model_router.choose(transcript, facts)
+        analysis_results, seconds, usage = await _routed_request_async(route, prompt, schema)
+        escalate = route['name'] == 'fast' and model_router.escalate and any(_repair_needed(analysis_results))
+        model_router.record(route, seconds, usage, escalated=escalate)
+        if escalate:
+            print(f"Fast route output failed validation (complexity {score:.2f}), escalating to {MODEL}")
+            route = model_router.routes['full']
+            analysis_results, seconds, usage = await _routed_request_async(route, prompt, schema)
+            model_router.record(route, seconds, usage)
+    return await repair_analysis_async(analysis_results, transcript)
+
+def _routed_request(route: Dict[str, Any], prompt: str, schema: Dict[str, Any]):
+    """Request an analysis on one route; returns the result, seconds taken and token usage"""
+    usage: Dict[str, int] = {}
+    started = time.monotonic()
+    try:
+        analysis_results = request_analysis(prompt, route['max_tokens'], schema=schema,
+                                            model=route['model'], usage=usage)
+    except Exception as e:
+        model_router.record(route, time.monotonic() - started, usage, error=e)
+        raise
+    return analysis_results, time.monotonic() - started, usage
+
+async def _routed_request_async(route: Dict[str, Any], prompt: str, schema: Dict[str, Any]):
+    usage: Dict[str, int] = {}
+    started = time.monotonic()
+    try:
+        analysis_results = await request_analysis_async(prompt, route['max_tokens'], schema=schema,
+                                                        model=route['model'], usage=usage)
+    except Exception as e:
+        model_router.record(route, time.monotonic() - started, usage, error=e)
+        raise
+    return analysis_results, time.monotonic() - started, usage
+
+def _lookup_cache(transcript: str, use_cache: bool, mode: str = 'single'):
+    if not use_cache or analysis_cache is None:
+        return None, None
+    # Each mode has its own prompts, so results are keyed on the prompts actually used
+    system_prompt = SYSTEM_PROMPT
+    model = MODEL
+    if mode == 'per_category':
+        system_prompt = CATEGORY_SYSTEM_PROMPT + SUMMARY_SYSTEM_PROMPT
+    elif model_router is not None:
+        # The route is a function of the transcript, so the routing settings complete the key
+        model = f"{MODEL}+{model_router.cache_tag}"
+    cache_key = make_cache_key(transcript, system_prompt, model, TEMPERATURE)
+    return cache_key, analysis_cache.get(cache_key)
+
+def _store_cache(cache_key, analysis_results: Dict[str, Any]):
+    # Only cache results that parsed cleanly and completely
+    incomplete = ('raw_analysis', 'partial', 'chunks_failed', 'categories_failed')
+    if cache_key is not None and not any(key in analysis_results for key in incomplete):
+        analysis_cache.set(cache_key, analysis_results)
+
+def _finalize(analysis_results: Dict[str, Any], facts: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge the local pre-analysis and recompute the overall score from the rubric"""
+    return apply_rubric(apply_pre_analysis(analysis_results, facts))
+
+def finalize_results(analysis_results: Dict[str, Any], transcript: str) -> Dict[str, Any]:
+    """Apply pre-analysis and the rubric to results assembled outside analyze_call (e.g. live segments)"""
+    facts = pre_analyze(transcript) if PRE_ANALYSIS else None
+    return _finalize(analysis_results, facts)
+
+def _analysis_error(e: Exception, facts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    print(f"Error in analysis: {str(e)}")
+    # Locally computed payment detection and call stats survive an API outage
+    return apply_pre_analysis({
+        "error": str(e),
+        "overall_score": 0,
+        "categories": {},
+        "summary": "Analysis failed due to an error."
+    }, facts)
+
+def analysis_schema(facts: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Response schema for a full analysis, minus fields already known from pre-analysis"""
+    if facts is not None and facts['payment_detected'] != 'Unknown':
+        return without_properties(ANALYSIS_SCHEMA, 'payment_detected')
+    return ANALYSIS_SCHEMA
+
+def build_user_prompt(transcript: str, facts: Optional[Dict[str, Any]] = None) -> str:
+    hints = format_hints(facts) if facts is not None else ''
+    if hints:
+        transcript = f"{transcript}\n\n{hints}"
+    return f"""Please analyze this fitness coaching sales call transcript:
 
 {transcript}
 
 Provide a detailed analysis following the scoring rubric and return the results in the specified JSON format."""
 
+def build_chunk_prompt(chunk: Dict[str, Any], index: int, total: Optional[int], legend: str = '') -> str:
+    """Prompt for one part of a transcript (``total`` is None while a live call is still running)"""
+    stages = ', '.join(chunk['stages']) or 'no clear framework stage'
+    text = f"{legend}\n{chunk['text']}" if legend else chunk['text']
+    part = f"part {index} of {total} of a long" if total else f"part {index} of an ongoing"
+    return f"""Please analyze {part} fitness coaching sales call transcript. This part covers: {stages}.
+
+{text}
+
+Score each category only on the evidence in this part. If this part contains no evidence for a category, set its score to null and leave its lists empty. Return the results in the specified JSON format."""
+
+def build_category_prompt(key: str, extra: str = '') -> str:
+    return CATEGORY_SYSTEM_PROMPT.format(
+        category=key.replace('_', ' ').title(),
+        weight=CATEGORY_WEIGHTS[key],
+        criteria=CATEGORY_CRITERIA[key],
+        extra=extra
+    )
+
+def _chat_request(user_prompt: str, max_tokens: int, system_prompt: str = SYSTEM_PROMPT,
+                  schema: Optional[Dict[str, Any]] = ANALYSIS_SCHEMA, model: str = MODEL) -> Dict[str, Any]:
+    request = {
+        'model': model,
+        'messages': [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        'temperature': TEMPERATURE,
+        'max_tokens': max_tokens
+    }
+    if STRUCTURED_OUTPUT != 'off':
+        # Requests without a fixed schema (e.g. chunk scores that may be null) still get JSON mode
+        mode = STRUCTURED_OUTPUT if schema is not None else 'json_object'
+        request['response_format'] = response_format('sales_call_analysis', schema, mode)
+    return request
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Tokens a request counts against the TPM limit: prompt plus the full completion budget"""
+    prompt_tokens = sum(count_tokens(message['content']) + 4 for message in request['messages'])
+    return prompt_tokens + request['max_tokens']
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait, from the Retry-After(-ms) headers"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=4000
-        )
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return None
+
+def _handle_retry(error: Exception, attempt: int) -> float:
+    """Return how long to back off before retrying, or re-raise if out of retries"""
+    if attempt >= MAX_RETRIES:
+        raise error
+    retry_after = _retry_after(error)
+    if _is_rate_limit(error):
+        # Hold back every caller, not just this one, so concurrent jobs do not all hit 429
+        rate_limiter.pause(retry_after or 1.0)
+    delay = backoff_delay(attempt, retry_after)
+    print(f"OpenAI request failed ({type(error).__name__}), retrying in {delay:.1f}s")
+    return delay
+
+def _attempt_timeout(deadline: float) -> float:
+    """Timeout for the next attempt, or DeadlineExceeded once the overall deadline has passed"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        hedge_policy.record_deadline()
+        raise DeadlineExceeded(f"OpenAI request exceeded its {OPENAI_DEADLINE:.0f}s deadline")
+    return min(OPENAI_TIMEOUT, remaining)
+
+def _hedge_delay(request: Dict[str, Any]) -> Optional[float]:
+    # Never hedge into a saturated limiter; the copy would only queue behind real work
+    if rate_limiter.in_flight >= rate_limiter.max_in_flight:
+        return None
+    return hedge_policy.delay(request['max_tokens'])
+
+def _record_outcome(request: Dict[str, Any], started: float, response=None, error: Optional[Exception] = None):
+    """Feed one attempt into metrics, the circuit breaker and the hedge latency tracker"""
+    seconds = time.monotonic() - started
+    record_openai_response(request['model'], seconds, response, error)
+    if error is None:
+        circuit_breaker.record(True)
+        hedge_policy.observe(request['max_tokens'], seconds)
+    elif not _is_rate_limit(error):
+        # 429s are our quota, handled by the rate limiter; they say nothing about API health
+        circuit_breaker.record(False)
+
+def _create_completion(request: Dict[str, Any], tokens: int, timeout: float):
+    """One chat completion attempt under the rate limiter"""
+    rate_limiter.acquire(tokens)
+    started = time.monotonic()
+    try:
+        response = get_client().chat.completions.create(timeout=timeout, **request)
+    except retryable_errors() as e:
+        _record_outcome(request, started, error=e)
+        raise
+    finally:
+        rate_limiter.release()
+    _record_outcome(request, started, response)
+    return response
+
+async def _create_completion_async(request: Dict[str, Any], tokens: int, timeout: float):
+    await rate_limiter.acquire_async(tokens)
+    started = time.monotonic()
+    try:
+        response = await get_async_client().chat.completions.create(timeout=timeout, **request)
+    except retryable_errors() as e:
+        _record_outcome(request, started, error=e)
+        raise
+    finally:
+        rate_limiter.release()
+    _record_outcome(request, started, response)
+    return response
+
+def request_analysis(user_prompt: str, max_tokens: int = MAX_TOKENS, system_prompt: str = SYSTEM_PROMPT,
+                     schema: Optional[Dict[str, Any]] = ANALYSIS_SCHEMA, model: str = MODEL,
+                     usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Send one analysis request and parse the JSON response
+    
+    The request waits for rate limiter capacity and retries transient errors
+    with exponential backoff, all within OPENAI_DEADLINE. A slow attempt may
+    be hedged with a second copy, and CircuitOpenError is raised without
+    calling the API while the circuit breaker is open. Malformed output falls
+    back to parse_text_analysis. Token usage of the response is added to
+    ``usage`` when given.
+    """
+    request = _chat_request(user_prompt, max_tokens, system_prompt, schema, model)
+    tokens = estimate_request_tokens(request)
+    deadline = time.monotonic() + OPENAI_DEADLINE
+    
+    attempt = 0
+    while True:
+        # Checked after the deadline so an expired request never takes the half-open probe
+        timeout = _attempt_timeout(deadline)
+        probe = circuit_breaker.check()
+        try:
+            response = hedged_call(
+                lambda: _create_completion(request, tokens, timeout),
+                _hedge_delay(request), hedge_executor, hedge_policy
+            )
+            break
+        except retryable_errors() as e:
+            delay = _handle_retry(e, attempt)
+        finally:
+            circuit_breaker.release_probe(probe)
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        attempt += 1
+    
+    _add_usage(usage, response)
+    # Parse the JSON response
+    analysis_text = response.choices[0].message.content
+    return parse_analysis_response(analysis_text)
+
+async def request_analysis_async(user_prompt: str, max_tokens: int = MAX_TOKENS, system_prompt: str = SYSTEM_PROMPT,
+                                 schema: Optional[Dict[str, Any]] = ANALYSIS_SCHEMA, model: str = MODEL,
+                                 usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Async variant of request_analysis using AsyncOpenAI"""
+    request = _chat_request(user_prompt, max_tokens, system_prompt, schema, model)
+    tokens = estimate_request_tokens(request)
+    deadline = time.monotonic() + OPENAI_DEADLINE
+    
+    attempt = 0
+    while True:
+        timeout = _attempt_timeout(deadline)
+        probe = circuit_breaker.check()
+        try:
+            response = await hedged_call_async(
+                lambda: _create_completion_async(request, tokens, timeout),
+                _hedge_delay(request), hedge_policy
+            )
+            break
+        except retryable_errors() as e:
+            delay = _handle_retry(e, attempt)
+        finally:
+            circuit_breaker.release_probe(probe)
+        await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        attempt += 1
+    
+    _add_usage(usage, response)
+    analysis_text = response.choices[0].message.content
+    return parse_analysis_response(analysis_text)
+
+def _add_usage(usage: Optional[Dict[str, int]], response):
+    if usage is None:
+        return
+    counts = getattr(response, 'usage', None)
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        usage[kind] = usage.get(kind, 0) + (getattr(counts, kind, 0) or 0)
+
+def stream_analysis(transcript: str, use_cache: bool = True) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream an analysis, yielding events as each category is completed
+    
+    Yields ``(event, payload)`` tuples: ``('category', {key, data})`` for each
+    category that streams in valid, ``('invalid', {key, errors})`` for ones
+    that fail validation, ``('repaired', {key, data})`` once those have been
+    re-requested, and finally ``('result', analysis_results)``. Long
+    transcripts and the per-category mode are not streamed and only yield the
+    final result.
+    """
+    facts = pre_analyze(transcript) if PRE_ANALYSIS else None
+    parser = IncrementalAnalysisParser()
+    try:
+        cache_key, cached = _lookup_cache(transcript, use_cache, ANALYSIS_MODE)
+        if cached is not None:
+            cached = _finalize(cached, facts)
+            for key, data in (cached.get('categories') or {}).items():
+                yield 'category', {'key': key, 'data': data}
+            yield 'result', cached
+            return
+        
+        if ANALYSIS_MODE != 'single' or count_tokens(transcript) > LONG_TRANSCRIPT_TOKENS:
+            yield 'result', analyze_call(transcript, use_cache=use_cache)
+            return
         
-        # Parse the JSON response
-        analysis_text = response.choices[0].message.content
+        request = _chat_request(build_user_prompt(transcript, facts), MAX_TOKENS, schema=analysis_schema(facts))
+        for delta in _stream_completion(request):
+            for event, key, payload in parser.feed(delta):
+                if event == 'category':
+                    yield 'category', {'key': key, 'data': payload}
+                else:
+                    yield 'invalid', {'key': key, 'errors': payload}
         
-        # Try to extract JSON from the response
+        analysis_results = parser.result()
+        if analysis_results is None:
+            analysis_results = parse_analysis_response(parser.text)
+        
+        if any(_repair_needed(analysis_results)):
+            analysis_results = _run_async(repair_analysis_async(analysis_results, transcript))
+            for key in analysis_results.get('repaired_categories', []):
+                yield 'repaired', {'key': key, 'data': analysis_results['categories'][key]}
+        
+        analysis_results = _finalize(analysis_results, facts)
+        _store_cache(cache_key, analysis_results)
+        yield 'result', analysis_results
+        
+    except Exception as e:
+        yield 'result', _analysis_error(e, facts)
+
+def _stream_completion(request: Dict[str, Any]) -> Iterator[str]:
+    """Yield content deltas from a streamed chat completion, retrying failures before the first token"""
+    tokens = estimate_request_tokens(request)
+    deadline = time.monotonic() + OPENAI_DEADLINE
+    
+    attempt = 0
+    streamed = False
+    while True:
+        timeout = _attempt_timeout(deadline)
+        probe = circuit_breaker.check()
+        try:
+            rate_limiter.acquire(tokens)
+        except BaseException:
+            circuit_breaker.release_probe(probe)
+            raise
+        started = time.monotonic()
         try:
-            # Look for JSON in the response
-            start_idx = analysis_text.find('{')
-            end_idx = analysis_text.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = analysis_text[start_idx:end_idx]
-                analysis_results = json.loads(json_str)
-            else:
-                # Fallback: create structured response from text
-                analysis_results = parse_text_analysis(analysis_text)
-                
-        except json.JSONDecodeError:
-            # Fallback: create structured response from text
-            analysis_results = parse_text_analysis(analysis_text)
+            # The timeout applies per read, so a stalled stream fails instead of hanging
+            stream = get_client().chat.completions.create(stream=True, timeout=timeout, **request)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    streamed = True
+                    yield chunk.choices[0].delta.content
+            # Streamed responses carry no usage block, so only latency is recorded
+            _record_outcome(request, started)
+            return
+        except retryable_errors() as e:
+            _record_outcome(request, started, error=e)
+            # Once output has been yielded a retry would duplicate it
+            if streamed:
+                raise
+            delay = _handle_retry(e, attempt)
+        finally:
+            rate_limiter.release()
+            circuit_breaker.release_probe(probe)
+        time.sleep(delay)
+        attempt += 1
+
+def parse_analysis_response(analysis_text: str) -> Dict[str, Any]:
+    """Extract the JSON analysis from the model's response text"""
+    try:
+        # Look for JSON in the response
+        start_idx = analysis_text.find('{')
+        end_idx = analysis_text.rfind('}') + 1
         
-        return analysis_results
+        if start_idx != -1 and end_idx != -1:
+            json_str = analysis_text[start_idx:end_idx]
+            return json.loads(json_str)
+        
+        # Fallback: create structured response from text
+        return parse_text_analysis(analysis_text)
         
+    except json.JSONDecodeError:
+        # Keep whichever categories did come through intact so only the rest need repairing
+        salvaged = salvage_categories(analysis_text)
+        if salvaged:
+            return {
+                "overall_score": 0,
+                "categories": salvaged,
+                "payment_detected": "Unknown",
+                "summary": "",
+                "partial": True
+            }
+        # Fallback: create structured response from text
+        return parse_text_analysis(analysis_text)
+
+def analyze_long_call(transcript: str) -> Dict[str, Any]:
+    """
+    Map-reduce analysis for transcripts that are too long for one request
+    
+    The transcript is split on speaker turns along framework stage
+    boundaries, the chunks are analyzed concurrently and the partial results
+    are reduced into the standard analysis schema.
+    """
+    # Every chunk needs the speaker legend of a compacted transcript
+    legend, body = split_legend(transcript)
+    chunks = chunk_transcript(body, CHUNK_TOKENS)
+    print(f"Long transcript: analyzing {len(chunks)} chunks")
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(chunks)))) as executor:
+        futures = [
+            executor.submit(
+                request_analysis, build_chunk_prompt(chunk, i + 1, len(chunks), legend), CHUNK_MAX_TOKENS,
+                schema=None
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+    
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append(future.result())
+        except Exception as e:
+            outcomes.append(e)
+    return _reduce_chunk_outcomes(chunks, outcomes)
+
+async def analyze_long_call_async(transcript: str) -> Dict[str, Any]:
+    """Async variant of analyze_long_call; concurrency is bounded by the rate limiter"""
+    legend, body = split_legend(transcript)
+    chunks = chunk_transcript(body, CHUNK_TOKENS)
+    print(f"Long transcript: analyzing {len(chunks)} chunks")
+    
+    outcomes = await asyncio.gather(*[
+        request_analysis_async(build_chunk_prompt(chunk, i + 1, len(chunks), legend), CHUNK_MAX_TOKENS,
+                               schema=None)
+        for i, chunk in enumerate(chunks)
+    ], return_exceptions=True)
+    return _reduce_chunk_outcomes(chunks, outcomes)
+
+async def analyze_per_category_async(transcript: str) -> Dict[str, Any]:
+    """
+    Score each rubric category with its own small, concurrent request
+    
+    One request per category with a tight output budget plus a cheap
+    summary/payment request run concurrently, so wall-clock time tracks the
+    slowest category instead of the total output length. Results are merged
+    into the same schema as the single-request analysis.
+    """
+    keys = list(CATEGORY_WEIGHTS)
+    outcomes = await asyncio.gather(
+        *[_request_category(transcript, key) for key in keys],
+        _request_summary(transcript),
+        return_exceptions=True
+    )
+    return merge_category_results(dict(zip(keys, outcomes[:-1])), outcomes[-1])
+
+def _category_user_prompt(transcript: str) -> str:
+    return f"""Sales call transcript:
+
+{transcript}"""
+
+async def _request_category(transcript: str, key: str) -> Dict[str, Any]:
+    return await request_analysis_async(
+        _category_user_prompt(transcript), CATEGORY_MAX_TOKENS, build_category_prompt(key), CATEGORY_SCHEMA
+    )
+
+async def _request_summary(transcript: str) -> Dict[str, Any]:
+    return await request_analysis_async(
+        _category_user_prompt(transcript), SUMMARY_MAX_TOKENS, SUMMARY_SYSTEM_PROMPT, SUMMARY_SCHEMA
+    )
+
+def _repair_needed(analysis_results: Dict[str, Any]) -> Tuple[List[str], bool]:
+    """Return the invalid category keys and whether the summary must be re-requested"""
+    missing = invalid_categories(analysis_results)
+    needs_summary = (
+        'partial' in analysis_results
+        or 'raw_analysis' in analysis_results
+        or not isinstance(analysis_results.get('summary'), str)
+    )
+    return missing, needs_summary
+
+async def repair_analysis_async(analysis_results: Dict[str, Any], transcript: str) -> Dict[str, Any]:
+    """
+    Re-request only the categories that are missing or failed validation
+    
+    Valid categories from the original response are kept as-is; the summary
+    is re-requested only if it is missing. If nothing can be repaired the
+    original result is returned unchanged.
+    """
+    missing, needs_summary = _repair_needed(analysis_results)
+    if not missing and not needs_summary:
+        return analysis_results
+    
+    print(f"Repairing analysis: {len(missing)} invalid categories, summary {'missing' if needs_summary else 'ok'}")
+    requests = [_request_category(transcript, key) for key in missing]
+    if needs_summary:
+        requests.append(_request_summary(transcript))
+    outcomes = await asyncio.gather(*requests, return_exceptions=True)
+    
+    category_outcomes = dict(analysis_results.get('categories') or {})
+    category_outcomes.update(zip(missing, outcomes))
+    summary_outcome = outcomes[-1] if needs_summary else {
+        'payment_detected': analysis_results.get('payment_detected', 'Unknown'),
+        'summary': analysis_results['summary']
+    }
+    try:
+        repaired = merge_category_results(category_outcomes, summary_outcome)
     except Exception as e:
-        print(f"Error in analysis: {str(e)}")
-        return {
-            "error": str(e),
-            "overall_score": 0,
-            "categories": {},
-            "summary": "Analysis failed due to an error."
+        print(f"Error repairing analysis: {str(e)}")
+        return analysis_results
+    if 'raw_analysis' in repaired:
+        return analysis_results
+    repaired['repaired_categories'] = [key for key in missing if key in repaired['categories']]
+    return repaired
+
+def merge_category_results(category_outcomes: Dict[str, Any], summary_outcome: Any) -> Dict[str, Any]:
+    """Merge per-category responses (or the errors they raised) into one analysis result"""
+    categories = {}
+    failed = []
+    for key, outcome in category_outcomes.items():
+        if isinstance(outcome, BaseException) or validate_category(outcome):
+            failed.append(key)
+            continue
+        categories[key] = {
+            'score': outcome.get('score', 0),
+            'highlights': outcome.get('highlights', []),
+            'missed_opportunities': outcome.get('missed_opportunities', []),
+            'feedback': outcome.get('feedback', [])
         }
+    
+    if not categories:
+        errors = [o for o in category_outcomes.values() if isinstance(o, BaseException)]
+        if errors:
+            raise errors[0]
+        return parse_text_analysis("No category analysis could be parsed")
+    
+    summary = {}
+    if isinstance(summary_outcome, dict) and 'raw_analysis' not in summary_outcome:
+        summary = summary_outcome
+    
+    analysis_results = {
+        'overall_score': round(overall_score(categories)),
+        'categories': categories,
+        'payment_detected': summary.get('payment_detected', 'Unknown'),
+        'summary': summary.get('summary', 'No summary available.')
+    }
+    if failed:
+        analysis_results['categories_failed'] = failed
+    return analysis_results
+
+def _reduce_chunk_outcomes(chunks: List[Dict[str, Any]], outcomes: List[Any]) -> Dict[str, Any]:
+    partials = []
+    tokens = []
+    errors = []
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            errors.append(outcome)
+        # Skip chunks whose output could not be parsed rather than averaging in placeholder scores
+        elif 'raw_analysis' not in outcome:
+            partials.append(outcome)
+            tokens.append(chunk['tokens'])
+    
+    if not partials:
+        if errors:
+            raise errors[0]
+        return parse_text_analysis("No chunk of the long transcript could be parsed")
+    
+    analysis_results = reduce_chunk_results(partials, CATEGORY_WEIGHTS, tokens)
+    if len(partials) < len(chunks):
+        analysis_results['chunks_failed'] = len(chunks) - len(partials)
+    return analysis_results
 
 def parse_text_analysis(text: str) -> Dict[str, Any]:
     """
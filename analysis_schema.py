@@ -0,0 +1,101 @@
+from typing import Dict, Any, List
+
+CATEGORY_KEYS = [
+    'needs_discovery',
+    'pain_point_exploration',
+    'consequence_urgency',
+    'obstacle_handling',
+    'objection_handling',
+    'next_steps_closing'
+]
+
+LIST_FIELDS = ('highlights', 'missed_opportunities', 'feedback')
+
+CATEGORY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'score': {'type': 'integer'},
+        'highlights': {'type': 'array', 'items': {'type': 'string'}},
+        'missed_opportunities': {'type': 'array', 'items': {'type': 'string'}},
+        'feedback': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['score', 'highlights', 'missed_opportunities', 'feedback'],
+    'additionalProperties': False
+}
+
+SUMMARY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'payment_detected': {'type': 'string'},
+        'summary': {'type': 'string'}
+    },
+    'required': ['payment_detected', 'summary'],
+    'additionalProperties': False
+}
+
+# Categories come first so the streaming parser can emit them before the summary
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'overall_score': {'type': 'integer'},
+        'categories': {
+            'type': 'object',
+            'properties': {key: CATEGORY_SCHEMA for key in CATEGORY_KEYS},
+            'required': CATEGORY_KEYS,
+            'additionalProperties': False
+        },
+        'payment_detected': {'type': 'string'},
+        'summary': {'type': 'string'}
+    },
+    'required': ['overall_score', 'categories', 'payment_detected', 'summary'],
+    'additionalProperties': False
+}
+
+
+def response_format(name: str, schema: Dict[str, Any], mode: str = 'json_schema') -> Dict[str, Any]:
+    """
+    Build the response_format argument for a chat completion request
+
+    Args:
+        name (str): Schema name reported to the API
+        schema (Dict): JSON schema the output must follow
+        mode (str): "json_schema" for strict structured output, "json_object" for JSON mode
+    """
+    if mode == 'json_schema':
+        return {
+            'type': 'json_schema',
+            'json_schema': {'name': name, 'schema': schema, 'strict': True}
+        }
+    return {'type': 'json_object'}
+
+
+def without_properties(schema: Dict[str, Any], *names: str) -> Dict[str, Any]:
+    """Copy of an object schema with the given properties removed (e.g. fields filled in locally)"""
+    return dict(
+        schema,
+        properties={key: value for key, value in schema['properties'].items() if key not in names},
+        required=[key for key in schema['required'] if key not in names]
+    )
+
+
+def validate_category(data: Any) -> List[str]:
+    """Return a list of problems with one category result (empty if valid)"""
+    if not isinstance(data, dict):
+        return ['category is not an object']
+    errors = []
+    score = data.get('score')
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 1 <= score <= 10:
+        errors.append(f"score must be a number from 1 to 10, got {score!r}")
+    for field in LIST_FIELDS:
+        value = data.get(field)
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            errors.append(f"{field} must be a list of strings")
+    return errors
+
+
+def invalid_categories(analysis: Dict[str, Any]) -> List[str]:
+    """Return the rubric categories that are missing or invalid in an analysis result"""
+    categories = analysis.get('categories')
+    if not isinstance(categories, dict):
+        return list(CATEGORY_KEYS)
+    return [key for key in CATEGORY_KEYS if validate_category(categories.get(key))]
@@ -1,89 +1,616 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, redirect, send_file, stream_with_context
+import hmac
 import json
 import os
+import time
+import uuid
 from datetime import datetime
-import threading
-from analysis_engine import analyze_call
-from report_generator import generate_report
-from email_service import send_report_email
+from analysis_engine import (
+    analyze_call, analysis_cache, rate_limiter, circuit_breaker, hedge_policy, model_router, stream_analysis
+)
+from resilience import CircuitOpenError
+from email_service import send_report_email, outbox
+import render_service
+from transcript_formatter import TRANSCRIPT_COMPACT, compact_transcript, format_transcript
+from pipeline import Stage, StagedPipeline, PipelineFullError, PipelineClosedError, RetryLater
+from metrics import REGISTRY, JOBS, TRANSCRIPT_TOKENS_SAVED, observe_stage, gauge_family
+from job_store import JobRunner, job_store_from_env, worker_id
+from history_store import history_store_from_env
+from webhook_ingest import (
+    PLACEHOLDER_SECRETS, WEBHOOK_SIGNATURE_HEADER, WebhookRejected,
+    loads, meeting_id, meeting_key, read_body, seen_set_from_env, verify_signature
+)
+from live_analysis import live_analyzer_from_env
+from report_store import FORMATS as REPORT_FORMATS, report_store_from_env
+from profiling import profiler_from_env
 
 app = Flask(__name__)
 
 # Configuration
 WEBHOOK_SECRET = os.environ.get('FATHOM_WEBHOOK_SECRET', 'your-webhook-secret')
 USER_EMAIL = os.environ.get('USER_EMAIL', 'your-email@example.com')
+# Also write each rendered report to reports/ (off by default; dyno disks are ephemeral)
+PERSIST_REPORTS = os.environ.get('PERSIST_REPORTS', '').lower() in ('1', 'true', 'yes')
+# Times a job waits for the OpenAI circuit breaker before it is reported with local pre-analysis only
+ANALYSIS_MAX_DEFERRALS = int(os.environ.get('ANALYSIS_MAX_DEFERRALS', '10'))
+# Jobs waiting in the durable store for a free worker before new webhooks get 429
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', '500'))
+
+# Durable job table shared by all workers on this host (None when disabled)
+job_store = job_store_from_env()
+WORKER_ID = worker_id()
+# Meetings accepted recently by this worker, for cheap duplicate detection
+seen_webhooks = seen_set_from_env()
+# Every analysis, indexed for trend queries (None when disabled)
+history = history_store_from_env()
+# Per-meeting state for calls analyzed while they are in progress (None when disabled)
+live = live_analyzer_from_env()
+# Content-addressed reports served from /reports/<id> (None when disabled)
+report_store = report_store_from_env()
+# Public URL of this service; when set (with the report store), emails link to the report instead of attaching it
+REPORT_BASE_URL = os.environ.get('REPORT_BASE_URL', '').rstrip('/')
+# Browser cache lifetime of /reports responses (content-addressed, so they never change)
+REPORT_CACHE_SECONDS = int(os.environ.get('REPORT_CACHE_SECONDS', '86400'))
+# Stage profiling of sampled jobs (None when disabled); dumps are listed under /admin/profiles
+profiler = profiler_from_env()
+# Token for /admin endpoints and the X-Profile header (admin endpoints are off when unset)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def _stage_config(name, workers, queue_size):
+    """Read worker count and queue size for a pipeline stage from the environment"""
+    prefix = name.upper()
+    return (
+        int(os.environ.get(f'{prefix}_WORKERS', workers)),
+        int(os.environ.get(f'{prefix}_QUEUE_SIZE', queue_size))
+    )
 
 @app.route('/webhook', methods=['POST'])
 def handle_webhook():
     """Handle incoming webhooks from Fathom"""
+    key = job = None
+    accepted = False
     try:
-        # Verify webhook signature (optional but recommended)
-        # signature = request.headers.get('X-Fathom-Signature')
-        # if not verify_signature(request.data, signature, WEBHOOK_SECRET):
-        #     return jsonify({'error': 'Invalid signature'}), 401
-        
-        # Parse the webhook payload
-        data = request.get_json()
+        body, data = read_signed_json()
         
         # Check if this is a meeting completion event with transcript
         if not data.get('transcript'):
             return jsonify({'message': 'No transcript found, skipping analysis'}), 200
         
-        # Process the meeting data in a background thread
-        thread = threading.Thread(target=process_meeting, args=(data,))
-        thread.start()
+        # Retried deliveries of a meeting we already accepted are acknowledged and dropped
+        key = meeting_key(data, body)
+        if not seen_webhooks.reserve(key):
+            JOBS.inc(outcome='duplicate')
+            return jsonify({'message': 'Duplicate delivery ignored'}), 200
         
-        return jsonify({'message': 'Webhook received, processing started'}), 200
+        # Record the job durably, then hand it to this worker's bounded pipeline
+        job = new_job(data, request.headers.get('X-Request-ID'),
+                      profile=request.headers.get('X-Profile') == '1' and admin_authorized())
+        if job_store is not None:
+            existing = job_store.create(job, owner=WORKER_ID, dedupe_key=key)
+            if existing is not None:
+                JOBS.inc(outcome='duplicate')
+                return jsonify({'message': 'Meeting already received', 'job_id': existing}), 200
+            job_runner.track(job)
+        try:
+            pipeline.submit(job)
+            accepted = True
+        except (PipelineFullError, PipelineClosedError) as e:
+            if job_store is not None and job_store.stats()['pending'] < JOB_MAX_PENDING:
+                # Leave it in the store for whichever worker has room first
+                job_runner.untrack(job['job_id'])
+                job_store.release(job['job_id'], WORKER_ID)
+                accepted = True
+                JOBS.inc(outcome='accepted')
+                print(f"[{job['job_id']}] Stored meeting for a free worker: {job['meeting_title']}")
+                return jsonify({'message': 'Webhook received, queued for processing', 'job_id': job['job_id']}), 202
+            # Not accepted: let the sender's retry through
+            drop_delivery(key, job)
+            JOBS.inc(outcome='rejected')
+            if isinstance(e, PipelineClosedError):
+                response = jsonify({'error': 'Service is shutting down, retry later'})
+                return response, 503, {'Retry-After': str(pipeline.retry_after())}
+            response = jsonify({'error': 'Processing queue is full, retry later', 'stage': e.stage})
+            return response, 429, {'Retry-After': str(e.retry_after)}
         
+        JOBS.inc(outcome='accepted')
+        print(f"[{job['job_id']}] Queued meeting: {job['meeting_title']}"
+              + (f" (request {job['request_id']})" if job['request_id'] else ''))
+        return jsonify({'message': 'Webhook received, processing started', 'job_id': job['job_id']}), 200
+        
+    except WebhookRejected as e:
+        JOBS.inc(outcome='invalid')
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         print(f"Error processing webhook: {str(e)}")
+        if key is not None and not accepted:
+            # A 500 asks the sender to retry, so the delivery must not count as seen
+            try:
+                drop_delivery(key, job)
+            except Exception as cleanup_error:
+                print(f"Could not release webhook {key}: {str(cleanup_error)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-def process_meeting(meeting_data):
-    """Process the meeting data and generate analysis report"""
+def drop_delivery(key, job=None):
+    """Undo the dedupe reservation (and stored job) of a delivery that was not accepted"""
+    seen_webhooks.forget(key)
+    if job is not None and job_store is not None:
+        job_runner.untrack(job['job_id'])
+        job_store.delete(job['job_id'], WORKER_ID)
+
+def read_signed_json():
+    """
+    Read, verify and decode a signed JSON request body
+
+    The size check and signature verification run on the raw bytes before parsing.
+
+    Returns:
+        Tuple of the raw body and the decoded object
+
+    Raises:
+        WebhookRejected: For oversized, unsigned or malformed bodies
+    """
+    body = read_body(request.stream, request.content_length)
+    if WEBHOOK_SECRET and WEBHOOK_SECRET not in PLACEHOLDER_SECRETS:
+        if not verify_signature(body, request.headers.get(WEBHOOK_SIGNATURE_HEADER), WEBHOOK_SECRET):
+            raise WebhookRejected(401, 'Invalid signature')
     try:
-        # Extract meeting information
-        meeting_title = meeting_data.get('meeting_title', 'Unknown Meeting')
-        transcript = meeting_data.get('transcript', [])
-        created_at = meeting_data.get('created_at', datetime.now().isoformat())
-        
-        # Convert transcript to text format
-        transcript_text = format_transcript(transcript)
-        
-        # Analyze the call
-        print(f"Starting analysis for meeting: {meeting_title}")
-        analysis_results = analyze_call(transcript_text)
-        
-        # Generate PDF report
-        print("Generating PDF report...")
-        report_path = generate_report(meeting_title, created_at, transcript_text, analysis_results)
-        
-        # Send email with report
-        print("Sending email report...")
-        send_report_email(USER_EMAIL, meeting_title, report_path)
-        
-        print(f"Analysis complete for meeting: {meeting_title}")
-        
+        data = loads(body)
+    except ValueError:
+        raise WebhookRejected(400, 'Invalid JSON body')
+    if not isinstance(data, dict):
+        raise WebhookRejected(400, 'Expected a JSON object')
+    return body, data
+
+def admin_authorized():
+    """Whether the request carries the admin token (X-Admin-Token or a Bearer token)"""
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get('X-Admin-Token') or ''
+    authorization = request.headers.get('Authorization', '')
+    if not token and authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def new_job(meeting_data, request_id=None, profile=False):
+    """Create the job state that is passed between pipeline stages"""
+    return {
+        # Server-generated: the durable job store key and history call ID, never chosen by the client
+        'job_id': uuid.uuid4().hex[:12],
+        # The sender's X-Request-ID, kept only to correlate logs with the caller
+        'request_id': (request_id or '')[:128] or None,
+        'meeting_data': meeting_data,
+        'meeting_title': meeting_data.get('meeting_title', 'Unknown Meeting'),
+        'created_at': meeting_data.get('created_at', datetime.now().isoformat()),
+        # Sampled once per job; the stages of a profiled job write profile dumps
+        'profile': profiler is not None and profiler.sample(profile)
+    }
+
+def format_stage(job):
+    """Convert the Fathom transcript to text format (plus a compact copy for the model)"""
+    transcript = job['meeting_data'].get('transcript', [])
+    job['transcript_text'] = format_transcript(transcript)
+    if TRANSCRIPT_COMPACT:
+        job['analysis_text'], stats = compact_transcript(transcript)
+        TRANSCRIPT_TOKENS_SAVED.inc(stats['tokens_saved'])
+        print(f"[{job['job_id']}] Compacted transcript: {stats['original_tokens']} -> "
+              f"{stats['compact_tokens']} tokens")
+    return job
+
+def analysis_stage(job):
+    """Analyze the call"""
+    print(f"[{job['job_id']}] Starting analysis for meeting: {job['meeting_title']}")
+    if finish_live_analysis(job):
+        record_history(job)
+        return job
+    deferrals = job.get('analysis_deferrals', 0)
+    try:
+        job['analysis_results'] = analyze_call(
+            job.get('analysis_text') or job['transcript_text'],
+            defer_when_open=deferrals < ANALYSIS_MAX_DEFERRALS
+        )
+    except CircuitOpenError as e:
+        # The API is failing; park the job instead of sending a report without an analysis
+        job['analysis_deferrals'] = deferrals + 1
+        raise RetryLater(e.retry_after, str(e))
+    record_history(job)
+    return job
+
+def finish_live_analysis(job):
+    """Complete the analysis from the live session of this meeting, if there is one"""
+    live_id = meeting_id(job['meeting_data']) if live is not None else None
+    if not live_id or not live.has_session(live_id):
+        return False
+    try:
+        results = live.finish(live_id, job['transcript_text'])
+    except Exception as e:
+        print(f"[{job['job_id']}] Live analysis could not be completed, analyzing in full: {str(e)}")
+        return False
+    if results is None:
+        return False
+    print(f"[{job['job_id']}] Completed live analysis from {results['live_segments']} segments")
+    job['analysis_results'] = results
+    return True
+
+def record_history(job):
+    """Keep the analysis for trend queries; a history failure never fails the job"""
+    if history is None:
+        return
+    try:
+        history.record(job['job_id'], job['meeting_title'], job['created_at'], job['analysis_results'])
     except Exception as e:
-        print(f"Error processing meeting: {str(e)}")
-
-def format_transcript(transcript):
-    """Convert Fathom transcript format to readable text"""
-    if isinstance(transcript, list):
-        formatted_lines = []
-        for entry in transcript:
-            speaker = entry.get('speaker', {}).get('display_name', 'Unknown')
-            text = entry.get('text', '')
-            timestamp = entry.get('timestamp', '')
-            formatted_lines.append(f"[{timestamp}] {speaker}: {text}")
-        return '\n'.join(formatted_lines)
-    else:
-        return str(transcript)
+        print(f"[{job['job_id']}] Error recording analysis history: {str(e)}")
+
+def report_stage(job):
+    """Store the report, and render the PDF if it is to be attached"""
+    if report_store is not None:
+        job['report_id'] = report_store.put(
+            job['meeting_title'], job['created_at'], job['transcript_text'], job['analysis_results']
+        )
+        if REPORT_BASE_URL:
+            # The PDF is rendered when someone first opens it
+            print(f"[{job['job_id']}] Report stored as {job['report_id']}")
+            return job
+    # ReportLab is only loaded once a report is due (or by warm_up), not at worker boot
+    from report_generator import save_report, report_filename
+    from transcript_renderer import TRANSCRIPT_MODE, transcript_note
+    print(f"[{job['job_id']}] Generating PDF report...")
+    # A profiled job renders in this thread so the profile shows the ReportLab layout
+    in_process = bool(job.get('profile'))
+    job['report_data'] = render_service.render(
+        job['meeting_title'], job['created_at'], job['transcript_text'], job['analysis_results'],
+        in_process=in_process
+    )
+    job['report_filename'] = report_filename()
+    if TRANSCRIPT_MODE == 'attachment':
+        job['transcript_pdf'] = render_service.render_transcript(
+            job['transcript_text'], job['meeting_title'], in_process=in_process
+        )
+    job['transcript_note'] = transcript_note(TRANSCRIPT_MODE, separate_pdf='transcript_pdf' in job)
+    if PERSIST_REPORTS:
+        job['report_path'] = save_report(job['report_data'], job['report_filename'])
+    if job.get('report_id'):
+        report_store.add_pdf(job['report_id'], job['report_data'])
+    return job
+
+def report_links(report_id):
+    """(label, URL) pairs for the renditions of a stored report"""
+    url = f"{REPORT_BASE_URL}/reports/{report_id}"
+    return [('View report', url), ('PDF', f"{url}.pdf"), ('Transcript', f"{url}.txt")]
+
+def email_stage(job):
+    """Queue the email with the report"""
+    print(f"[{job['job_id']}] Queueing email report...")
+    if 'report_data' not in job:
+        send_report_email(USER_EMAIL, job['meeting_title'], report_links=report_links(job['report_id']),
+                          transcript_note="Full transcript")
+        print(f"[{job['job_id']}] Analysis complete for meeting: {job['meeting_title']}")
+        return job
+    send_report_email(
+        USER_EMAIL, job['meeting_title'],
+        report_data=job['report_data'], filename=job['report_filename'],
+        extra_attachments=[
+            (job['report_filename'].replace('sales_analysis_', 'transcript_'), job['transcript_pdf'])
+        ] if job.get('transcript_pdf') else None,
+        transcript_note=job.get('transcript_note')
+    )
+    print(f"[{job['job_id']}] Analysis complete for meeting: {job['meeting_title']}")
+    return job
+
+PIPELINE_STAGES = [
+    ('format', format_stage, 2, 50),
+    ('analysis', analysis_stage, 4, 20),
+    ('report', report_stage, 2, 20),
+    ('email', email_stage, 2, 20),
+]
+
+NEXT_STAGE = {
+    name: PIPELINE_STAGES[index + 1][0] if index + 1 < len(PIPELINE_STAGES) else None
+    for index, (name, _, _, _) in enumerate(PIPELINE_STAGES)
+}
+
+def record_stage(stage, job, seconds, error):
+    """Pipeline callback: record stage latency and errors"""
+    observe_stage(stage, seconds, error)
+    if error is None:
+        print(f"[{job.get('job_id', '-')}] Stage '{stage}' finished in {seconds:.2f}s")
+
+def checkpoint_stage(stage, job, seconds, error):
+    """Pipeline callback: record the stage, then checkpoint the job so a crash resumes after it"""
+    record_stage(stage, job, seconds, error)
+    job_id = job['job_id']
+    if not job_runner.holds(job_id):
+        return
+    if error is not None:
+        # Resumes at the failed stage after a backoff, until the job runs out of attempts
+        delay = job_store.retry(job_id, WORKER_ID, f"{stage}: {error}")
+        if delay is not None:
+            print(f"[{job_id}] Retrying stage '{stage}' in {delay:.0f}s")
+        job_runner.untrack(job_id)
+        return
+    next_stage = NEXT_STAGE[stage]
+    if not job_store.checkpoint(job, WORKER_ID, next_stage):
+        print(f"[{job_id}] Lease lost after stage '{stage}'")
+        job_runner.untrack(job_id)
+    elif next_stage is None:
+        job_runner.untrack(job_id)
+
+def profiled(name, func):
+    """Run a stage under the profiler (which only profiles sampled jobs)"""
+    if profiler is None:
+        return func
+    def run(job):
+        return profiler.run(name, job, func)
+    return run
+
+def leased(func):
+    """Skip a stage when another worker has taken the job's lease over"""
+    def run(job):
+        if not job_runner.holds(job['job_id']):
+            print(f"[{job['job_id']}] Not holding the job lease, dropping it")
+            return None
+        return func(job)
+    return run
+
+pipeline = StagedPipeline([
+    Stage(name, leased(profiled(name, func)) if job_store is not None else profiled(name, func),
+          *_stage_config(name, workers, queue_size))
+    for name, func, workers, queue_size in PIPELINE_STAGES
+], on_stage_done=checkpoint_stage if job_store is not None else record_stage)
+
+job_runner = JobRunner(
+    job_store, pipeline, WORKER_ID,
+    poll_seconds=float(os.environ.get('JOB_POLL_SECONDS', '2')),
+    retention_seconds=float(os.environ.get('JOB_RETENTION_DAYS', '7')) * 86400
+) if job_store is not None else None
+
+def process_meeting(meeting_data):
+    """Process the meeting data and generate analysis report (synchronously)"""
+    job = new_job(meeting_data)
+    for name, func, _, _ in PIPELINE_STAGES:
+        started = time.monotonic()
+        try:
+            job = profiled(name, func)(job)
+        except Exception as e:
+            record_stage(name, job, time.monotonic() - started, e)
+            print(f"[{job['job_id']}] Error processing meeting: {str(e)}")
+            return
+        record_stage(name, job, time.monotonic() - started, None)
+
+def collect_gauges():
+    """Scrape-time gauges for pipeline queues, the analysis cache and the rate limiter"""
+    depths = pipeline.queue_depths()
+    families = [
+        gauge_family('sales_agent_stage_queued', 'Jobs waiting for each stage',
+                     {(('stage', name),): stats['queued'] for name, stats in depths.items()}),
+        gauge_family('sales_agent_stage_active', 'Jobs being processed by each stage',
+                     {(('stage', name),): stats['active'] for name, stats in depths.items()}),
+        gauge_family('sales_agent_stage_capacity', 'Queue capacity of each stage',
+                     {(('stage', name),): stats['capacity'] for name, stats in depths.items()}),
+    ]
+    if analysis_cache is not None:
+        stats = analysis_cache.stats()
+        families.append(gauge_family('sales_agent_analysis_cache', 'Analysis cache counters', {
+            (('stat', key),): value for key, value in stats.items() if isinstance(value, (int, float))
+        }))
+    families.append(gauge_family('sales_agent_email_outbox', 'Email outbox state', {
+        (('stat', key),): value for key, value in outbox.stats().items()
+    }))
+    breaker = circuit_breaker.stats()
+    families.append(gauge_family('sales_agent_openai_breaker_open', 'OpenAI circuit breaker state (1 = not closed)', {
+        (): 0 if breaker['state'] == 'closed' else 1
+    }))
+    families.append(gauge_family('sales_agent_openai_resilience', 'Hedged requests, deadlines and breaker rejections', {
+        (('stat', key),): value for key, value in dict(hedge_policy.stats(), **breaker).items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }))
+    if job_store is not None:
+        families.append(gauge_family('sales_agent_job_store', 'Durable job store by status', {
+            (('status', key),): value for key, value in job_store.stats().items()
+        }))
+    limiter = rate_limiter.stats()
+    families.append(gauge_family('sales_agent_openai_limiter', 'OpenAI rate limiter state', {
+        (('stat', key),): value for key, value in limiter.items() if isinstance(value, (int, float))
+    }))
+    return families
+
+REGISTRY.register_collector(collect_gauges)
+
+# Resume delivery of any emails left queued by a previous run
+outbox.start()
+# Pick up jobs left unfinished by crashed or restarted workers
+if job_runner is not None:
+    job_runner.start()
+
+def warm_up():
+    """
+    Load the lazily imported subsystems ahead of the first job
+
+    Creates the OpenAI client, imports ReportLab with the report styles and
+    sets up the render pool. gunicorn.conf.py runs this in a background thread
+    once a worker has booted, so /health answers while it is still warming.
+    """
+    started = time.monotonic()
+    from analysis_engine import get_client, retryable_errors
+    get_client()
+    retryable_errors()
+    from report_generator import get_report_styles
+    get_report_styles()
+    if render_service.RENDER_WORKERS > 0:
+        render_service.get_executor()
+    print(f"Worker warm-up finished in {time.monotonic() - started:.2f}s")
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'queues': pipeline.queue_depths(),
+        'analysis_cache': analysis_cache.stats() if analysis_cache is not None else None,
+        'email_outbox': outbox.stats(),
+        'jobs': dict(job_store.stats(), **job_runner.stats()) if job_store is not None else None,
+        'webhook_dedupe': seen_webhooks.stats(),
+        'live_analysis': live.stats() if live is not None else None,
+        'reports': report_store.stats() if report_store is not None else None,
+        'openai': dict(hedge_policy.stats(), circuit_breaker=circuit_breaker.stats()),
+        'model_router': model_router.stats() if model_router is not None else None,
+        'profiling': profiler.stats() if profiler is not None else None
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/live/<live_id>/segments', methods=['POST'])
+def live_segments(live_id):
+    """
+    Append transcript segments of a call in progress
+
+    Body: {"transcript": [...]} in the webhook's transcript format (or as
+    "[timestamp] Speaker: text" lines). Completed framework stages are
+    analyzed in the background; the webhook for the same meeting ID then
+    only analyzes the rest of the call.
+    """
+    if live is None:
+        return jsonify({'error': 'Live analysis is disabled'}), 404
+    try:
+        _, data = read_signed_json()
+    except WebhookRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    transcript = data.get('transcript')
+    if not transcript:
+        return jsonify({'error': 'No transcript segments provided'}), 400
+    lines = format_transcript(transcript).split('\n')
+    return jsonify(live.append(live_id, lines))
+
+@app.route('/live/<live_id>', methods=['GET'])
+def live_status(live_id):
+    """Progress and provisional scores of a call in progress (admin token required)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    status = live.status(live_id) if live is not None else None
+    if status is None:
+        return jsonify({'error': 'No live session for this meeting'}), 404
+    return jsonify(status)
+
+@app.route('/reports/<name>', methods=['GET'])
+def get_report(name):
+    """
+    Serve a stored report: /reports/<id> (HTML), or <id>.json, <id>.txt, <id>.pdf
+
+    The PDF is rendered on its first request and kept. Responses carry an
+    ETag and Last-Modified and honour conditional and Range requests.
+    """
+    report_id, _, fmt = name.partition('.')
+    fmt = fmt or 'html'
+    if report_store is None or fmt not in REPORT_FORMATS:
+        return jsonify({'error': 'Report not found'}), 404
+    path = report_store.path(report_id, fmt, render=render_service.render if fmt == 'pdf' else None)
+    if path is None:
+        return jsonify({'error': 'Report not found'}), 404
+    try:
+        return send_file(path, mimetype=REPORT_FORMATS[fmt], conditional=True, max_age=REPORT_CACHE_SECONDS,
+                         download_name=f"sales_analysis_{report_id}.{fmt}")
+    except FileNotFoundError:
+        # Evicted between lookup and open
+        return jsonify({'error': 'Report not found'}), 404
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Stage profiles of sampled jobs, newest first"""
+    if profiler is None or not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'profiles': profiler.dumps(), 'stats': profiler.stats()})
+
+@app.route('/admin/profiles/<filename>', methods=['GET'])
+def admin_profile(filename):
+    """Download one dump: <name>.json (summary with hot spots) or <name>.prof.gz (pstats data)"""
+    if profiler is None or not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    path = profiler.path(filename)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    mimetype = 'application/json' if filename.endswith('.json') else 'application/gzip'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+@app.route('/history/rollups', methods=['GET'])
+def history_rollups():
+    """Daily or weekly score, category and payment rollups (?period=day|week&coach=&from=&to=)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    if history is None:
+        return jsonify({'error': 'Analysis history is disabled'}), 404
+    try:
+        rollups = history.rollups(
+            period=request.args.get('period', 'day'),
+            coach=request.args.get('coach'),
+            start=request.args.get('from'),
+            end=request.args.get('to')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'period': request.args.get('period', 'day'), 'coach': request.args.get('coach'),
+                    'rollups': rollups})
+
+@app.route('/history/calls', methods=['GET'])
+def history_calls():
+    """Recorded calls, newest first (?coach=&from=&to=&category=&min_score=&max_score=&limit=)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    if history is None:
+        return jsonify({'error': 'Analysis history is disabled'}), 404
+    try:
+        calls = history.calls(
+            coach=request.args.get('coach'),
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            category=request.args.get('category'),
+            min_score=request.args.get('min_score', type=int),
+            max_score=request.args.get('max_score', type=int),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'calls': calls})
+
+@app.route('/history/calls/<call_id>', methods=['GET'])
+def history_call(call_id):
+    """Full stored analysis of one call"""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    results = history.get(call_id) if history is not None else None
+    if results is None:
+        return jsonify({'error': 'Call not found'}), 404
+    return jsonify({'call_id': call_id, 'results': results})
+
+@app.route('/history/calls/<call_id>/report', methods=['GET'])
+def history_call_report(call_id):
+    """Render a call's report on demand from its stored (possibly re-scored) analysis"""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    call = history.get_call(call_id) if history is not None else None
+    if call is None:
+        return jsonify({'error': 'Call not found'}), 404
+    # The transcript appendix is only available while the job store still holds the job
+    state = job_store.load(call_id) if job_store is not None else None
+    transcript = (state or {}).get('transcript_text', '')
+    if report_store is not None:
+        # Re-scored results hash to a new report ID, so a stale PDF is never served
+        report_id = report_store.put(call['title'] or 'Sales Call', call['meeting_at'], transcript, call['results'])
+        return redirect(f"/reports/{report_id}.pdf")
+    pdf = render_service.render(call['title'] or 'Sales Call', call['meeting_at'], transcript, call['results'])
+    return Response(bytes(pdf), mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline; filename="sales_analysis_{call_id}.pdf"'})
+
+@app.route('/history/coaches', methods=['GET'])
+def history_coaches():
+    """Coaches with recorded calls"""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found'}), 404
+    if history is None:
+        return jsonify({'error': 'Analysis history is disabled'}), 404
+    return jsonify({'coaches': history.coaches()})
 
 @app.route('/test', methods=['POST'])
 def test_analysis():
@@ -95,17 +622,40 @@ def test_analysis():
         if not transcript:
             return jsonify({'error': 'No transcript provided'}), 400
         
-        # Analyze the call
-        analysis_results = analyze_call(transcript)
+        use_cache = not data.get('no_cache', False)
+        transcript_stats = None
+        if TRANSCRIPT_COMPACT:
+            transcript, transcript_stats = compact_transcript(transcript)
+        
+        # Stream partial results as Server-Sent Events when asked to
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            return Response(
+                stream_with_context(sse_events(stream_analysis(transcript, use_cache=use_cache))),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        # Analyze the call ("no_cache": true forces a fresh analysis)
+        analysis_results = analyze_call(
+            transcript,
+            use_cache=use_cache,
+            mode=data.get('mode')
+        )
         
         return jsonify({
             'message': 'Analysis complete',
-            'results': analysis_results
+            'results': analysis_results,
+            'transcript_stats': transcript_stats
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def sse_events(events):
+    """Format (event, payload) tuples as Server-Sent Events"""
+    for event, payload in events:
+        yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 if __name__ == '__main__':
     # Run the Flask app
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,324 @@
+"""
+Analyze historical Fathom recordings in bulk
+
+Reads Fathom webhook payloads from JSONL files, JSON files or directories of
+them and runs each through the same steps as the webhook: format, analyze,
+and optionally render the PDF report and queue the email. Every stage has
+its own worker pool on the shared StagedPipeline. The analysis stage runs
+as many workers as the OpenAI rate limiter lets into flight, so the API
+quota sets the pace, not the runner. Input is read lazily with
+backpressure, so memory stays flat for any number of recordings.
+
+Results stream to a JSONL file, one line per recording as it finishes.
+That file is also the checkpoint: a rerun with the same --output skips
+every recording it already holds, so an interrupted backfill resumes where
+it stopped. With --retry-failed, failed recordings run again and their new
+line supersedes the old one.
+
+    python backfill.py recordings.jsonl --output backfill.jsonl
+    python backfill.py exports/ --output backfill.jsonl --reports reports/backfill --history
+    python backfill.py exports/ --output backfill.jsonl --retry-failed
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+
+from analysis_engine import analyze_call, rate_limiter
+from pipeline import Stage, StagedPipeline, RetryLater
+from resilience import CircuitOpenError
+from transcript_formatter import TRANSCRIPT_COMPACT, compact_transcript, format_transcript
+from webhook_ingest import meeting_key
+
+# Times a job waits out an open circuit breaker before it is recorded as failed
+MAX_DEFERRALS = int(os.environ.get('ANALYSIS_MAX_DEFERRALS', '10'))
+
+
+def iter_payloads(paths: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield ``(key, payload)`` for every Fathom payload under ``paths``
+
+    Files ending in .jsonl hold one payload per line; other files hold one
+    payload or a list of them. Directories are walked in sorted order for
+    .json and .jsonl files. The key is the webhook's meeting identity, so a
+    recording exported twice is only analyzed once.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path) for name in names
+                if name.endswith(('.json', '.jsonl'))
+            )
+        else:
+            files = [path]
+        for filename in files:
+            if filename.endswith('.jsonl'):
+                with open(filename, 'rb') as f:
+                    for number, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            payload = json.loads(line)
+                        except ValueError:
+                            print(f"Skipping invalid JSON at {filename}:{number}", file=sys.stderr)
+                            continue
+                        if isinstance(payload, dict):
+                            yield meeting_key(payload, line.strip()), payload
+                continue
+            with open(filename, 'rb') as f:
+                try:
+                    document = json.load(f)
+                except ValueError:
+                    print(f"Skipping invalid JSON file {filename}", file=sys.stderr)
+                    continue
+            for payload in document if isinstance(document, list) else [document]:
+                if isinstance(payload, dict):
+                    yield meeting_key(payload, json.dumps(payload, sort_keys=True).encode('utf-8')), payload
+
+
+def load_checkpoint(output: str, retry_failed: bool = False) -> Set[str]:
+    """
+    Keys already recorded in the output file
+
+    A line cut short by an interrupted run is dropped (the file is
+    truncated after the last complete line) so appending stays valid.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output):
+        return done
+    valid = 0
+    with open(output, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            valid += len(line)
+            if record.get('status') != 'error' or not retry_failed:
+                done.add(record['key'])
+    if valid < os.path.getsize(output):
+        with open(output, 'r+b') as f:
+            f.truncate(valid)
+    return done
+
+
+class ResultWriter:
+    """Appends one JSON line per finished recording and reports progress"""
+
+    def __init__(self, path: str, progress_seconds: float = 30):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._progress_seconds = progress_seconds
+        self._next_progress = time.monotonic() + progress_seconds
+        self.started = time.monotonic()
+        self.submitted = 0
+        self.counts = {'ok': 0, 'error': 0, 'skipped': 0}
+
+    def add(self):
+        with self._lock:
+            self.submitted += 1
+
+    def write(self, job: Dict[str, Any], status: str, error: Optional[str] = None):
+        record = {
+            'key': job['key'],
+            'meeting_title': job['meeting_title'],
+            'created_at': job['created_at'],
+            'status': status,
+            'error': error,
+            'analysis_results': job.get('analysis_results'),
+            'report_path': job.get('report_path'),
+            'emailed': job.get('emailed', False),
+            'seconds': round(time.monotonic() - job['started'], 3),
+        }
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            # Flushed per line: everything in the file counts as done on resume
+            self._file.flush()
+            self.counts[status] += 1
+            self._done.notify_all()
+            if time.monotonic() >= self._next_progress:
+                self._next_progress = time.monotonic() + self._progress_seconds
+                print(self.progress())
+
+    def progress(self) -> str:
+        finished = sum(self.counts.values())
+        minutes = max(time.monotonic() - self.started, 1e-9) / 60
+        return (f"{finished}/{self.submitted} done ({finished / minutes:.1f}/min): {self.counts['ok']} ok, "
+                f"{self.counts['error']} failed, {self.counts['skipped']} skipped")
+
+    def wait(self):
+        """Block until every submitted recording has been written"""
+        with self._lock:
+            while sum(self.counts.values()) < self.submitted:
+                self._done.wait(1)
+
+    def close(self):
+        self._file.close()
+
+
+def build_pipeline(writer: ResultWriter, args: argparse.Namespace) -> StagedPipeline:
+    """Format, analysis, optional report and email stages, then the writer"""
+
+    def format_stage(job):
+        transcript = job['meeting_data'].get('transcript') or []
+        job['transcript_text'] = format_transcript(transcript)
+        if TRANSCRIPT_COMPACT:
+            job['analysis_text'], _ = compact_transcript(transcript)
+        return job
+
+    def analysis_stage(job):
+        deferrals = job.get('analysis_deferrals', 0)
+        try:
+            job['analysis_results'] = analyze_call(
+                job.get('analysis_text') or job['transcript_text'],
+                use_cache=not args.no_cache,
+                defer_when_open=deferrals < MAX_DEFERRALS
+            )
+        except CircuitOpenError as e:
+            job['analysis_deferrals'] = deferrals + 1
+            raise RetryLater(e.retry_after, str(e))
+        if history is not None and not job['analysis_results'].get('error'):
+            history.record(job['job_id'], job['meeting_title'], job['created_at'], job['analysis_results'])
+        return job
+
+    def report_stage(job):
+        if not job['analysis_results'].get('error'):
+            import render_service
+            pdf = render_service.render(
+                job['meeting_title'], job['created_at'], job['transcript_text'], job['analysis_results']
+            )
+            job['report_path'] = os.path.join(args.reports, f"sales_analysis_{job['job_id']}.pdf")
+            with open(job['report_path'], 'wb') as f:
+                f.write(pdf)
+        return job
+
+    def email_stage(job):
+        if not job['analysis_results'].get('error'):
+            from email_service import send_report_email
+            from transcript_renderer import TRANSCRIPT_MODE, transcript_note
+            # No standalone transcript PDF is rendered here, so "attachment" mode carries none
+            send_report_email(args.email, job['meeting_title'], report_path=job.get('report_path'),
+                              transcript_note=transcript_note(TRANSCRIPT_MODE))
+            job['emailed'] = True
+        return job
+
+    def write_stage(job):
+        results = job['analysis_results']
+        writer.write(job, 'error' if results.get('error') else 'ok', results.get('error'))
+        return job
+
+    def stage_done(stage, job, seconds, error):
+        # A stage that raised ends the job; record it so the rerun can retry it
+        if error is not None:
+            writer.write(job, 'error', f"{stage}: {error}")
+
+    history = None
+    if args.history:
+        from history_store import history_store_from_env
+        history = history_store_from_env()
+
+    stages = [
+        Stage('format', format_stage, args.format_workers, args.format_workers * 4),
+        Stage('analysis', analysis_stage, args.analysis_workers, args.analysis_workers * 2),
+    ]
+    if args.reports:
+        os.makedirs(args.reports, exist_ok=True)
+        stages.append(Stage('report', report_stage, args.report_workers, args.report_workers * 2))
+    if args.email:
+        stages.append(Stage('email', email_stage, 1, 8))
+    stages.append(Stage('write', write_stage, 1, 64))
+    return StagedPipeline(stages, on_stage_done=stage_done)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Feed every new recording through the pipeline and wait for the results"""
+    done = load_checkpoint(args.output, args.retry_failed)
+    if done:
+        print(f"Resuming: {len(done)} recordings already in {args.output}")
+    writer = ResultWriter(args.output, args.progress_seconds)
+    pipeline = build_pipeline(writer, args)
+    if args.email:
+        from email_service import outbox
+        outbox.start()
+
+    # Recordings handed to the pipeline; --limit counts these, not skipped ones
+    queued = 0
+    try:
+        for key, payload in iter_payloads(args.inputs):
+            if key in done:
+                continue
+            done.add(key)
+            job = {
+                'key': key,
+                'job_id': 'bf-' + re.sub(r'[^A-Za-z0-9_-]', '_', key.split(':', 1)[-1][:32]),
+                'meeting_data': payload,
+                'meeting_title': payload.get('meeting_title', 'Unknown Meeting'),
+                'created_at': payload.get('created_at'),
+                'started': time.monotonic(),
+            }
+            writer.add()
+            if not payload.get('transcript'):
+                writer.write(job, 'skipped', 'No transcript')
+                continue
+            # Blocks while the first stage is full, so input is read only as fast as it is processed
+            pipeline.submit(job, block=True)
+            queued += 1
+            if args.limit and queued >= args.limit:
+                break
+        writer.wait()
+        pipeline.shutdown()
+    finally:
+        # Every line is flushed as it is written, so the file is a valid checkpoint even when interrupted
+        writer.close()
+
+    if args.email:
+        from email_service import outbox
+        if not outbox.flush(timeout=300):
+            print("Some emails are still queued in the outbox; they are sent on the next start", file=sys.stderr)
+        outbox.shutdown()
+    print(writer.progress())
+    return dict(writer.counts, submitted=writer.submitted, seconds=round(time.monotonic() - writer.started, 1))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze historical Fathom recordings in bulk (resumable)")
+    parser.add_argument('inputs', nargs='+', help="JSONL/JSON files or directories of Fathom webhook payloads")
+    parser.add_argument('--output', default='backfill.jsonl',
+                        help="Results JSONL, also the resume checkpoint (default: backfill.jsonl)")
+    parser.add_argument('--reports', help="Render a PDF report per recording into this directory")
+    parser.add_argument('--email', metavar='ADDRESS', help="Queue each report email to this address")
+    parser.add_argument('--history', action='store_true', help="Record results in the analysis history store")
+    parser.add_argument('--retry-failed', action='store_true', help="Re-run recordings that failed last time")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the analysis cache")
+    parser.add_argument('--limit', type=int, default=0, help="Stop after submitting this many new recordings for analysis")
+    parser.add_argument('--format-workers', type=int, default=2)
+    parser.add_argument('--analysis-workers', type=int, default=rate_limiter.max_in_flight,
+                        help="Concurrent analyses (default: OPENAI_MAX_IN_FLIGHT, so the rate limiter sets the pace)")
+    parser.add_argument('--report-workers', type=int, default=max(1, int(os.environ.get('RENDER_WORKERS', '2'))))
+    parser.add_argument('--progress-seconds', type=float, default=30, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+    if args.email and not args.reports:
+        parser.error("--email attaches the rendered report, so it needs --reports")
+
+    try:
+        summary = run(args)
+    except KeyboardInterrupt:
+        print(f"Interrupted; run the same command again to resume from {args.output}", file=sys.stderr)
+        return 130
+    return 1 if summary['error'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for the sales analysis pipeline
+
+Run with ``python -m benchmarks.run``; see README.md for options.
+"""
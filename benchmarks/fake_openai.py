@@ -0,0 +1,220 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+from analysis_schema import ANALYSIS_SCHEMA, CATEGORY_SCHEMA, SUMMARY_SCHEMA
+
+FILLER_WORDS = ['asked', 'about', 'goals', 'clarified', 'the', 'budget', 'and', 'next', 'steps']
+
+
+def fake_instance(schema: Dict[str, Any], rng: random.Random) -> Any:
+    """Generate a value that satisfies a (strict, structured-output style) JSON schema"""
+    kind = schema.get('type')
+    if kind == 'object':
+        return {key: fake_instance(sub, rng) for key, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [fake_instance(schema.get('items', {'type': 'string'}), rng) for _ in range(rng.randint(1, 3))]
+    if kind == 'integer':
+        return rng.randint(4, 9)
+    if kind == 'number':
+        return round(rng.uniform(4, 9), 1)
+    if kind == 'boolean':
+        return rng.random() < 0.5
+    return ' '.join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(4, 12))).capitalize() + '.'
+
+
+def pick_schema(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Use the request's json_schema, or infer one from the system prompt in JSON mode"""
+    response_format = body.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        return response_format['json_schema']['schema']
+    system = next((m['content'] for m in body.get('messages', []) if m.get('role') == 'system'), '')
+    if 'ONE category' in system:
+        return CATEGORY_SCHEMA
+    if 'payment_detected' in system and '"categories"' not in system:
+        return SUMMARY_SCHEMA
+    return ANALYSIS_SCHEMA
+
+
+class FakeOpenAIServer:
+    """
+    Local stand-in for the chat completions API
+
+    Responses are valid analysis JSON generated from the requested schema.
+    Each request takes ``latency`` seconds plus completion tokens divided by
+    ``tokens_per_second``, and a share of requests (``error_rate``) is
+    answered with 429 so retry and rate-limit paths get exercised. Point the
+    app at it with ``OPENAI_BASE_URL=<server.url>``.
+
+    Args:
+        host (str): Bind address
+        port (int): Bind port (0 picks a free one)
+        latency (float): Fixed seconds added to every request (time to first token)
+        tokens_per_second (float): Simulated generation speed
+        error_rate (float): Fraction of requests answered with 429
+        seed (int): Random seed for response content and errors
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.2,
+                 tokens_per_second: float = 400, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'FakeOpenAIServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
+
+    def _complete(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build the completion for one request (None means answer with 429)"""
+        with self._lock:
+            self.requests += 1
+            if self._rng.random() < self.error_rate:
+                self.errors += 1
+                return None
+            content = json.dumps(fake_instance(pick_schema(body), self._rng))
+            prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+            completion_tokens = min(len(content) // 4, body.get('max_tokens') or len(content))
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        return {
+            'content': content,
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._json(404, {'error': {'message': 'not found'}})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                completion = server._complete(body)
+                time.sleep(server.latency)
+                if completion is None:
+                    self._json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                               {'retry-after-ms': '200'})
+                    return
+                if body.get('stream'):
+                    self._stream(body, completion)
+                    return
+                time.sleep(completion['usage']['completion_tokens'] / server.tokens_per_second)
+                self._json(200, {
+                    'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'fake'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': completion['content']},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': completion['usage']
+                })
+
+            def _json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body: Dict[str, Any], completion: Dict[str, Any]):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                content = completion['content']
+                # ~4 characters per token, sent a few tokens at a time
+                step = 16
+                delay = (step / 4) / server.tokens_per_second
+                chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                for start in range(0, len(content), step):
+                    event = {
+                        'id': chunk_id,
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': body.get('model', 'fake'),
+                        'choices': [{
+                            'index': 0,
+                            'delta': {'content': content[start:start + step]},
+                            'finish_reason': None
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions server")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=400)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, latency=args.latency,
+                              tokens_per_second=args.tokens_per_second, error_rate=args.error_rate)
+    print(f"Fake OpenAI server listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
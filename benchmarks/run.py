@@ -0,0 +1,333 @@
+"""
+Benchmark scenarios for the sales analysis pipeline
+
+Starts a fake OpenAI server and an SMTP sink, points the app at them through
+the environment, then times each scenario over synthetic transcripts and
+prints one JSON document with p50/p99 latency and throughput per scenario
+and call length.
+
+    python -m benchmarks.run --scenarios format,analyze --durations 5,60 --output before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.transcripts import DURATIONS_MINUTES, generate_transcript, generate_webhook
+
+SCENARIOS = ['startup', 'format', 'compact', 'analyze', 'report', 'email', 'webhook']
+# Scenarios that do not depend on the call length run once, not per duration
+SINGLE_RUN = {'startup'}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter: import the app, answer /health, then warm up
+COLD_START = (
+    "import time\n"
+    "started = time.perf_counter()\n"
+    "import app\n"
+    "status = app.app.test_client().get('/health').status_code\n"
+    "ready = time.perf_counter()\n"
+    "app.warm_up()\n"
+    "print(status, ready - started, time.perf_counter() - ready)\n"
+)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(scenario: str, minutes: Optional[int], latencies: List[float], wall_seconds: float,
+              **extra) -> Dict[str, Any]:
+    """Reduce raw latencies (seconds) to the result record written to JSON"""
+    return dict({
+        'scenario': scenario,
+        'call_minutes': minutes,
+        'iterations': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'max_ms': round(max(latencies) * 1000, 3) if latencies else 0.0,
+        'throughput_per_s': round(len(latencies) / wall_seconds, 3) if wall_seconds else 0.0
+    }, **extra)
+
+
+def time_calls(func: Callable[[], Any], iterations: int) -> List[float]:
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_format(minutes: int, iterations: int) -> Dict[str, Any]:
+    from app import format_transcript
+    transcript = generate_transcript(minutes)
+    started = time.perf_counter()
+    latencies = time_calls(lambda: format_transcript(transcript), iterations)
+    return summarize('format', minutes, latencies, time.perf_counter() - started,
+                     turns=len(transcript))
+
+
+def bench_compact(minutes: int, iterations: int) -> Dict[str, Any]:
+    from transcript_formatter import compact_transcript
+    transcript = generate_transcript(minutes)
+    started = time.perf_counter()
+    latencies = time_calls(lambda: compact_transcript(transcript), iterations)
+    wall = time.perf_counter() - started
+    _, stats = compact_transcript(transcript)
+    return summarize('compact', minutes, latencies, wall, **stats)
+
+
+def bench_analyze(minutes: int, iterations: int) -> Dict[str, Any]:
+    from app import format_transcript
+    from analysis_engine import analyze_call
+    text = format_transcript(generate_transcript(minutes))
+    started = time.perf_counter()
+    latencies = time_calls(lambda: analyze_call(text, use_cache=False), iterations)
+    return summarize('analyze', minutes, latencies, time.perf_counter() - started)
+
+
+def bench_report(minutes: int, iterations: int) -> Dict[str, Any]:
+    from app import format_transcript
+    from analysis_engine import analyze_call
+    from report_generator import render_report
+    text = format_transcript(generate_transcript(minutes))
+    analysis = analyze_call(text, use_cache=False)
+    sizes = []
+
+    def render():
+        sizes.append(len(render_report("Benchmark Call", '2024-01-01T12:00:00', text, analysis)))
+
+    started = time.perf_counter()
+    latencies = time_calls(render, iterations)
+    return summarize('report', minutes, latencies, time.perf_counter() - started,
+                     pdf_bytes=max(sizes) if sizes else 0)
+
+
+def bench_email(minutes: int, iterations: int) -> Dict[str, Any]:
+    from email_service import send_report_email, outbox
+    attachment = b'%PDF-1.4\n' + os.urandom(minutes * 2048)
+    started = time.perf_counter()
+    latencies = time_calls(
+        lambda: send_report_email('bench@example.com', "Benchmark Call", report_data=attachment,
+                                  filename='sales_analysis_bench.pdf'),
+        iterations
+    )
+    enqueued = time.perf_counter()
+    outbox.flush(timeout=300)
+    delivered = time.perf_counter()
+    return summarize('email', minutes, latencies, enqueued - started,
+                     delivery_seconds=round(delivered - started, 3),
+                     delivered_per_s=round(iterations / (delivered - started), 3))
+
+
+def bench_webhook(minutes: int, iterations: int) -> Dict[str, Any]:
+    """Post webhooks back to back and time each job from acceptance to its email being queued"""
+    import app as app_module
+    from webhook_ingest import WEBHOOK_SIGNATURE_HEADER, sign
+    client = app_module.app.test_client()
+    pipeline = app_module.pipeline
+    last_stage = pipeline.stages[-1].name
+    submitted: Dict[str, float] = {}
+    finished: Dict[str, float] = {}
+    failed: List[str] = []
+    done = threading.Condition()
+    previous_hook = pipeline.on_stage_done
+
+    def hook(stage, job, seconds, error):
+        if previous_hook is not None:
+            previous_hook(stage, job, seconds, error)
+        if error is not None or stage == last_stage:
+            with done:
+                finished[job['request_id']] = time.perf_counter()
+                if error is not None:
+                    failed.append(job['request_id'])
+                done.notify_all()
+
+    pipeline.on_stage_done = hook
+    # Signed raw bodies, as Fathom sends them
+    bodies = [json.dumps(generate_webhook(minutes, seed)).encode('utf-8') for seed in range(iterations)]
+    secret = os.environ['FATHOM_WEBHOOK_SECRET']
+    rejected = 0
+    started = time.perf_counter()
+    try:
+        for index, body in enumerate(bodies):
+            job_id = f"bench-{minutes}-{index}"
+            headers = {'X-Request-ID': job_id, WEBHOOK_SIGNATURE_HEADER: sign(body, secret)}
+            while True:
+                submitted[job_id] = time.perf_counter()
+                response = client.post('/webhook', data=body, content_type='application/json', headers=headers)
+                if response.status_code != 429:
+                    break
+                rejected += 1
+                time.sleep(0.05)
+
+        with done:
+            done.wait_for(lambda: len(finished) >= len(submitted), timeout=600)
+        wall = time.perf_counter() - started
+    finally:
+        pipeline.on_stage_done = previous_hook
+
+    latencies = [finished[job_id] - submitted[job_id] for job_id in finished]
+    return summarize('webhook', minutes, latencies, wall, rejected=rejected, failed=len(failed))
+
+
+def import_times(module: str = 'app', top: int = 15) -> Dict[str, Any]:
+    """Import ``module`` under ``python -X importtime`` and summarize the slowest packages"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True)
+    total_us = 0
+    slowest: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # column header
+        cumulative_us, name = int(fields[1]), fields[2].strip()
+        if fields[2].startswith('  '):
+            package = name.split('.')[0]
+            slowest[package] = max(slowest.get(package, 0), cumulative_us)
+        elif name == module:
+            total_us = cumulative_us
+            break
+        else:
+            # A top-level import of interpreter startup, not of the module; its children were counted
+            slowest.clear()
+    ranked = sorted(slowest.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'import_ms': round(total_us / 1000, 3),
+        'import_ok': result.returncode == 0,
+        'slowest_imports_ms': {name: round(us / 1000, 3) for name, us in ranked}
+    }
+
+
+def bench_startup(minutes: Optional[int], iterations: int) -> Dict[str, Any]:
+    """Cold start of a fresh interpreter until /health answers, then the background warm-up"""
+    latencies, warm_ups, failures = [], [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        launched = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, capture_output=True, text=True)
+        finished = time.perf_counter()
+        try:
+            status, ready, warm_up = result.stdout.strip().splitlines()[-1].split()
+        except (IndexError, ValueError):
+            failures += 1
+            continue
+        if status != '200':
+            failures += 1
+        # Interpreter start plus app import plus the first /health request
+        latencies.append(finished - launched - float(warm_up))
+        warm_ups.append(float(warm_up))
+    return summarize('startup', None, latencies, time.perf_counter() - started,
+                     failed=failures,
+                     warm_up_p50_ms=round(percentile(warm_ups, 50) * 1000, 3),
+                     **import_times())
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'format': bench_format,
+    'compact': bench_compact,
+    'analyze': bench_analyze,
+    'report': bench_report,
+    'email': bench_email,
+    'webhook': bench_webhook,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark the sales analysis pipeline offline")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--durations', default=','.join(str(m) for m in DURATIONS_MINUTES),
+                        help="Comma-separated call lengths in minutes")
+    parser.add_argument('--iterations', type=int, default=10, help="Runs per scenario and call length")
+    parser.add_argument('--latency', type=float, default=0.2, help="Fake OpenAI time to first token (s)")
+    parser.add_argument('--tokens-per-second', type=float, default=400, help="Fake OpenAI generation speed")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of fake OpenAI 429s")
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help="SMTP sink seconds per message")
+    parser.add_argument('--output', help="Write the JSON results here instead of stdout")
+    parser.add_argument('--verbose', action='store_true', help="Show application log output")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    durations = [int(value) for value in args.durations.split(',') if value.strip()]
+
+    openai_server = FakeOpenAIServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                     error_rate=args.error_rate).start()
+    smtp_sink = SMTPSink(latency=args.smtp_latency).start()
+
+    # Must be set before the app modules are imported, since they read config at import time
+    os.environ.update({
+        'OPENAI_BASE_URL': openai_server.url,
+        'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY') or 'benchmark',
+        'SMTP_SERVER': smtp_sink.host,
+        'SMTP_PORT': str(smtp_sink.port),
+        'SMTP_STARTTLS': 'false',
+        'EMAIL_OUTBOX_PATH': '',
+        'EMAIL_RETRY_BASE': '0.1',
+        'JOB_STORE_PATH': ':memory:',
+        'FATHOM_WEBHOOK_SECRET': 'benchmark-secret',
+    })
+    os.environ.setdefault('ANALYSIS_CACHE_DISABLED', 'true')
+    os.environ.setdefault('USER_EMAIL', 'bench@example.com')
+
+    results = []
+    log = io.StringIO()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(log)
+    try:
+        with quiet:
+            for scenario in scenarios:
+                if scenario in SINGLE_RUN:
+                    results.append(BENCHMARKS[scenario](None, args.iterations))
+                    continue
+                for minutes in durations:
+                    results.append(BENCHMARKS[scenario](minutes, args.iterations))
+    finally:
+        openai_server.stop()
+        smtp_sink.stop()
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': results,
+        'fake_openai': openai_server.stats(),
+        'smtp_sink': smtp_sink.stats()
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Benchmark results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import socketserver
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+class SMTPSink:
+    """
+    Minimal local SMTP server that accepts and discards mail
+
+    Speaks enough SMTP for smtplib (EHLO, AUTH, MAIL, RCPT, DATA, NOOP, RSET,
+    QUIT) without TLS, so run the app with ``SMTP_STARTTLS=false``. Counts
+    sessions and messages so benchmarks can check connection reuse.
+
+    Args:
+        host (str): Bind address
+        port (int): Bind port (0 picks a free one)
+        latency (float): Seconds to wait before acknowledging each message
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.sessions = 0
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> 'SMTPSink':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'sessions': self.sessions, 'messages': self.messages, 'bytes': self.bytes}
+
+    def _record(self, sessions: int = 0, messages: int = 0, size: int = 0):
+        with self._lock:
+            self.sessions += sessions
+            self.messages += messages
+            self.bytes += size
+
+    def _handler(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                sink._record(sessions=1)
+                self.reply('220 smtp-sink ready')
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    command = raw.decode('utf-8', 'replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb == 'EHLO':
+                        self.wfile.write(b'250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+                    elif verb == 'HELO':
+                        self.reply('250 smtp-sink')
+                    elif verb == 'AUTH':
+                        self.reply('235 Authentication successful')
+                    elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        size = 0
+                        while True:
+                            line = self.rfile.readline()
+                            if not line or line in (b'.\r\n', b'.\n'):
+                                break
+                            size += len(line)
+                        if sink.latency:
+                            time.sleep(sink.latency)
+                        sink._record(messages=1, size=size)
+                        self.reply('250 OK queued')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Command not implemented')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP server that discards mail")
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds per accepted message")
+    args = parser.parse_args()
+
+    sink = SMTPSink(port=args.port, latency=args.latency)
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    try:
+        sink._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import random
+from typing import Dict, Any, List
+
+# Phrases roughly following the call framework, so stage detection and
+# chunking see realistic transitions
+COACH_LINES = [
+    [
+        "Thanks for jumping on today. Where are you right now with your health and fitness?",
+        "Tell me a bit about your current routine and how your week usually looks.",
+        "How long has this been on your mind?",
+    ],
+    [
+        "So if I understand correctly, the main thing is energy and confidence?",
+        "When you say you feel stuck, what does that look like day to day?",
+        "Let me make sure I have this right before we go further.",
+    ],
+    [
+        "What have you tried in the past to fix this?",
+        "Why do you think those programs didn't stick?",
+        "What was the biggest challenge last time you tried a diet?",
+    ],
+    [
+        "Imagine six months from now with the energy you want. What changes?",
+        "What would it mean for your family if you got this sorted?",
+        "Our program covers nutrition, training and the mindset piece together.",
+    ],
+    [
+        "What's holding you back from starting today?",
+        "I hear you on the price. What's it worth to finally solve this?",
+        "The investment is $2,997, or three payments of $997.",
+    ],
+    [
+        "Great, I'll send the onboarding materials right after this call.",
+        "You made a great decision today. Our first session is Friday.",
+        "Let's get your payment set up so you can start this week.",
+    ],
+]
+
+PROSPECT_LINES = [
+    "I've been struggling with this for a few years now, honestly.",
+    "I just don't have much energy after work and the kids.",
+    "I tried keto and it worked for a while but I gained it back.",
+    "That sounds good but I'm worried about the cost.",
+    "My partner is supportive, they want me to feel better too.",
+    "I think the main problem is I don't know what to eat.",
+    "Yeah, that makes sense. I'd love to feel confident again.",
+    "Okay, I think I could make the payment plan work.",
+]
+
+# Roughly 12 speaker turns per minute of conversation
+TURNS_PER_MINUTE = 12
+
+DURATIONS_MINUTES = [5, 15, 30, 60, 120, 180]
+
+
+def _timestamp(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def generate_transcript(minutes: int, seed: int = 0, coach: str = 'Coach',
+                        prospect: str = 'Prospect') -> List[Dict[str, Any]]:
+    """
+    Build a synthetic call transcript in Fathom's webhook list format
+
+    Args:
+        minutes (int): Call length; the turn count scales with it
+        seed (int): Random seed, so the same arguments give the same transcript
+
+    Returns:
+        List[Dict]: Entries with ``speaker.display_name``, ``text`` and ``timestamp``
+    """
+    rng = random.Random(seed * 1000 + minutes)
+    turns = max(4, minutes * TURNS_PER_MINUTE)
+    seconds_per_turn = minutes * 60 / turns
+    entries = []
+    for turn in range(turns):
+        stage = min(len(COACH_LINES) - 1, turn * len(COACH_LINES) // turns)
+        if turn % 2 == 0:
+            speaker, text = coach, rng.choice(COACH_LINES[stage])
+        else:
+            speaker = prospect
+            # Longer calls have longer answers
+            text = ' '.join(rng.choice(PROSPECT_LINES) for _ in range(rng.randint(1, 3)))
+        entries.append({
+            'speaker': {'display_name': speaker},
+            'text': text,
+            'timestamp': _timestamp(int(turn * seconds_per_turn))
+        })
+    return entries
+
+
+def generate_webhook(minutes: int, seed: int = 0) -> Dict[str, Any]:
+    """Build a Fathom webhook payload around a synthetic transcript"""
+    return {
+        'recording_id': f"bench-{minutes}m-{seed}",
+        'meeting_title': f"Benchmark Call {minutes}m #{seed}",
+        'created_at': '2024-01-01T12:00:00',
+        'transcript': generate_transcript(minutes, seed)
+    }
@@ -1,26 +1,51 @@
-import smtplib
 import os
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
+from email.mime.application import MIMEApplication
 from email import encoders
 from datetime import datetime
+from typing import List, Optional, Tuple, Union
+from mail_outbox import outbox_from_env
 
-def send_report_email(recipient_email: str, meeting_title: str, report_path: str):
+# Durable outbox drained by a background sender over pooled SMTP connections
+outbox = outbox_from_env()
+
+REPORT_CONTENTS = [
+    "Overall performance score",
+    "Category-specific scores and feedback",
+    "Conversation highlights",
+    "Missed opportunities",
+    "Actionable improvement suggestions",
+]
+
+
+def send_report_email(recipient_email: str, meeting_title: str, report_path: Optional[str] = None,
+                      report_data: Optional[Union[bytes, memoryview]] = None,
+                      filename: Optional[str] = None,
+                      extra_attachments: Optional[List[Tuple[str, Union[bytes, memoryview]]]] = None,
+                      report_links: Optional[List[Tuple[str, str]]] = None,
+                      transcript_note: Optional[str] = None):
     """
-    Send the analysis report via email
+    Queue the analysis report email for delivery
+    
+    The message is stored in the outbox and sent by its background sender,
+    which batches messages per SMTP session and retries failures with backoff.
     
     Args:
         recipient_email (str): Email address to send the report to
         meeting_title (str): Title of the meeting for the email subject
         report_path (str): Path to the PDF report file
+        report_data (bytes): In-memory PDF to attach instead of reading report_path
+        filename (str): Attachment filename for report_data
+        extra_attachments (list): Additional (filename, PDF bytes) attachments
+        report_links (list): (label, URL) links to the stored report, sent instead of attachments
+        transcript_note (str): How the transcript is included (e.g. "Full transcript");
+            it is left out of the contents list when None
     """
     
     # Email configuration (you'll need to set these environment variables)
-    smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
     sender_email = os.environ.get('SENDER_EMAIL', 'your-email@gmail.com')
-    sender_password = os.environ.get('SENDER_PASSWORD', 'your-app-password')
     
     try:
         # Create message
@@ -29,22 +54,28 @@ def send_report_email(recipient_email: str, meeting_title: str, report_path: str
         msg['To'] = recipient_email
         msg['Subject'] = f"Sales Call Analysis Report - {meeting_title}"
         
+        if report_links:
+            delivery = "You can view the detailed analysis here:\n\n" + "\n".join(
+                f"{label}: {url}" for label, url in report_links
+            )
+        else:
+            delivery = "Please find the detailed analysis attached."
+        
+        # Only list the transcript when this email actually attaches or links it
+        contents = REPORT_CONTENTS + ([transcript_note] if transcript_note else [])
+        contents_list = '\n'.join(f"- {item}" for item in contents)
+        
         # Email body
         body = f"""
 Hello!
 
-Your sales call analysis report is ready. Please find the detailed analysis attached.
+Your sales call analysis report is ready. {delivery}
 
 Meeting: {meeting_title}
 Analysis Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 
 The report includes:
-- Overall performance score
-- Category-specific scores and feedback
-- Conversation highlights
-- Missed opportunities
-- Actionable improvement suggestions
-- Full transcript
+{contents_list}
 
 Best regards,
 Your Sales Analysis System
@@ -53,7 +84,15 @@ Your Sales Analysis System
         msg.attach(MIMEText(body, 'plain'))
         
         # Attach PDF report
-        if os.path.exists(report_path):
+        if report_data is not None:
+            # Encoded straight from the render buffer, no temporary file
+            part = MIMEApplication(report_data, _subtype='pdf')
+            part.add_header(
+                'Content-Disposition',
+                f'attachment; filename= {filename or "sales_analysis.pdf"}'
+            )
+            msg.attach(part)
+        elif report_path and os.path.exists(report_path):
             with open(report_path, "rb") as attachment:
                 part = MIMEBase('application', 'octet-stream')
                 part.set_payload(attachment.read())
@@ -67,17 +106,17 @@ Your Sales Analysis System
             
             msg.attach(part)
         
-        # Send email
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, recipient_email, text)
-        server.quit()
+        for extra_filename, extra_data in extra_attachments or []:
+            part = MIMEApplication(extra_data, _subtype='pdf')
+            part.add_header('Content-Disposition', f'attachment; filename= {extra_filename}')
+            msg.attach(part)
+        
+        # Queue email; delivery and retries happen in the outbox sender
+        message_id = outbox.enqueue(msg, sender_email, [recipient_email])
         
-        print(f"Report email sent successfully to {recipient_email}")
+        print(f"Report email queued for {recipient_email} (outbox id {message_id})")
         
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        # You might want to implement a fallback notification method here
+        print(f"Error queueing email: {str(e)}")
+        raise
 
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings, picked up automatically from the working directory
+
+Workers must import the app themselves: it opens SQLite databases and starts
+background threads at import time, neither of which survives a fork, so the
+app is never preloaded into the master. What the master can safely do is
+import the heavy third-party libraries once (GUNICORN_PRELOAD_LIBRARIES), so
+every forked worker finds them already in sys.modules. After boot each worker
+warms its lazily loaded subsystems in the background (WORKER_WARM_UP).
+"""
+import importlib
+import os
+import threading
+import time
+
+# Never preload app.py into the master (see above)
+preload_app = False
+
+PRELOAD_LIBRARIES = os.environ.get('GUNICORN_PRELOAD_LIBRARIES', 'true').lower() in ('1', 'true', 'yes')
+WARM_UP = os.environ.get('WORKER_WARM_UP', 'true').lower() in ('1', 'true', 'yes')
+
+# Imported by the master; none of them start threads or open connections on import
+LIBRARIES = ['flask', 'openai', 'reportlab.platypus', 'reportlab.pdfgen.canvas', 'tiktoken']
+
+
+def on_starting(server):
+    if not PRELOAD_LIBRARIES:
+        return
+    started = time.monotonic()
+    for name in LIBRARIES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning("Could not preload %s: %s", name, e)
+    server.log.info("Preloaded libraries in %.2fs", time.monotonic() - started)
+
+
+def post_worker_init(worker):
+    if not WARM_UP:
+        return
+
+    def warm():
+        try:
+            # Already imported by the worker at this point, so this is a dict lookup
+            import app
+            app.warm_up()
+        except Exception as e:
+            worker.log.warning("Worker warm-up failed: %s", e)
+
+    threading.Thread(target=warm, name='worker-warm-up', daemon=True).start()
@@ -0,0 +1,378 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from analysis_schema import CATEGORY_KEYS
+from rubric import category_score, overall_score
+
+PERIODS = ('day', 'week')
+# Overall scores are integers 0-100; one histogram bin per value gives exact percentiles
+SCORE_BINS = 101
+PERCENTILES = (25, 50, 75, 90)
+# Rollup rows with this coach value aggregate every coach
+ALL_COACHES = ''
+
+
+def parse_meeting_date(created_at: Optional[str]) -> datetime:
+    """Meeting timestamp from Fathom's ISO ``created_at`` (now if missing or unparseable)"""
+    if created_at:
+        try:
+            return datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def bucket_key(period: str, date: datetime) -> str:
+    """"2024-01-31" for days, ISO "2024-W05" for weeks (both sort chronologically)"""
+    if period == 'week':
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    return date.strftime('%Y-%m-%d')
+
+
+def histogram_percentile(histogram: List[int], pct: float) -> Optional[int]:
+    """Nearest-rank percentile of the scores counted in a histogram"""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = max(1, math.ceil(pct / 100 * total))
+    seen = 0
+    for score, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return score
+    return len(histogram) - 1
+
+
+class HistoryStore:
+    """
+    Indexed history of analysis results with incrementally maintained rollups
+
+    Every recorded call is kept in ``calls`` (indexed by meeting date, coach
+    and overall score) with one ``call_scores`` row per category (indexed by
+    category and score). In the same transaction the call's contribution is
+    added to the daily and weekly ``rollups`` rows for its coach and for all
+    coaches: call count, score sums, per-category sums, payment-method
+    counts and a score histogram. Rollup queries read only those rows, so
+    their cost depends on the number of days/weeks asked for, not on the
+    number of calls. Re-recording a call replaces its earlier contribution.
+
+    Args:
+        path (str): SQLite database path
+    """
+
+    def __init__(self, path: str = 'cache/history.db'):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path) if path != ':memory:' else ''
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS calls ('
+            ' id TEXT PRIMARY KEY,'
+            ' meeting_date TEXT NOT NULL,'
+            ' meeting_at TEXT NOT NULL,'
+            ' title TEXT,'
+            ' coach TEXT NOT NULL,'
+            ' overall_score INTEGER NOT NULL,'
+            ' payment TEXT NOT NULL,'
+            ' results TEXT NOT NULL,'
+            ' recorded_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS idx_calls_date ON calls (meeting_date);'
+            'CREATE INDEX IF NOT EXISTS idx_calls_coach_date ON calls (coach, meeting_date);'
+            'CREATE INDEX IF NOT EXISTS idx_calls_score ON calls (overall_score);'
+            'CREATE TABLE IF NOT EXISTS call_scores ('
+            ' call_id TEXT NOT NULL,'
+            ' category TEXT NOT NULL,'
+            ' score INTEGER NOT NULL,'
+            ' PRIMARY KEY (call_id, category));'
+            'CREATE INDEX IF NOT EXISTS idx_call_scores_category ON call_scores (category, score);'
+            'CREATE TABLE IF NOT EXISTS rollups ('
+            ' period TEXT NOT NULL,'
+            ' bucket TEXT NOT NULL,'
+            ' coach TEXT NOT NULL,'
+            ' calls INTEGER NOT NULL,'
+            ' score_sum INTEGER NOT NULL,'
+            ' categories TEXT NOT NULL,'
+            ' payments TEXT NOT NULL,'
+            ' histogram TEXT NOT NULL,'
+            ' PRIMARY KEY (period, coach, bucket));'
+        )
+
+    def record(self, call_id: str, meeting_title: str, created_at: Optional[str],
+               analysis_results: Dict[str, Any], coach: Optional[str] = None) -> bool:
+        """
+        Store one analysis and fold it into the rollups
+
+        Failed analyses (with an ``error`` key) are not recorded, since their
+        zero scores would drag the averages down.
+
+        Args:
+            call_id (str): Stable identifier (the job ID)
+            meeting_title (str): Meeting title
+            created_at (str): Meeting timestamp (ISO format)
+            analysis_results (Dict): Analysis output
+            coach (str): Coach name (defaults to the pre-analysis guess)
+
+        Returns:
+            bool: True if the call was recorded
+        """
+        if analysis_results.get('error'):
+            return False
+        meeting_at = parse_meeting_date(created_at)
+        categories = analysis_results.get('categories')
+        categories = categories if isinstance(categories, dict) else {}
+        # Model output is coerced and clamped by the rubric; unusable category scores are left out
+        scores = {key: category_score(category) for key, category in categories.items()}
+        call = {
+            'coach': coach or (analysis_results.get('call_stats') or {}).get('coach') or 'Unknown',
+            'overall_score': min(SCORE_BINS - 1, max(0, round(overall_score(categories)))),
+            'payment': analysis_results.get('payment_detected') or 'Unknown',
+            'scores': {key: round(score) for key, score in scores.items() if score is not None},
+            'meeting_at': meeting_at
+        }
+
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                previous = self._load_call(call_id)
+                if previous is not None:
+                    self._apply(previous, -1)
+                self._db.execute(
+                    'INSERT OR REPLACE INTO calls (id, meeting_date, meeting_at, title, coach, overall_score,'
+                    ' payment, results, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (call_id, meeting_at.strftime('%Y-%m-%d'), meeting_at.isoformat(), meeting_title,
+                     call['coach'], call['overall_score'], call['payment'],
+                     json.dumps(analysis_results), time.time())
+                )
+                self._db.execute('DELETE FROM call_scores WHERE call_id = ?', (call_id,))
+                self._db.executemany(
+                    'INSERT INTO call_scores (call_id, category, score) VALUES (?, ?, ?)',
+                    [(call_id, key, score) for key, score in call['scores'].items()]
+                )
+                self._apply(call, 1)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return True
+
+    def rollups(self, period: str = 'day', coach: Optional[str] = None,
+                start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Precomputed per-day or per-week aggregates, oldest first
+
+        Args:
+            period (str): "day" or "week"
+            coach (str): Only this coach's calls (default: all coaches)
+            start (str): First meeting date to include (YYYY-MM-DD)
+            end (str): Last meeting date to include (YYYY-MM-DD)
+        """
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+        query = ('SELECT bucket, calls, score_sum, categories, payments, histogram FROM rollups'
+                 ' WHERE period = ? AND coach = ?')
+        params: list = [period, coach or ALL_COACHES]
+        if start:
+            query += ' AND bucket >= ?'
+            params.append(bucket_key(period, parse_meeting_date(start)))
+        if end:
+            query += ' AND bucket <= ?'
+            params.append(bucket_key(period, parse_meeting_date(end)))
+        with self._lock:
+            rows = self._db.execute(query + ' ORDER BY bucket', params).fetchall()
+        return [self._summarize(*row) for row in rows if row[1] > 0]
+
+    def calls(self, coach: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+              category: Optional[str] = None, min_score: Optional[int] = None,
+              max_score: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Recorded calls, newest first, filtered through the indexes
+
+        ``min_score``/``max_score`` apply to ``category`` when given, otherwise
+        to the overall score.
+        """
+        if category is not None and category not in CATEGORY_KEYS:
+            raise ValueError(f"Unknown category: {category}")
+        if category:
+            query = ('SELECT c.id, c.meeting_at, c.title, c.coach, c.overall_score, c.payment, s.score'
+                     ' FROM call_scores s JOIN calls c ON c.id = s.call_id WHERE s.category = ?')
+            params: list = [category]
+            score_column = 's.score'
+        else:
+            query = ('SELECT c.id, c.meeting_at, c.title, c.coach, c.overall_score, c.payment, NULL'
+                     ' FROM calls c WHERE 1 = 1')
+            params = []
+            score_column = 'c.overall_score'
+        for clause, value in ((f' AND {score_column} >= ?', min_score), (f' AND {score_column} <= ?', max_score),
+                              (' AND c.coach = ?', coach), (' AND c.meeting_date >= ?', start),
+                              (' AND c.meeting_date <= ?', end)):
+            if value is not None and value != '':
+                query += clause
+                params.append(value)
+        query += ' ORDER BY c.meeting_at DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        results = []
+        for call_id, meeting_at, title, coach_name, overall, payment, category_score in rows:
+            entry = {'call_id': call_id, 'meeting_at': meeting_at, 'title': title, 'coach': coach_name,
+                     'overall_score': overall, 'payment': payment}
+            if category:
+                entry['category_score'] = category_score
+            results.append(entry)
+        return results
+
+    def get(self, call_id: str) -> Optional[Dict[str, Any]]:
+        """The stored analysis results of one call"""
+        with self._lock:
+            row = self._db.execute('SELECT results FROM calls WHERE id = ?', (call_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_call(self, call_id: str) -> Optional[Dict[str, Any]]:
+        """Title, meeting time and stored analysis of one call (for regenerating its report)"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT title, meeting_at, coach, results FROM calls WHERE id = ?', (call_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'call_id': call_id, 'title': row[0], 'meeting_at': row[1], 'coach': row[2],
+                'results': json.loads(row[3])}
+
+    def iter_results(self, batch_size: int = 5000) -> Iterator[List[Tuple[str, int, Dict[str, Any]]]]:
+        """Yield batches of (call_id, overall_score, analysis results) in ID order"""
+        last_id = ''
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT id, overall_score, results FROM calls WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [(call_id, overall, json.loads(results)) for call_id, overall, results in rows]
+
+    def update_overall_scores(self, updates: List[Tuple[str, int, Dict[str, Any]]]) -> int:
+        """
+        Replace the overall score and stored results of many calls in one transaction
+
+        Each call's old contribution is taken out of its rollups and the new
+        one added, so rollups stay consistent without being rebuilt.
+
+        Args:
+            updates: (call_id, new overall score, new analysis results) tuples
+
+        Returns:
+            int: Number of calls updated
+        """
+        updated = 0
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for call_id, score, results in updates:
+                    previous = self._load_call(call_id)
+                    if previous is None:
+                        continue
+                    self._apply(previous, -1)
+                    score = min(SCORE_BINS - 1, max(0, int(score)))
+                    self._db.execute(
+                        'UPDATE calls SET overall_score = ?, results = ? WHERE id = ?',
+                        (score, json.dumps(results), call_id)
+                    )
+                    self._apply(dict(previous, overall_score=score), 1)
+                    updated += 1
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return updated
+
+    def coaches(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT coach, COUNT(*), MAX(meeting_date) FROM calls GROUP BY coach ORDER BY coach'
+            ).fetchall()
+        return [{'coach': coach, 'calls': count, 'last_call': last} for coach, count, last in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self._db.execute('SELECT COUNT(*) FROM calls').fetchone()[0]
+            rollups = self._db.execute('SELECT COUNT(*) FROM rollups').fetchone()[0]
+        return {'calls': calls, 'rollup_rows': rollups}
+
+    def _load_call(self, call_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            'SELECT coach, overall_score, payment, meeting_at FROM calls WHERE id = ?', (call_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        scores = dict(self._db.execute(
+            'SELECT category, score FROM call_scores WHERE call_id = ?', (call_id,)
+        ).fetchall())
+        return {'coach': row[0], 'overall_score': row[1], 'payment': row[2], 'scores': scores,
+                'meeting_at': datetime.fromisoformat(row[3])}
+
+    def _apply(self, call: Dict[str, Any], sign: int):
+        """Add (sign=1) or remove (sign=-1) one call's contribution to its rollup rows"""
+        for period in PERIODS:
+            bucket = bucket_key(period, call['meeting_at'])
+            for coach in (call['coach'], ALL_COACHES):
+                row = self._db.execute(
+                    'SELECT calls, score_sum, categories, payments, histogram FROM rollups'
+                    ' WHERE period = ? AND coach = ? AND bucket = ?', (period, coach, bucket)
+                ).fetchone()
+                if row is None:
+                    calls, score_sum, categories, payments, histogram = 0, 0, {}, {}, [0] * SCORE_BINS
+                else:
+                    calls, score_sum = row[0], row[1]
+                    categories, payments, histogram = json.loads(row[2]), json.loads(row[3]), json.loads(row[4])
+
+                calls += sign
+                score_sum += sign * call['overall_score']
+                histogram[call['overall_score']] += sign
+                payments[call['payment']] = payments.get(call['payment'], 0) + sign
+                for key, score in call['scores'].items():
+                    total, count = categories.get(key, (0, 0))
+                    categories[key] = (total + sign * score, count + sign)
+
+                self._db.execute(
+                    'INSERT OR REPLACE INTO rollups (period, bucket, coach, calls, score_sum, categories,'
+                    ' payments, histogram) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (period, bucket, coach, calls, score_sum, json.dumps(categories),
+                     json.dumps({k: v for k, v in payments.items() if v}), json.dumps(histogram))
+                )
+
+    @staticmethod
+    def _summarize(bucket: str, calls: int, score_sum: int, categories: str, payments: str,
+                   histogram: str) -> Dict[str, Any]:
+        categories, payments, histogram = json.loads(categories), json.loads(payments), json.loads(histogram)
+        return {
+            'bucket': bucket,
+            'calls': calls,
+            'average_score': round(score_sum / calls, 2),
+            'category_averages': {
+                key: round(total / count, 2) for key, (total, count) in categories.items() if count
+            },
+            'payment_mix': {label: round(count / calls, 3) for label, count in payments.items()},
+            'payment_counts': payments,
+            'score_percentiles': {f"p{pct}": histogram_percentile(histogram, pct) for pct in PERCENTILES}
+        }
+
+
+def history_store_from_env() -> Optional[HistoryStore]:
+    """Build the history store from environment settings (None when disabled)"""
+    if os.environ.get('HISTORY_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+    return HistoryStore(path=os.environ.get('HISTORY_PATH', 'cache/history.db'))
@@ -0,0 +1,393 @@
+import base64
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from rate_limiter import backoff_delay
+
+
+def worker_id() -> str:
+    """Identity used as lease owner: host, process and a random suffix"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _encode(value: Any) -> Any:
+    # PDF buffers are bytes/memoryview; everything else in a job is JSON already
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'__bytes__': base64.b64encode(bytes(value)).decode('ascii')}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def dumps_job(job: Dict[str, Any]) -> str:
+    return json.dumps(job, default=_encode)
+
+
+def loads_job(text: str) -> Dict[str, Any]:
+    return json.loads(text, object_hook=_decode)
+
+
+class JobStore:
+    """
+    Durable job table with time-limited leases
+
+    Each job row holds the serialized job state and the name of the next
+    stage to run. A process works on a job only while it holds the lease,
+    which it extends with ``heartbeat``; if the process dies the lease
+    expires and any process calling ``claim`` picks the job up again and
+    resumes it from its last checkpoint rather than from the start. The
+    database is SQLite in WAL mode, so every gunicorn worker on a host can
+    share it; a networked database exposing the same methods would extend
+    this across hosts.
+
+    Args:
+        path (str): SQLite database path
+        lease_seconds (float): Lease length granted by claim/heartbeat
+        max_attempts (int): Claims after which a job is marked failed
+        retry_base (float): Base delay in seconds before a failed stage is retried
+        retry_max (float): Maximum delay in seconds before a failed stage is retried
+    """
+
+    def __init__(self, path: str = 'cache/jobs.db', lease_seconds: float = 120, max_attempts: int = 5,
+                 retry_base: float = 10, retry_max: float = 600):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path) if path != ':memory:' else ''
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id TEXT PRIMARY KEY,'
+            ' dedupe_key TEXT UNIQUE,'
+            ' state TEXT NOT NULL,'
+            ' next_stage TEXT,'
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' lease_owner TEXT,'
+            ' lease_until REAL NOT NULL DEFAULT 0,'
+            ' available_at REAL NOT NULL DEFAULT 0,'
+            ' last_error TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_jobs_claimable ON jobs (status, available_at, lease_until)'
+        )
+
+    def create(self, job: Dict[str, Any], owner: Optional[str] = None, dedupe_key: Optional[str] = None,
+               next_stage: Optional[str] = None) -> Optional[str]:
+        """
+        Record a new job, leased to ``owner`` if given
+
+        Returns:
+            str: None if the job was created, otherwise the id of the existing
+            job with the same dedupe key
+        """
+        now = time.time()
+        lease_until = now + self.lease_seconds if owner else 0
+        with self._lock:
+            try:
+                self._db.execute(
+                    'INSERT INTO jobs (id, dedupe_key, state, next_stage, status, attempts, lease_owner,'
+                    ' lease_until, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job['job_id'], dedupe_key, dumps_job(job), next_stage,
+                     'running' if owner else 'pending', 1 if owner else 0, owner, lease_until, now, now)
+                )
+            except sqlite3.IntegrityError:
+                row = self._db.execute(
+                    'SELECT id FROM jobs WHERE dedupe_key = ? OR id = ?', (dedupe_key, job['job_id'])
+                ).fetchone()
+                return row[0] if row else job['job_id']
+        return None
+
+    def claim(self, owner: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        Lease up to ``limit`` runnable jobs: pending ones, and running ones whose lease expired
+
+        Returns:
+            List of dicts with ``job`` (the checkpointed state) and ``next_stage``
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                # Jobs that keep crashing their worker are given up on
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = 'too many attempts', lease_owner = NULL,"
+                    " updated_at = ? WHERE status IN ('pending', 'running') AND lease_until < ?"
+                    ' AND attempts >= ?',
+                    (now, now, self.max_attempts)
+                )
+                rows = self._db.execute(
+                    "SELECT id, state, next_stage FROM jobs WHERE status IN ('pending', 'running')"
+                    ' AND lease_until < ? AND available_at <= ? ORDER BY created_at LIMIT ?',
+                    (now, now, limit)
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET status = 'running', lease_owner = ?, lease_until = ?,"
+                    ' attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                    [(owner, now + self.lease_seconds, now, row[0]) for row in rows]
+                )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return [{'job': loads_job(state), 'next_stage': next_stage} for _, state, next_stage in rows]
+
+    def heartbeat(self, job_ids: List[str], owner: str) -> List[str]:
+        """Extend the leases ``owner`` holds on ``job_ids``; returns the ids whose lease was lost"""
+        now = time.time()
+        lost = []
+        with self._lock:
+            for job_id in job_ids:
+                cursor = self._db.execute(
+                    'UPDATE jobs SET lease_until = ? WHERE id = ? AND lease_owner = ?'
+                    " AND status = 'running'",
+                    (now + self.lease_seconds, job_id, owner)
+                )
+                if cursor.rowcount == 0:
+                    lost.append(job_id)
+        return lost
+
+    def checkpoint(self, job: Dict[str, Any], owner: str, next_stage: Optional[str]) -> bool:
+        """Persist the job state after a completed stage (marks it done when next_stage is None)"""
+        now = time.time()
+        status = 'running' if next_stage else 'done'
+        # Finished jobs keep only their metadata and results, not the PDFs
+        state = job if next_stage else {k: v for k, v in job.items() if not isinstance(v, (bytes, memoryview))}
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET state = ?, next_stage = ?, status = ?, updated_at = ?,'
+                ' lease_until = CASE WHEN ? THEN ? ELSE 0 END'
+                ' WHERE id = ? AND lease_owner = ?',
+                (dumps_job(state), next_stage, status, now,
+                 bool(next_stage), now + self.lease_seconds, job['job_id'], owner)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, owner: str, delay: float = 0, error: Optional[str] = None) -> bool:
+        """Give up the lease so the job can be claimed again after ``delay`` seconds"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_until = 0,"
+                ' available_at = ?, last_error = COALESCE(?, last_error), updated_at = ?'
+                ' WHERE id = ? AND lease_owner = ?',
+                (now + delay, error, now, job_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def retry(self, job_id: str, owner: str, error: str) -> Optional[float]:
+        """
+        Release a job whose stage failed for a retry with backoff, or fail it once out of attempts
+
+        The job resumes from its last checkpoint, so only the failed stage
+        runs again, on whichever worker claims it first.
+
+        Returns:
+            The retry delay in seconds, or None if the job was marked failed
+            (or the lease was no longer ``owner``'s)
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT attempts FROM jobs WHERE id = ? AND lease_owner = ?', (job_id, owner)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0] >= self.max_attempts:
+            self.fail(job_id, owner, f"{error} (after {row[0]} attempts)")
+            return None
+        delay = backoff_delay(row[0] - 1, base=self.retry_base, maximum=self.retry_max)
+        return delay if self.release(job_id, owner, delay=delay, error=error) else None
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_until = 0,"
+                ' last_error = ?, updated_at = ? WHERE id = ? AND lease_owner = ?',
+                (error, now, job_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, job_id: str, owner: str) -> bool:
+        """Forget a job that was never accepted (e.g. rejected with 429)"""
+        with self._lock:
+            cursor = self._db.execute('DELETE FROM jobs WHERE id = ? AND lease_owner = ?', (job_id, owner))
+        return cursor.rowcount == 1
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The last checkpointed state of a job (finished jobs keep everything but the PDFs)"""
+        with self._lock:
+            row = self._db.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return loads_job(row[0]) if row else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, status, next_stage, attempts, lease_owner, last_error, created_at, updated_at'
+                ' FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ('job_id', 'status', 'next_stage', 'attempts', 'lease_owner', 'last_error',
+                'created_at', 'updated_at')
+        return dict(zip(keys, row))
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished and failed jobs last updated more than ``older_than`` seconds ago"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+        return max(cursor.rowcount, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            counts = dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            expired = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND lease_until < ?", (now,)
+            ).fetchone()[0]
+        return {
+            'pending': counts.get('pending', 0),
+            'running': counts.get('running', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'expired_leases': expired
+        }
+
+
+class JobRunner:
+    """
+    Connects a JobStore to a StagedPipeline in one process
+
+    A background thread claims runnable jobs whenever the pipeline's first
+    stage has room and submits them at their checkpointed stage, and extends
+    the leases of every job this process holds. ``track``/``untrack`` record
+    which jobs are in flight locally.
+
+    Args:
+        store (JobStore): Durable job table
+        pipeline (StagedPipeline): Local pipeline that runs the stages
+        owner (str): Lease owner id for this process
+        poll_seconds (float): How often to look for claimable jobs
+        batch_size (int): Maximum jobs claimed per poll
+        retention_seconds (float): How long finished and failed jobs are kept
+    """
+
+    def __init__(self, store: JobStore, pipeline, owner: str, poll_seconds: float = 2, batch_size: int = 4,
+                 retention_seconds: float = 7 * 86400):
+        self.store = store
+        self.pipeline = pipeline
+        self.owner = owner
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.retention_seconds = retention_seconds
+        self.resumed = 0
+        self.leases_lost = 0
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='job-runner', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def track(self, job: Dict[str, Any]):
+        with self._lock:
+            self._active[job['job_id']] = job
+
+    def untrack(self, job_id: str):
+        with self._lock:
+            self._active.pop(job_id, None)
+
+    def holds(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._active
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = len(self._active)
+        return {'active': active, 'resumed': self.resumed, 'leases_lost': self.leases_lost}
+
+    def _run(self):
+        last_heartbeat = last_purge = 0.0
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                if time.monotonic() - last_heartbeat >= self.store.lease_seconds / 3:
+                    self._heartbeat()
+                    last_heartbeat = time.monotonic()
+                self._claim()
+                if time.monotonic() - last_purge >= 3600:
+                    self.store.purge(self.retention_seconds)
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"Error in job runner: {str(e)}")
+
+    def _heartbeat(self):
+        with self._lock:
+            job_ids = list(self._active)
+        if not job_ids:
+            return
+        for job_id in self.store.heartbeat(job_ids, self.owner):
+            # Another process took the job over; stop working on our copy
+            print(f"[{job_id}] Lease lost, dropping local copy")
+            self.leases_lost += 1
+            self.untrack(job_id)
+
+    def _claim(self):
+        if self.pipeline.is_full():
+            return
+        for claimed in self.store.claim(self.owner, self.batch_size):
+            job, stage = claimed['job'], claimed['next_stage']
+            print(f"[{job['job_id']}] Resuming job at stage '{stage or 'start'}'")
+            self.track(job)
+            self.resumed += 1
+            try:
+                self.pipeline.submit(job, stage=stage, block=True, timeout=self.poll_seconds * 5)
+            except Exception as e:
+                # Could not hand it to a local worker; let someone else pick it up
+                self.untrack(job['job_id'])
+                self.store.release(job['job_id'], self.owner, error=str(e))
+
+
+def job_store_from_env() -> Optional[JobStore]:
+    """Build the job store from environment settings (None when disabled)"""
+    if os.environ.get('JOB_STORE_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+    return JobStore(
+        path=os.environ.get('JOB_STORE_PATH', 'cache/jobs.db'),
+        lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', '120')),
+        max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5')),
+        retry_base=float(os.environ.get('JOB_RETRY_BASE', '10')),
+        retry_max=float(os.environ.get('JOB_RETRY_MAX', '600'))
+    )
@@ -0,0 +1,351 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from rubric import CATEGORY_WEIGHTS, apply_rubric
+from transcript_chunker import FRAMEWORK_STAGES, detect_stage, reduce_chunk_results
+from transcript_formatter import TRANSCRIPT_COMPACT, compact_transcript, split_legend
+from token_counter import count_tokens
+
+
+def _chain(digest: str, line: str) -> str:
+    """Running digest of the lines received so far, to check the final transcript starts with them"""
+    return hashlib.sha256((digest + '\n' + line).encode('utf-8')).hexdigest()
+
+
+class LiveAnalyzer:
+    """
+    Incremental analysis of calls that are still in progress
+
+    Transcript lines arrive in batches while the call runs. Lines are
+    buffered per meeting; when a line opens a later framework stage the
+    buffered stage is complete, so the buffer is closed as a segment and
+    analyzed in the background with the long-transcript chunk prompt.
+    Buffers shorter than ``min_segment_tokens`` keep growing across stage
+    changes, and buffers reaching ``max_segment_tokens`` are closed
+    regardless. Once the meeting ends, ``finish`` only has to analyze the
+    still-open tail and reduces it with the stored segment results, the same
+    way long transcripts are reduced.
+
+    Session and segment state live in SQLite, so batches of one meeting may
+    land on different gunicorn workers.
+
+    Args:
+        path (str): SQLite database path
+        workers (int): Background threads analyzing closed segments
+        min_segment_tokens (int): Smallest buffer closed at a stage change
+        max_segment_tokens (int): Buffer size that is closed regardless of stage
+        session_ttl (float): Seconds without updates after which a session is dropped
+        finish_wait (float): Seconds finish waits for segments still being analyzed elsewhere
+    """
+
+    def __init__(self, path: str = 'cache/live.db', workers: int = 2, min_segment_tokens: int = 600,
+                 max_segment_tokens: int = 6000, session_ttl: float = 6 * 3600, finish_wait: float = 60):
+        self.min_segment_tokens = min_segment_tokens
+        self.max_segment_tokens = max_segment_tokens
+        self.session_ttl = session_ttl
+        self.finish_wait = finish_wait
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='live-analysis')
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(path) if path != ':memory:' else ''
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS live_sessions ('
+            ' meeting_id TEXT PRIMARY KEY,'
+            ' stage INTEGER NOT NULL,'
+            ' line_count INTEGER NOT NULL,'
+            ' digest TEXT NOT NULL,'
+            ' buffer TEXT NOT NULL,'
+            ' buffer_stages TEXT NOT NULL,'
+            ' buffer_tokens INTEGER NOT NULL,'
+            ' segments INTEGER NOT NULL,'
+            ' updated_at REAL NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS live_segments ('
+            ' meeting_id TEXT NOT NULL,'
+            ' seq INTEGER NOT NULL,'
+            ' stages TEXT NOT NULL,'
+            ' text TEXT NOT NULL,'
+            ' tokens INTEGER NOT NULL,'
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            ' result TEXT,'
+            ' error TEXT,'
+            ' updated_at REAL NOT NULL,'
+            ' PRIMARY KEY (meeting_id, seq));'
+        )
+
+    def has_session(self, meeting_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM live_sessions WHERE meeting_id = ?', (meeting_id,)
+            ).fetchone() is not None
+
+    def append(self, meeting_id: str, lines: List[str]) -> Dict[str, Any]:
+        """
+        Add transcript lines (formatted "[timestamp] Speaker: text") to a live session
+
+        Returns:
+            The session status (see ``status``)
+        """
+        now = time.time()
+        closed = []
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    'SELECT stage, line_count, digest, buffer, buffer_stages, buffer_tokens, segments'
+                    ' FROM live_sessions WHERE meeting_id = ?', (meeting_id,)
+                ).fetchone()
+                if row is None:
+                    stage, line_count, digest, buffer, buffer_stages, buffer_tokens, segments = -1, 0, '', [], [], 0, 0
+                else:
+                    stage, line_count, digest, buffer, buffer_stages, buffer_tokens, segments = (
+                        row[0], row[1], row[2], json.loads(row[3]), json.loads(row[4]), row[5], row[6])
+
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    tokens = count_tokens(line) + 1
+                    new_stage = detect_stage(line, stage)
+                    # A later stage opening means the buffered one is complete
+                    if buffer and ((new_stage != stage and buffer_tokens >= self.min_segment_tokens)
+                                   or buffer_tokens + tokens > self.max_segment_tokens):
+                        segments += 1
+                        closed.append(segments)
+                        self._insert_segment(meeting_id, segments, buffer, buffer_stages, buffer_tokens, now)
+                        buffer, buffer_stages, buffer_tokens = [], [], 0
+                    stage = new_stage
+                    buffer.append(line)
+                    if stage >= 0 and stage not in buffer_stages:
+                        buffer_stages.append(stage)
+                    buffer_tokens += tokens
+                    line_count += 1
+                    digest = _chain(digest, line)
+
+                self._db.execute(
+                    'INSERT OR REPLACE INTO live_sessions (meeting_id, stage, line_count, digest, buffer,'
+                    ' buffer_stages, buffer_tokens, segments, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (meeting_id, stage, line_count, digest, json.dumps(buffer), json.dumps(buffer_stages),
+                     buffer_tokens, segments, now)
+                )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+        for seq in closed:
+            self._executor.submit(self._analyze_segment, meeting_id, seq)
+        self._purge_expired()
+        return self.status(meeting_id)
+
+    def status(self, meeting_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Progress of a live session with provisional scores
+
+        ``provisional`` reduces the segments analyzed so far, so it covers
+        only the completed stages.
+        """
+        with self._lock:
+            session = self._db.execute(
+                'SELECT stage, line_count, buffer_tokens, updated_at FROM live_sessions WHERE meeting_id = ?',
+                (meeting_id,)
+            ).fetchone()
+            segments = self._db.execute(
+                'SELECT seq, stages, tokens, status, result FROM live_segments WHERE meeting_id = ? ORDER BY seq',
+                (meeting_id,)
+            ).fetchall()
+        if session is None:
+            return None
+        done = [(json.loads(result), tokens) for _, _, tokens, status, result in segments if status == 'done']
+        provisional = None
+        if done:
+            provisional = apply_rubric(reduce_chunk_results([r for r, _ in done], CATEGORY_WEIGHTS,
+                                                            [t for _, t in done]))
+        return {
+            'meeting_id': meeting_id,
+            'current_stage': FRAMEWORK_STAGES[session[0]][0] if session[0] >= 0 else None,
+            'lines': session[1],
+            'open_tokens': session[2],
+            'segments': [{'seq': seq, 'stages': json.loads(stages), 'tokens': tokens, 'status': status}
+                         for seq, stages, tokens, status, _ in segments],
+            'provisional': provisional,
+            'updated_at': session[3]
+        }
+
+    def finish(self, meeting_id: str, transcript: str) -> Optional[Dict[str, Any]]:
+        """
+        Complete the analysis of a finished call, reusing the live segment results
+
+        Lines of the final transcript beyond those already received are added
+        to the open tail, the tail is analyzed, and every segment result is
+        reduced into the standard analysis schema. Segments another worker is
+        still analyzing are waited for up to ``finish_wait`` seconds, then
+        re-analyzed here.
+
+        Returns:
+            The analysis results, or None if there is no session or the final
+            transcript does not start with the lines received live (the caller
+            should then analyze the whole call)
+        """
+        from analysis_engine import finalize_results
+
+        lines = [line for line in transcript.split('\n') if line.strip()]
+        with self._lock:
+            row = self._db.execute(
+                'SELECT line_count, digest FROM live_sessions WHERE meeting_id = ?', (meeting_id,)
+            ).fetchone()
+        if row is None or len(lines) < row[0]:
+            return None
+        digest = ''
+        for line in lines[:row[0]]:
+            digest = _chain(digest, line)
+        if digest != row[1]:
+            print(f"Live session {meeting_id} does not match the final transcript, analyzing in full")
+            return None
+
+        # The tail becomes the last segment
+        self.append(meeting_id, lines[row[0]:])
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                session = self._db.execute(
+                    'SELECT buffer, buffer_stages, buffer_tokens, segments FROM live_sessions WHERE meeting_id = ?',
+                    (meeting_id,)
+                ).fetchone()
+                buffer, buffer_stages, buffer_tokens, segments = json.loads(session[0]), json.loads(session[1]), \
+                    session[2], session[3]
+                if buffer:
+                    segments += 1
+                    self._insert_segment(meeting_id, segments, buffer, buffer_stages, buffer_tokens, time.time())
+                    self._db.execute(
+                        "UPDATE live_sessions SET buffer = '[]', buffer_stages = '[]', buffer_tokens = 0,"
+                        ' segments = ? WHERE meeting_id = ?', (segments, meeting_id)
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+        tail = segments if buffer else None
+        if tail is not None:
+            print(f"Live session {meeting_id}: analyzing the {buffer_tokens}-token tail")
+            self._analyze_segment(meeting_id, tail)
+        results = self._collect(meeting_id)
+        analysis_results = reduce_chunk_results([r for r, _ in results], CATEGORY_WEIGHTS, [t for _, t in results])
+        analysis_results['live_segments'] = len(results)
+        self.discard(meeting_id)
+        return finalize_results(analysis_results, transcript)
+
+    def discard(self, meeting_id: str):
+        with self._lock:
+            self._db.execute('DELETE FROM live_segments WHERE meeting_id = ?', (meeting_id,))
+            self._db.execute('DELETE FROM live_sessions WHERE meeting_id = ?', (meeting_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = self._db.execute('SELECT COUNT(*) FROM live_sessions').fetchone()[0]
+            counts = dict(self._db.execute(
+                'SELECT status, COUNT(*) FROM live_segments GROUP BY status').fetchall())
+        return {'sessions': sessions, 'segments_pending': counts.get('pending', 0),
+                'segments_done': counts.get('done', 0), 'segments_failed': counts.get('failed', 0)}
+
+    def _insert_segment(self, meeting_id: str, seq: int, lines: List[str], stages: List[int], tokens: int,
+                        now: float):
+        self._db.execute(
+            'INSERT OR REPLACE INTO live_segments (meeting_id, seq, stages, text, tokens, status, updated_at)'
+            " VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+            (meeting_id, seq, json.dumps([FRAMEWORK_STAGES[s][0] for s in sorted(stages)]),
+             '\n'.join(lines), tokens, now)
+        )
+
+    def _analyze_segment(self, meeting_id: str, seq: int):
+        """Analyze one closed segment and store its result (errors are stored, not raised)"""
+        from analysis_engine import CHUNK_MAX_TOKENS, build_chunk_prompt, request_analysis
+        with self._lock:
+            row = self._db.execute(
+                'SELECT stages, text, tokens FROM live_segments WHERE meeting_id = ? AND seq = ?',
+                (meeting_id, seq)
+            ).fetchone()
+        if row is None:
+            return
+        text, legend = row[1], ''
+        if TRANSCRIPT_COMPACT:
+            legend, text = split_legend(compact_transcript(text)[0])
+        chunk = {'stages': json.loads(row[0]), 'text': text, 'tokens': row[2]}
+        try:
+            result = request_analysis(build_chunk_prompt(chunk, seq, None, legend), CHUNK_MAX_TOKENS, schema=None)
+            if 'raw_analysis' in result:
+                raise ValueError("segment analysis could not be parsed")
+            status, payload, error = 'done', json.dumps(result), None
+        except Exception as e:
+            print(f"Live session {meeting_id}: segment {seq} failed: {str(e)}")
+            status, payload, error = 'failed', None, str(e)
+        with self._lock:
+            self._db.execute(
+                'UPDATE live_segments SET status = ?, result = ?, error = ?, updated_at = ?'
+                ' WHERE meeting_id = ? AND seq = ?',
+                (status, payload, error, time.time(), meeting_id, seq)
+            )
+
+    def _collect(self, meeting_id: str) -> List[tuple]:
+        """All segment results in order, analyzing any that failed or stalled"""
+        deadline = time.monotonic() + self.finish_wait
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT seq, tokens, status, result FROM live_segments WHERE meeting_id = ? ORDER BY seq',
+                    (meeting_id,)
+                ).fetchall()
+            pending = [seq for seq, _, status, _ in rows if status == 'pending']
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+        for seq, _, status, _ in rows:
+            if status != 'done':
+                self._analyze_segment(meeting_id, seq)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT tokens, result FROM live_segments WHERE meeting_id = ? AND status = 'done' ORDER BY seq",
+                (meeting_id,)
+            ).fetchall()
+        if not rows:
+            raise RuntimeError(f"No segment of live session {meeting_id} could be analyzed")
+        return [(json.loads(result), tokens) for tokens, result in rows]
+
+    def _purge_expired(self):
+        if time.monotonic() - self._last_purge < 300:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM live_segments WHERE meeting_id IN'
+                ' (SELECT meeting_id FROM live_sessions WHERE updated_at < ?)', (cutoff,)
+            )
+            self._db.execute('DELETE FROM live_sessions WHERE updated_at < ?', (cutoff,))
+
+
+def live_analyzer_from_env() -> Optional[LiveAnalyzer]:
+    """Build the live analyzer from environment settings (None when disabled)"""
+    if os.environ.get('LIVE_ANALYSIS_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+    return LiveAnalyzer(
+        path=os.environ.get('LIVE_ANALYSIS_PATH', 'cache/live.db'),
+        workers=int(os.environ.get('LIVE_ANALYSIS_WORKERS', '2')),
+        min_segment_tokens=int(os.environ.get('LIVE_MIN_SEGMENT_TOKENS', '600')),
+        max_segment_tokens=int(os.environ.get('LIVE_MAX_SEGMENT_TOKENS', '6000')),
+        session_ttl=float(os.environ.get('LIVE_SESSION_TTL', str(6 * 3600))),
+        finish_wait=float(os.environ.get('LIVE_FINISH_WAIT', '60'))
+    )
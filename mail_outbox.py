@@ -0,0 +1,402 @@
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from email.message import Message
+from email.utils import getaddresses
+from typing import Dict, Any, List, Optional
+
+from rate_limiter import backoff_delay
+
+# Errors that mean the connection is gone and should be replaced
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError, OSError)
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP sessions open between sends
+
+    A connection is handed out by ``acquire`` and returned with ``release``.
+    Idle connections are checked with NOOP before reuse and closed once they
+    have been idle longer than ``idle_timeout``, so bursts of mail reuse one
+    STARTTLS + login handshake instead of paying for it per message.
+
+    Args:
+        host (str): SMTP server host
+        port (int): SMTP server port
+        username (str): Login user (empty to skip authentication)
+        password (str): Login password
+        starttls (bool): Upgrade the connection with STARTTLS after connecting
+        size (int): Maximum number of idle connections kept open
+        idle_timeout (float): Seconds an idle connection is kept before closing it
+        timeout (float): Socket timeout for SMTP commands
+    """
+
+    def __init__(self, host: str, port: int, username: str = '', password: str = '',
+                 starttls: bool = True, size: int = 2, idle_timeout: float = 60, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: List[tuple] = []
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.reuses = 0
+
+    def acquire(self) -> smtplib.SMTP:
+        """Return a live, logged-in connection (reused when possible)"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released_at = self._idle.pop()
+            if time.monotonic() - released_at > self.idle_timeout:
+                self._close(connection)
+                continue
+            try:
+                # Keepalive check: servers drop idle sessions without telling us
+                if connection.noop()[0] == 250:
+                    with self._lock:
+                        self.reuses += 1
+                    return connection
+            except CONNECTION_ERRORS + (smtplib.SMTPException,):
+                pass
+            self._close(connection)
+        return self._connect()
+
+    def release(self, connection: smtplib.SMTP, broken: bool = False):
+        """Return a connection to the pool, closing it if broken or the pool is full"""
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((connection, time.monotonic()))
+                    return
+        self._close(connection)
+
+    def prune(self):
+        """Close connections that have been idle longer than idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c, released_at in self._idle if now - released_at > self.idle_timeout]
+            self._idle = [(c, t) for c, t in self._idle if now - t <= self.idle_timeout]
+        for connection in expired:
+            self._close(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+        except BaseException:
+            self._close(connection)
+            raise
+        with self._lock:
+            self.connects += 1
+        return connection
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+class MailOutbox:
+    """
+    Durable send queue drained by a background sender thread
+
+    ``enqueue`` stores the fully built message in SQLite and returns at once,
+    so pipeline workers never wait on SMTP. The sender claims due messages in
+    batches, sends each batch over one pooled connection and deletes them once
+    accepted. Failed messages are rescheduled with exponential backoff and
+    survive restarts; permanently rejected messages, or messages that
+    exhaust ``max_attempts``, are kept with status ``dead`` for inspection.
+
+    Claims are leased, so several processes can share one outbox database
+    without sending a message twice unless a sender dies mid-batch.
+
+    Args:
+        pool (SMTPConnectionPool): Connections used for delivery
+        path (str): SQLite database path (":memory:" keeps the queue in-process only)
+        batch_size (int): Maximum messages sent per SMTP session
+        max_attempts (int): Attempts before a message is marked dead
+        retry_base (float): Base delay in seconds for retry backoff
+        retry_max (float): Maximum delay in seconds between retries
+        lease_seconds (float): How long a claimed batch is reserved for one sender
+    """
+
+    def __init__(self, pool: SMTPConnectionPool, path: str = ':memory:', batch_size: int = 10,
+                 max_attempts: int = 8, retry_base: float = 30, retry_max: float = 3600,
+                 lease_seconds: float = 300):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._owner = uuid.uuid4().hex
+
+        directory = os.path.dirname(path) if path != ':memory:' else ''
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' sender TEXT NOT NULL,'
+            ' recipients TEXT NOT NULL,'
+            ' message BLOB NOT NULL,'
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' next_attempt_at REAL NOT NULL,'
+            ' claimed_by TEXT,'
+            ' claimed_until REAL NOT NULL DEFAULT 0,'
+            ' last_error TEXT,'
+            ' created_at REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)'
+        )
+
+    def enqueue(self, message: Message, sender: Optional[str] = None,
+                recipients: Optional[List[str]] = None) -> int:
+        """
+        Queue a message for delivery
+
+        Args:
+            message (Message): Fully built email message
+            sender (str): Envelope sender (defaults to the From header)
+            recipients (list): Envelope recipients (defaults to To/Cc/Bcc headers)
+
+        Returns:
+            int: Outbox message id
+        """
+        sender = sender or message['From']
+        if recipients is None:
+            headers = message.get_all('To', []) + message.get_all('Cc', []) + message.get_all('Bcc', [])
+            recipients = [address for _, address in getaddresses(headers) if address]
+        if not recipients:
+            raise ValueError("Message has no recipients")
+        if message['Bcc'] is not None:
+            del message['Bcc']
+
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT INTO outbox (sender, recipients, message, next_attempt_at, created_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (sender, '\n'.join(recipients), message.as_bytes(), now, now)
+            )
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def start(self):
+        """Start the background sender (idempotent)"""
+        with self._lock:
+            if self._closed or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no message is due for sending; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.start()
+        while self._due_count() > 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self, wait: bool = True, timeout: float = 30):
+        """Stop the sender; pending messages stay queued for the next start"""
+        self._closed = True
+        self._wakeup.set()
+        if wait and self._thread is not None:
+            self._thread.join(timeout)
+        self.pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        counts = dict(rows)
+        return {
+            'pending': counts.get('pending', 0),
+            'dead': counts.get('dead', 0),
+            'sent': self.sent,
+            'failed_attempts': self.failed_attempts,
+            'smtp_connects': self.pool.connects,
+            'smtp_reuses': self.pool.reuses
+        }
+
+    def _due_count(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?",
+                (time.time(),)
+            ).fetchone()[0]
+
+    def _claim(self) -> List[tuple]:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET claimed_by = ?, claimed_until = ? WHERE id IN ('
+                " SELECT id FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+                ' AND claimed_until < ? ORDER BY next_attempt_at LIMIT ?)',
+                (self._owner, now + self.lease_seconds, now, now, self.batch_size)
+            )
+            return self._db.execute(
+                'SELECT id, sender, recipients, message, attempts FROM outbox'
+                " WHERE claimed_by = ? AND claimed_until > ? AND status = 'pending'",
+                (self._owner, now)
+            ).fetchall()
+
+    def _next_due_in(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(MAX(next_attempt_at, claimed_until)) FROM outbox WHERE status = 'pending'"
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while not self._closed:
+            batch = self._claim()
+            if batch:
+                self._send_batch(batch)
+                continue
+            self.pool.prune()
+            wait = self._next_due_in()
+            self._wakeup.wait(min(wait, 30) if wait is not None else 30)
+            self._wakeup.clear()
+
+    def _send_batch(self, batch: List[tuple]):
+        """Send a claimed batch over one connection, reconnecting if it drops"""
+        connection = None
+        for index, (message_id, sender, recipients, message, attempts) in enumerate(batch):
+            if self._closed:
+                self._unclaim(message_id)
+                continue
+            try:
+                if connection is None:
+                    connection = self.pool.acquire()
+            except Exception as e:
+                # Server unreachable or login failed: nothing in this batch can go out
+                for remaining in batch[index:]:
+                    self._reschedule(remaining[0], remaining[4] + 1, f"connect failed: {str(e)}")
+                return
+
+            try:
+                refused = connection.sendmail(sender, recipients.split('\n'), message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                self._mark_dead(message_id, attempts + 1, str(e))
+                continue
+            except smtplib.SMTPResponseException as e:
+                error = f"{e.smtp_code} {e.smtp_error!r}"
+                if 500 <= e.smtp_code < 600:
+                    self._mark_dead(message_id, attempts + 1, error)
+                else:
+                    self._reschedule(message_id, attempts + 1, error)
+                continue
+            except CONNECTION_ERRORS as e:
+                # Session dropped; the next message gets a fresh connection
+                self.pool.release(connection, broken=True)
+                connection = None
+                self._reschedule(message_id, attempts + 1, str(e))
+                continue
+
+            if refused:
+                print(f"Email to {', '.join(refused)} was refused by the server")
+            self._mark_sent(message_id)
+
+        if connection is not None:
+            self.pool.release(connection)
+
+    def _mark_sent(self, message_id: int):
+        with self._lock:
+            self._db.execute('DELETE FROM outbox WHERE id = ?', (message_id,))
+            self.sent += 1
+
+    def _reschedule(self, message_id: int, attempts: int, error: str):
+        if attempts >= self.max_attempts:
+            self._mark_dead(message_id, attempts, error)
+            return
+        delay = backoff_delay(attempts - 1, base=self.retry_base, maximum=self.retry_max)
+        print(f"Error sending email (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?,'
+                ' claimed_by = NULL, claimed_until = 0 WHERE id = ?',
+                (attempts, time.time() + delay, error, message_id)
+            )
+            self.failed_attempts += 1
+
+    def _mark_dead(self, message_id: int, attempts: int, error: str):
+        print(f"Giving up on email {message_id} after {attempts} attempt(s): {error}")
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = 'dead', attempts = ?, last_error = ?,"
+                ' claimed_by = NULL, claimed_until = 0 WHERE id = ?',
+                (attempts, error, message_id)
+            )
+            self.failed_attempts += 1
+            self.dead += 1
+
+    def _unclaim(self, message_id: int):
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET claimed_by = NULL, claimed_until = 0 WHERE id = ?', (message_id,)
+            )
+
+
+def outbox_from_env() -> MailOutbox:
+    """Build the SMTP pool and outbox from environment settings"""
+    pool = SMTPConnectionPool(
+        host=os.environ.get('SMTP_SERVER', 'smtp.gmail.com'),
+        port=int(os.environ.get('SMTP_PORT', '587')),
+        username=os.environ.get('SENDER_EMAIL', 'your-email@gmail.com'),
+        password=os.environ.get('SENDER_PASSWORD', 'your-app-password'),
+        starttls=os.environ.get('SMTP_STARTTLS', 'true').lower() in ('1', 'true', 'yes'),
+        size=int(os.environ.get('SMTP_POOL_SIZE', '2')),
+        idle_timeout=float(os.environ.get('SMTP_IDLE_TIMEOUT', '60'))
+    )
+    return MailOutbox(
+        pool,
+        path=os.environ.get('EMAIL_OUTBOX_PATH', 'cache/outbox.db') or ':memory:',
+        batch_size=int(os.environ.get('EMAIL_BATCH_SIZE', '10')),
+        max_attempts=int(os.environ.get('EMAIL_MAX_ATTEMPTS', '8')),
+        retry_base=float(os.environ.get('EMAIL_RETRY_BASE', '30')),
+        retry_max=float(os.environ.get('EMAIL_RETRY_MAX', '3600'))
+    )
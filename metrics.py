@@ -0,0 +1,210 @@
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Default latency buckets in seconds, spanning fast local stages to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Base of the metric types; subclasses report their current values through ``samples``"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    @abstractmethod
+    def samples(self) -> List[Sample]:
+        """Current ``(name, labels, value)`` samples in exposition order"""
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    samples.append((f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative))
+                samples.append((f'{self.name}_sum', labels, total))
+                samples.append((f'{self.name}_count', labels, count))
+        return samples
+
+
+class Registry:
+    """
+    Holds metrics and gauge callbacks and renders the Prometheus text format
+
+    Collectors are callables returning ``(name, type, help, samples)`` tuples;
+    they are evaluated at scrape time for values that live elsewhere, such as
+    queue depth or cache size.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, str, List[Sample]]]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        families = [(m.name, m.type_name, m.help_text, m.samples()) for m in self._metrics]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+        for name, type_name, help_text, samples in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {type_name}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'sales_agent_stage_duration_seconds', 'Time spent in each processing stage', ['stage']))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    'sales_agent_stage_errors_total', 'Errors raised by each processing stage', ['stage']))
+JOBS = REGISTRY.register(Counter(
+    'sales_agent_jobs_total', 'Webhook jobs by admission outcome', ['outcome']))
+TRANSCRIPT_TOKENS_SAVED = REGISTRY.register(Counter(
+    'sales_agent_transcript_tokens_saved_total', 'Prompt tokens removed by transcript compaction'))
+OPENAI_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'sales_agent_openai_request_duration_seconds', 'OpenAI chat completion latency', ['model']))
+OPENAI_REQUESTS = REGISTRY.register(Counter(
+    'sales_agent_openai_requests_total', 'OpenAI chat completion requests by outcome', ['model', 'outcome']))
+OPENAI_TOKENS = REGISTRY.register(Counter(
+    'sales_agent_openai_tokens_total', 'Tokens reported by the OpenAI API', ['model', 'type']))
+ROUTE_REQUESTS = REGISTRY.register(Counter(
+    'sales_agent_route_requests_total', 'Routed analyses by route and outcome', ['route', 'outcome']))
+ROUTE_SECONDS = REGISTRY.register(Histogram(
+    'sales_agent_route_duration_seconds', 'Latency of routed analyses, including escalation', ['route']))
+ROUTE_TOKENS = REGISTRY.register(Counter(
+    'sales_agent_route_tokens_total', 'Tokens used by routed analyses', ['route', 'type']))
+ROUTE_COMPLEXITY = REGISTRY.register(Histogram(
+    'sales_agent_route_complexity', 'Complexity scores the model router assigned to calls',
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1, 1.5, 2, 3)))
+
+
+def observe_stage(stage: str, seconds: float, error: Optional[BaseException] = None):
+    """Record one stage execution"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if error is not None:
+        STAGE_ERRORS.inc(stage=stage)
+
+
+def record_openai_response(model: str, seconds: float, response=None, error: Optional[BaseException] = None):
+    """Record latency, outcome and token usage of one OpenAI request"""
+    OPENAI_REQUEST_SECONDS.observe(seconds, model=model)
+    OPENAI_REQUESTS.inc(model=model, outcome=type(error).__name__ if error is not None else 'ok')
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        OPENAI_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, model=model, type='prompt')
+        OPENAI_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, model=model, type='completion')
+
+
+def gauge_family(name: str, help_text: str, values: Dict[Tuple[Tuple[str, str], ...], float]):
+    """Build a collector result for a gauge from ``{label pairs: value}``"""
+    return (name, 'gauge', help_text, [(name, dict(labels), value) for labels, value in values.items()])
@@ -0,0 +1,150 @@
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from metrics import ROUTE_COMPLEXITY, ROUTE_REQUESTS, ROUTE_SECONDS, ROUTE_TOKENS
+from pre_analysis import pre_analyze
+from token_counter import count_tokens
+
+
+def call_features(transcript: str, facts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Cheap local features of a call used to pick a model
+
+    Args:
+        transcript (str): Formatted transcript text
+        facts (Dict): Pre-analysis facts, computed here if not given
+
+    Returns:
+        Dict with prompt ``tokens``, ``speakers``, ``turns`` and whether a
+        price or payment method was discussed (``price_discussed``)
+    """
+    facts = facts if facts is not None else pre_analyze(transcript)
+    return {
+        'tokens': count_tokens(transcript),
+        'speakers': len(facts['talk_ratio']),
+        'turns': facts['turns'],
+        'price_discussed': bool(facts['prices']) or facts['payment_detected'] != 'Unknown',
+    }
+
+
+class ModelRouter:
+    """
+    Sends simple calls to a fast model and complex ones to the full model
+
+    Each transcript gets a complexity score from its features: its length as
+    a fraction of ``complex_tokens``, plus ``speaker_weight`` for every
+    speaker beyond two, plus ``price_weight`` if a price or payment was
+    discussed. Calls scoring below ``threshold`` take the fast route (a
+    smaller model with a smaller completion budget), so a short no-show or
+    qualifying call never waits on the large model; anything with a pitch
+    or a long discovery takes the full route. With ``escalate`` set, a fast
+    result that fails validation is redone on the full route instead of
+    being repaired.
+
+    Per-route request counts, latency and token usage are kept in ``stats``
+    and exported as Prometheus metrics, with the complexity scores as a
+    histogram, so the threshold can be tuned against real traffic.
+
+    Args:
+        full_model (str): Model for complex calls
+        full_max_tokens (int): Completion budget for complex calls
+        fast_model (str): Model for simple calls
+        fast_max_tokens (int): Completion budget for simple calls
+        threshold (float): Complexity below which a call takes the fast route
+        complex_tokens (int): Transcript length that alone makes a call complex
+        speaker_weight (float): Complexity added per speaker beyond two
+        price_weight (float): Complexity added when a price or payment was discussed
+        escalate (bool): Redo invalid fast results on the full route
+    """
+
+    def __init__(self, full_model: str, full_max_tokens: int, fast_model: str = 'gpt-4.1-nano',
+                 fast_max_tokens: int = 2500, threshold: float = 0.5, complex_tokens: int = 6000,
+                 speaker_weight: float = 0.3, price_weight: float = 0.4, escalate: bool = True):
+        self.routes = {
+            'fast': {'name': 'fast', 'model': fast_model, 'max_tokens': fast_max_tokens},
+            'full': {'name': 'full', 'model': full_model, 'max_tokens': full_max_tokens},
+        }
+        self.threshold = threshold
+        self.complex_tokens = complex_tokens
+        self.speaker_weight = speaker_weight
+        self.price_weight = price_weight
+        self.escalate = escalate
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {'calls': 0, 'errors': 0, 'escalated': 0, 'seconds': 0.0,
+                   'prompt_tokens': 0, 'completion_tokens': 0}
+            for name in self.routes
+        }
+
+    @property
+    def cache_tag(self) -> str:
+        """Routing settings that change results; part of the analysis cache key"""
+        fast = self.routes['fast']
+        return (f"route:{fast['model']}:{fast['max_tokens']}:{self.threshold}:{self.complex_tokens}:"
+                f"{self.speaker_weight}:{self.price_weight}")
+
+    def complexity(self, features: Dict[str, Any]) -> float:
+        score = features['tokens'] / self.complex_tokens
+        score += self.speaker_weight * max(0, features['speakers'] - 2)
+        if features['price_discussed']:
+            score += self.price_weight
+        return score
+
+    def choose(self, transcript: str, facts: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], float]:
+        """
+        Pick the route for a transcript
+
+        Returns:
+            Tuple of the route (``name``, ``model``, ``max_tokens``) and its complexity score
+        """
+        score = self.complexity(call_features(transcript, facts))
+        ROUTE_COMPLEXITY.observe(score)
+        return self.routes['fast' if score < self.threshold else 'full'], score
+
+    def record(self, route: Dict[str, Any], seconds: float, usage: Optional[Dict[str, int]] = None,
+               error: Optional[BaseException] = None, escalated: bool = False):
+        """Record one routed analysis: its latency, tokens and whether it failed or was escalated"""
+        name = route['name']
+        usage = usage or {}
+        outcome = 'error' if error is not None else 'escalated' if escalated else 'ok'
+        ROUTE_REQUESTS.inc(route=name, outcome=outcome)
+        ROUTE_SECONDS.observe(seconds, route=name)
+        for kind in ('prompt', 'completion'):
+            ROUTE_TOKENS.inc(usage.get(f"{kind}_tokens", 0), route=name, type=kind)
+        with self._lock:
+            stats = self._stats[name]
+            stats['calls'] += 1
+            stats['errors'] += error is not None
+            stats['escalated'] += escalated
+            stats['seconds'] += seconds
+            stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            stats['completion_tokens'] += usage.get('completion_tokens', 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {
+                name: dict(stats, model=self.routes[name]['model'],
+                           mean_seconds=round(stats['seconds'] / stats['calls'], 3) if stats['calls'] else None,
+                           seconds=round(stats['seconds'], 3))
+                for name, stats in self._stats.items()
+            }
+        return {'threshold': self.threshold, 'escalate': self.escalate, 'routes': routes}
+
+
+def router_from_env(full_model: str, full_max_tokens: int) -> Optional[ModelRouter]:
+    """Build the model router from environment settings (None unless MODEL_ROUTING is on)"""
+    # Opt-in: routing sends traffic to a second model, which has to be a deliberate choice
+    if os.environ.get('MODEL_ROUTING', '').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    return ModelRouter(
+        full_model=full_model,
+        full_max_tokens=full_max_tokens,
+        fast_model=os.environ.get('ROUTER_FAST_MODEL', 'gpt-4.1-nano'),
+        fast_max_tokens=int(os.environ.get('ROUTER_FAST_MAX_TOKENS', '2500')),
+        threshold=float(os.environ.get('ROUTER_THRESHOLD', '0.5')),
+        complex_tokens=int(os.environ.get('ROUTER_COMPLEX_TOKENS', '6000')),
+        speaker_weight=float(os.environ.get('ROUTER_SPEAKER_WEIGHT', '0.3')),
+        price_weight=float(os.environ.get('ROUTER_PRICE_WEIGHT', '0.4')),
+        escalate=os.environ.get('ROUTER_ESCALATE', 'true').lower() not in ('0', 'false', 'no', 'off')
+    )
@@ -0,0 +1,271 @@
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Sentinel placed on a stage queue to stop one of its workers
+_STOP = object()
+
+
+class PipelineFullError(Exception):
+    """Raised when a job is rejected because the admission queue is full"""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"Pipeline stage '{stage}' is at capacity")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class PipelineClosedError(Exception):
+    """Raised when a job is submitted to a pipeline that is not accepting work"""
+
+
+class RetryLater(Exception):
+    """Raised by a stage function to run the job through the same stage again after ``delay`` seconds"""
+
+    def __init__(self, delay: float, reason: str = ''):
+        super().__init__(reason or f"retry in {delay:.0f}s")
+        self.delay = delay
+
+
+class Stage:
+    """
+    A single pipeline stage with its own bounded queue and worker pool
+
+    Args:
+        name (str): Stage name used in logs and queue stats
+        func (Callable): Receives the job dict and returns it (or None to drop the job)
+        workers (int): Number of worker threads for this stage
+        queue_size (int): Maximum number of jobs waiting for this stage
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 workers: int = 1, queue_size: int = 10):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.deferred = 0
+        # Exponentially weighted average of stage duration, used for Retry-After
+        self.avg_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def mark_active(self, delta: int):
+        with self._lock:
+            self.active += delta
+
+    def record(self, duration: float, failed: bool = False):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.processed += 1
+            if self.avg_seconds:
+                self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * duration
+            else:
+                self.avg_seconds = duration
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'active': self.active,
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'deferred': self.deferred,
+            'avg_seconds': round(self.avg_seconds, 3)
+        }
+
+
+class StagedPipeline:
+    """
+    Runs jobs through an ordered list of stages, each with a bounded queue.
+
+    A job is admitted only if the first stage has room; later stages apply
+    backpressure by blocking the upstream worker until there is space, so the
+    total number of in-flight jobs is bounded by the sum of queue sizes and
+    worker counts. Worker threads are started lazily on first submit so the
+    pipeline is safe to construct at import time under a forking server.
+
+    ``on_stage_done(stage_name, job, seconds, error)`` is called after every
+    stage execution, with ``error`` set if the stage raised. A stage that
+    raises RetryLater has its job parked in memory and re-queued on the same
+    stage once the delay has passed.
+    """
+
+    def __init__(self, stages: List[Stage], min_retry_after: int = 1, max_retry_after: int = 300,
+                 on_stage_done: Optional[Callable[[str, Dict[str, Any], float, Optional[BaseException]], None]] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.on_stage_done = on_stage_done
+        self.min_retry_after = min_retry_after
+        self.max_retry_after = max_retry_after
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        # Heap of (due time, sequence, stage index, job) for deferred jobs
+        self._deferred: list = []
+        self._deferred_cond = threading.Condition()
+        self._sequence = itertools.count()
+
+    def start(self):
+        """Start the worker threads for every stage (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            for index, stage in enumerate(self.stages):
+                for n in range(stage.workers):
+                    thread = threading.Thread(
+                        target=self._worker,
+                        args=(index,),
+                        name=f"{stage.name}-worker-{n}",
+                        daemon=True
+                    )
+                    thread.start()
+                    self._threads.append(thread)
+            thread = threading.Thread(target=self._scheduler, name='pipeline-scheduler', daemon=True)
+            thread.start()
+            self._started = True
+
+    def submit(self, job: Dict[str, Any], stage: Optional[str] = None,
+               block: bool = False, timeout: Optional[float] = None):
+        """
+        Admit a job into the pipeline
+
+        Args:
+            job (Dict): Job state passed from stage to stage
+            stage (str): Optional stage name to start from (defaults to the first stage)
+            block (bool): Wait for queue space instead of rejecting immediately
+            timeout (float): Maximum time to wait when blocking
+
+        Raises:
+            PipelineClosedError: If the pipeline has been shut down
+            PipelineFullError: If the target stage queue has no room
+        """
+        if self._closed:
+            raise PipelineClosedError("Pipeline is shutting down")
+        self.start()
+
+        target = self.stages[self._stage_index(stage)]
+        try:
+            target.queue.put(job, block=block, timeout=timeout)
+        except queue.Full:
+            raise PipelineFullError(target.name, self.retry_after(target))
+
+    def retry_after(self, stage: Optional[Stage] = None) -> int:
+        """Estimate how many seconds until the given stage (default: first) has room"""
+        stage = stage or self.stages[0]
+        # Time for the queued backlog to drain through this stage's workers,
+        # bounded below by the slowest downstream stage it feeds into
+        per_job = max(s.avg_seconds for s in self.stages[self.stages.index(stage):])
+        estimate = math.ceil(stage.queue.qsize() * per_job / stage.workers) if per_job else 0
+        return int(min(self.max_retry_after, max(self.min_retry_after, estimate)))
+
+    def queue_depths(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-stage queue depth and worker stats"""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def defer(self, job: Dict[str, Any], stage: str, delay: float):
+        """Re-queue a job on ``stage`` after ``delay`` seconds"""
+        index = self._stage_index(stage)
+        with self._deferred_cond:
+            heapq.heappush(self._deferred, (time.monotonic() + delay, next(self._sequence), index, job))
+            self.stages[index].deferred += 1
+            self._deferred_cond.notify()
+
+    def is_full(self) -> bool:
+        return self.stages[0].queue.full()
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and let the workers drain their queues (deferred jobs are dropped)"""
+        self._closed = True
+        with self._deferred_cond:
+            if self._deferred:
+                print(f"Dropping {len(self._deferred)} deferred pipeline job(s) on shutdown")
+            self._deferred.clear()
+            self._deferred_cond.notify()
+        if not self._started:
+            return
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+            if wait:
+                stage.queue.join()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _stage_index(self, name: Optional[str]) -> int:
+        if name is None:
+            return 0
+        for index, stage in enumerate(self.stages):
+            if stage.name == name:
+                return index
+        raise ValueError(f"Unknown pipeline stage: {name}")
+
+    def _worker(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                stage.queue.task_done()
+                return
+
+            started = time.monotonic()
+            error = None
+            stage.mark_active(1)
+            try:
+                result = stage.func(job)
+            except RetryLater as e:
+                job_id = job.get('job_id', '-') if isinstance(job, dict) else '-'
+                print(f"[{job_id}] Deferring pipeline stage '{stage.name}': {str(e)}")
+                self.defer(job, stage.name, e.delay)
+                stage.queue.task_done()
+                continue
+            except Exception as e:
+                error = e
+                job_id = job.get('job_id', '-') if isinstance(job, dict) else '-'
+                print(f"[{job_id}] Error in pipeline stage '{stage.name}': {str(e)}")
+                result = None
+            finally:
+                stage.mark_active(-1)
+            duration = time.monotonic() - started
+            stage.record(duration, failed=error is not None)
+            if self.on_stage_done is not None:
+                try:
+                    self.on_stage_done(stage.name, job, duration, error)
+                except Exception as e:
+                    print(f"Error in pipeline stage callback: {str(e)}")
+
+            try:
+                if result is not None and next_stage is not None:
+                    # Blocking put: a saturated downstream stage holds this worker,
+                    # which in turn fills this stage's queue and throttles admission
+                    next_stage.queue.put(result)
+            finally:
+                stage.queue.task_done()
+
+    def _scheduler(self):
+        """Move deferred jobs back onto their stage queue once they are due"""
+        while not self._closed:
+            with self._deferred_cond:
+                while not self._closed and (
+                        not self._deferred or self._deferred[0][0] > time.monotonic()):
+                    timeout = self._deferred[0][0] - time.monotonic() if self._deferred else None
+                    self._deferred_cond.wait(timeout)
+                if self._closed:
+                    return
+                _, _, index, job = heapq.heappop(self._deferred)
+                self.stages[index].deferred -= 1
+            self.stages[index].queue.put(job)
@@ -0,0 +1,216 @@
+import os
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from transcript_chunker import FRAMEWORK_STAGES, detect_stage
+from transcript_formatter import iter_turns, legend_names, split_legend
+
+# Run the local analyzer before the model and pass its findings as hints
+PRE_ANALYSIS = os.environ.get('PRE_ANALYSIS', 'true').lower() in ('1', 'true', 'yes')
+
+# Turns after a payment offer in which an agreement still counts as accepting it
+AGREEMENT_WINDOW = 4
+# Speaking rate used for turns whose duration cannot be read from timestamps
+WORDS_PER_SECOND = 2.5
+
+# One compiled alternation; ``match.lastgroup`` says which term matched, so a
+# whole turn is classified in a single scan. Order matters where terms
+# overlap ("3 monthly payments" is split pay, not monthly).
+TERM_MATCHER = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in [
+    ('pif', r"\bpa(?:y|id|ying) (?:it |everything )?in full\b|\bPIF\b|\bfull payment\b"
+            r"|\bone[- ]time payment\b|\bsingle payment\b|\bpay (?:it )?(?:all )?up ?front\b"),
+    ('split', r"\b(?:two|three|four|six|2|3|4|6)[- ](?:monthly )?(?:payments?|installments?|pays?)\b"
+              r"|\bsplit (?:pay|payments?|it)\b|\bpayment plan\b|\binstall?ments?\b"),
+    ('monthly', r"\bper month\b|\ba month\b|/mo(?:nth)?\b|\bmonthly\b|\b(?:each|every) month\b"
+                r"|\bmonth[- ]to[- ]month\b|\bsubscription\b"),
+    ('price', r"\$\s?\d+(?:,\d{3})*(?:\.\d{2})?(?:\s?k\b)?|\b\d+(?:,\d{3})*(?:\.\d{2})? dollars\b"),
+    ('obj_price', r"\b(?:can'?t|cannot|couldn'?t) afford\b|\bafford\b|\btoo expensive\b|\bexpensive\b"
+                  r"|\bthe money\b|\bmy budget\b|\bthe cost\b|\bmore than I (?:was expecting|wanted)\b"),
+    ('obj_time', r"\bdon'?t have (?:the )?time\b|\btoo busy\b|\bso busy\b|\bmy schedule\b"),
+    ('obj_spouse', r"\b(?:talk|speak|check) (?:to|with) my (?:husband|wife|partner|spouse)\b"
+                   r"|\bask my (?:husband|wife|partner|spouse)\b"),
+    ('obj_think', r"\bthink about it\b|\bsleep on it\b|\bnot sure\b|\bneed (?:some )?time to think\b"),
+    ('obj_trust', r"\b(?:tried|done) (?:this|that|something like this) before\b|\bskeptical\b"
+                  r"|\bdoesn'?t work for me\b|\bscam\b"),
+    ('agree', r"\blet'?s do (?:it|this)\b|\bsounds good\b|\bsign me up\b|\bmake (?:that|it) work\b"
+              r"|\bcount me in\b|\bI'?m in\b|\bI'?ll take\b|\blet'?s go\b|\byes,? (?:absolutely|let'?s)\b"),
+]), re.I)
+
+PAYMENT_LABELS = {'pif': 'PIF', 'split': 'Split Pay', 'monthly': 'Monthly'}
+OBJECTION_LABELS = {
+    'obj_price': 'price', 'obj_time': 'time', 'obj_spouse': 'spouse',
+    'obj_think': 'think it over', 'obj_trust': 'trust'
+}
+
+
+def parse_seconds(timestamp: str) -> Optional[int]:
+    """"1:02:03" / "00:01:30" / "90" -> seconds (None if unparseable)"""
+    parts = str(timestamp).split('.', 1)[0].split(':')
+    if not timestamp or not all(part.strip().isdigit() for part in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def _payment_kind(kinds: set) -> Optional[str]:
+    """Resolve the payment terms mentioned in one turn (None if it lists competing options)"""
+    if 'split' in kinds:
+        # "3 payments of $997" or "$330 per month for 3 months" describe installments
+        return None if 'pif' in kinds else 'split'
+    if 'pif' in kinds:
+        return None if 'monthly' in kinds else 'pif'
+    if 'monthly' in kinds:
+        return 'monthly'
+    return None
+
+
+def pre_analyze(transcript: str) -> Dict[str, Any]:
+    """
+    Deterministic call facts computed locally in one pass over the turns
+
+    Args:
+        transcript (str): Formatted (full or compact) transcript text
+
+    Returns:
+        Dict with ``payment_detected`` ("PIF", "Split Pay", "Monthly" or
+        "Unknown"), ``payment_evidence``, ``prices``, prospect ``objections``
+        by type, per-speaker ``talk_ratio`` and ``questions``, the likely
+        ``coach``, the first timestamp of each framework stage in
+        ``stage_timestamps``, ``turns``/``words`` totals and, for a compact
+        transcript, the alias-to-name map of its legend in ``speakers``.
+        Speakers are keyed as they appear in the text (aliases when compact).
+    """
+    legend, body = split_legend(transcript)
+    words: Counter = Counter()
+    seconds: Counter = Counter()
+    questions: Counter = Counter()
+    objections: Dict[str, Counter] = {}
+    prices: List[str] = []
+    stage_timestamps: Dict[str, str] = {}
+    price_speakers: Counter = Counter()
+
+    offer, offer_turn, offer_text = None, -AGREEMENT_WINDOW - 1, ''
+    decision, evidence = None, ''
+    stage = -1
+    previous = None  # (speaker, start seconds, word count) of the last timed turn
+    turns = 0
+
+    for speaker, timestamp, text in iter_turns(body):
+        speaker = speaker or 'Unknown'
+        turns += 1
+        word_count = len(text.split())
+        words[speaker] += word_count
+        questions[speaker] += text.count('?')
+
+        start = parse_seconds(timestamp)
+        if start is not None:
+            if previous is not None and start >= previous[1]:
+                seconds[previous[0]] += start - previous[1]
+            previous = (speaker, start, word_count)
+
+        new_stage = detect_stage(text, stage)
+        if new_stage != stage:
+            for index in range(stage + 1, new_stage + 1):
+                stage_timestamps.setdefault(FRAMEWORK_STAGES[index][0], timestamp)
+            stage = new_stage
+
+        kinds = set()
+        for match in TERM_MATCHER.finditer(text):
+            kind = match.lastgroup
+            kinds.add(kind)
+            if kind == 'price':
+                price_speakers[speaker] += 1
+                value = match.group().replace(' ', '')
+                if value not in prices:
+                    prices.append(value)
+            elif kind in OBJECTION_LABELS:
+                objections.setdefault(speaker, Counter())[OBJECTION_LABELS[kind]] += 1
+
+        payment = _payment_kind(kinds)
+        if payment is not None:
+            offer, offer_turn, offer_text = payment, turns, text
+        if 'agree' in kinds and offer is not None and turns - offer_turn <= AGREEMENT_WINDOW:
+            decision, evidence = offer, offer_text
+
+    if previous is not None:
+        seconds[previous[0]] += previous[2] / WORDS_PER_SECOND
+    talk = seconds if sum(seconds.values()) else words
+    total_talk = sum(talk.values()) or 1
+
+    # The coach quotes the price; fall back to whoever asks the most questions
+    coach = None
+    if price_speakers:
+        coach = price_speakers.most_common(1)[0][0]
+    elif questions and max(questions.values()):
+        coach = questions.most_common(1)[0][0]
+
+    prospect_objections = Counter()
+    for speaker, counts in objections.items():
+        if speaker != coach:
+            prospect_objections.update(counts)
+
+    return {
+        'payment_detected': PAYMENT_LABELS.get(decision, 'Unknown'),
+        'payment_evidence': evidence[:160],
+        'prices': prices[:8],
+        'objections': dict(prospect_objections),
+        'talk_ratio': {speaker: round(value / total_talk, 3) for speaker, value in talk.items()},
+        'questions': dict(questions),
+        'coach': coach,
+        'stage_timestamps': stage_timestamps,
+        'turns': turns,
+        'words': sum(words.values()),
+        'speakers': legend_names(legend)
+    }
+
+
+def format_hints(facts: Dict[str, Any]) -> str:
+    """Render pre-analysis facts as a compact block for the user prompt"""
+    lines = ["Pre-computed call facts (from deterministic text matching):"]
+    if facts['payment_detected'] != 'Unknown':
+        lines.append(f"- Payment agreed: {facts['payment_detected']} (already recorded; do not output payment_detected)")
+    if facts['prices']:
+        lines.append(f"- Prices mentioned: {', '.join(facts['prices'])}")
+    if facts['objections']:
+        lines.append("- Prospect objections: " + ', '.join(
+            f"{kind} x{count}" for kind, count in facts['objections'].items()))
+    if facts['talk_ratio']:
+        lines.append("- Talk time: " + ', '.join(
+            f"{speaker} {share:.0%}" for speaker, share in facts['talk_ratio'].items()))
+        lines.append("- Questions asked: " + ', '.join(
+            f"{speaker} {count}" for speaker, count in facts['questions'].items()))
+    if facts['stage_timestamps']:
+        lines.append("- Framework stages reached: " + ', '.join(
+            f"{stage} at {timestamp}" if timestamp else stage
+            for stage, timestamp in facts['stage_timestamps'].items()))
+    return '\n'.join(lines) if len(lines) > 1 else ''
+
+
+def apply_pre_analysis(analysis_results: Dict[str, Any], facts: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fill payment_detected from the local match and attach the call statistics
+
+    Compact-transcript aliases are mapped back to speaker names, so the
+    stored ``call_stats`` (and the coach indexed by the history store) use
+    the names from the original transcript.
+    """
+    if facts is None:
+        return analysis_results
+    analysis_results = dict(analysis_results)
+    if facts['payment_detected'] != 'Unknown':
+        analysis_results['payment_detected'] = facts['payment_detected']
+    else:
+        analysis_results.setdefault('payment_detected', 'Unknown')
+    names = facts.get('speakers') or {}
+    analysis_results['call_stats'] = {
+        key: facts[key] for key in ('prices', 'objections', 'stage_timestamps', 'turns', 'words')
+    }
+    analysis_results['call_stats'].update({
+        'talk_ratio': {names.get(speaker, speaker): share for speaker, share in facts['talk_ratio'].items()},
+        'questions': {names.get(speaker, speaker): count for speaker, count in facts['questions'].items()},
+        'coach': names.get(facts['coach'], facts['coach']),
+    })
+    return analysis_results
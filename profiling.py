@@ -0,0 +1,186 @@
+import cProfile
+import gzip
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Any, List, Optional
+
+DUMP_NAME = re.compile(r'^[\w-]+\.(prof\.gz|json)$')
+
+
+class Profiler:
+    """
+    Opt-in cProfile/tracemalloc profiling of sampled jobs, one dump per stage
+
+    ``sample`` decides once per job (at ``sample_rate``, or always when
+    forced by a request header) and the decision travels with the job, so a
+    job resumed on another worker is still profiled. ``run`` executes one
+    stage under cProfile and, with ``memory`` on, tracemalloc, then writes
+    ``<dump>.prof.gz`` (gzipped pstats data; ``gunzip`` it for pstats or
+    snakeviz) and ``<dump>.json`` (duration, peak traced memory, the top
+    functions by cumulative time and the top allocation sites). Only the
+    newest ``max_dumps`` dumps are kept.
+
+    cProfile sees the stage's own thread only, so work the stage hands to
+    thread pools shows up as waiting. tracemalloc is process-wide: peak and
+    allocation sites include whatever other threads allocate meanwhile.
+
+    Args:
+        directory (str): Where dumps are written
+        sample_rate (float): Fraction of jobs profiled without a request header
+        max_dumps (int): Number of stage dumps kept (oldest deleted first)
+        memory (bool): Also trace allocations with tracemalloc
+        top (int): Functions and allocation sites listed in each summary
+    """
+
+    def __init__(self, directory: str = 'cache/profiles', sample_rate: float = 0.0, max_dumps: int = 100,
+                 memory: bool = True, top: int = 25):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_dumps = max_dumps
+        self.memory = memory
+        self.top = top
+        self.profiled = 0
+        self._lock = threading.Lock()
+        self._tracing = 0
+        self._owns_tracing = False
+        os.makedirs(directory, exist_ok=True)
+
+    def sample(self, forced: bool = False) -> bool:
+        """Whether a new job is profiled"""
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def _start_tracing(self):
+        with self._lock:
+            if self._tracing == 0:
+                # Leave tracing alone if it was started outside the profiler (PYTHONTRACEMALLOC)
+                self._owns_tracing = not tracemalloc.is_tracing()
+                if self._owns_tracing:
+                    tracemalloc.start(10)
+                else:
+                    tracemalloc.reset_peak()
+            self._tracing += 1
+
+    def _stop_tracing(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            _, peak = tracemalloc.get_traced_memory()
+            self._tracing -= 1
+            if self._tracing == 0 and self._owns_tracing:
+                tracemalloc.stop()
+        return {
+            'peak_bytes': peak,
+            'top_allocations': [str(stat) for stat in snapshot.statistics('lineno')[:self.top]],
+        }
+
+    def run(self, stage: str, job: Dict[str, Any], func: Callable[[Dict[str, Any]], Any]):
+        """Run one pipeline stage, profiling it if the job was sampled"""
+        if not job.get('profile'):
+            return func(job)
+        if self.memory:
+            self._start_tracing()
+        profile = cProfile.Profile()
+        started = time.monotonic()
+        error = None
+        profile.enable()
+        try:
+            return func(job)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            profile.disable()
+            seconds = time.monotonic() - started
+            memory = self._stop_tracing() if self.memory else {}
+            try:
+                self._dump(stage, job.get('job_id', '-'), profile, seconds, memory, error)
+            except Exception as e:
+                print(f"[{job.get('job_id', '-')}] Could not write the '{stage}' profile: {str(e)}")
+
+    def _dump(self, stage: str, job_id: str, profile: cProfile.Profile, seconds: float,
+              memory: Dict[str, Any], error: Optional[BaseException]):
+        name = f"{int(time.time() * 1000)}-{re.sub(r'[^A-Za-z0-9_]', '_', job_id)}-{stage}"
+        profile.create_stats()
+        with gzip.open(os.path.join(self.directory, f"{name}.prof.gz"), 'wb', compresslevel=6) as f:
+            f.write(marshal.dumps(profile.stats))
+
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(self.top)
+        summary = dict({
+            'name': name,
+            'job_id': job_id,
+            'stage': stage,
+            'seconds': round(seconds, 4),
+            'created_at': time.time(),
+            'error': f"{type(error).__name__}: {error}" if error is not None else None,
+            'top_functions': report.getvalue(),
+        }, **memory)
+        temp = os.path.join(self.directory, f".{name}.json.tmp")
+        with open(temp, 'w') as f:
+            json.dump(summary, f)
+        os.replace(temp, os.path.join(self.directory, f"{name}.json"))
+        with self._lock:
+            self.profiled += 1
+        self._prune()
+        print(f"[{job_id}] Profiled stage '{stage}' ({seconds:.2f}s) to {name}")
+
+    def _names(self) -> List[str]:
+        """Dump names, oldest first (names start with a millisecond timestamp)"""
+        return sorted(entry[:-len('.json')] for entry in os.listdir(self.directory)
+                      if entry.endswith('.json') and not entry.startswith('.'))
+
+    def _prune(self):
+        names = self._names()
+        for name in names[:max(0, len(names) - self.max_dumps)]:
+            for suffix in ('.json', '.prof.gz'):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def dumps(self) -> List[Dict[str, Any]]:
+        """Summaries of the kept dumps, newest first (without the function and allocation listings)"""
+        summaries = []
+        for name in reversed(self._names()):
+            try:
+                with open(os.path.join(self.directory, f"{name}.json")) as f:
+                    summary = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            summaries.append({key: value for key, value in summary.items()
+                              if key not in ('top_functions', 'top_allocations')})
+        return summaries
+
+    def path(self, filename: str) -> Optional[str]:
+        """Path of a dump file (``<name>.prof.gz`` or ``<name>.json``), or None if it does not exist"""
+        if not DUMP_NAME.match(filename or ''):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.exists(path) else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'sample_rate': self.sample_rate, 'profiled_stages': self.profiled, 'dumps': len(self._names())}
+
+
+def profiler_from_env() -> Optional[Profiler]:
+    """Build the profiler from environment settings (None when disabled)"""
+    if os.environ.get('PROFILING_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+    return Profiler(
+        directory=os.environ.get('PROFILE_DIR', 'cache/profiles'),
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+        max_dumps=int(os.environ.get('PROFILE_MAX_DUMPS', '100')),
+        memory=os.environ.get('PROFILE_MEMORY', 'true').lower() not in ('0', 'false', 'no'),
+        top=int(os.environ.get('PROFILE_TOP', '25'))
+    )
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+class RateLimiter:
+    """
+    Requests-per-minute / tokens-per-minute token bucket with an in-flight cap
+
+    Both buckets start full and refill continuously at limit/60 per second.
+    A request reserves one request slot and its estimated token cost up front;
+    callers that do not fit wait until the buckets have refilled. The limiter
+    is thread-safe and can be awaited from any event loop, so sync and async
+    callers in the same process share one quota.
+
+    Args:
+        rpm (int): Requests per minute
+        tpm (int): Tokens per minute (prompt + max completion tokens)
+        max_in_flight (int): Maximum concurrent requests
+    """
+
+    def __init__(self, rpm: int = 500, tpm: int = 200000, max_in_flight: int = 8):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_wait_seconds = 0.0
+        self.throttled = 0
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Try to take one request and ``tokens`` tokens from the buckets
+
+        Returns:
+            float: 0 if the reservation succeeded, otherwise seconds to wait before retrying
+        """
+        # A single request larger than the whole bucket would never fit
+        tokens = min(tokens, self.tpm)
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                self.total_requests += 1
+                self.total_tokens += tokens
+                return 0.0
+
+            wait_requests = (1 - self._requests) * 60 / self.rpm if self._requests < 1 else 0.0
+            wait_tokens = (tokens - self._tokens) * 60 / self.tpm if self._tokens < tokens else 0.0
+            return max(wait_requests, wait_tokens, 0.001)
+
+    def acquire(self, tokens: int):
+        """Block until an in-flight slot and bucket capacity are available"""
+        self._slots.acquire()
+        self._enter()
+        try:
+            while True:
+                wait = self.reserve(tokens)
+                if not wait:
+                    return
+                self._record_wait(wait)
+                time.sleep(wait)
+        except BaseException:
+            self.release()
+            raise
+
+    async def acquire_async(self, tokens: int):
+        """Async variant of acquire that never blocks the event loop"""
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+        self._enter()
+        try:
+            while True:
+                wait = self.reserve(tokens)
+                if not wait:
+                    return
+                self._record_wait(wait)
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        """Give back the in-flight slot taken by acquire"""
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def pause(self, seconds: float):
+        """Stop all callers from sending for ``seconds`` (e.g. after a 429)"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            # The server says we are over quota, so do not trust the local buckets either
+            self._requests = min(self._requests, 0.0)
+            self._tokens = min(self._tokens, 0.0)
+            self.throttled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rpm': self.rpm,
+                'tpm': self.tpm,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'requests': self.total_requests,
+                'tokens_reserved': self.total_tokens,
+                'wait_seconds': round(self.total_wait_seconds, 3),
+                'throttled': self.throttled
+            }
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self.total_wait_seconds += seconds
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = 1.0, maximum: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter, never shorter than the server's Retry-After
+
+    Args:
+        attempt (int): Zero-based retry attempt
+        retry_after (float): Seconds the server asked us to wait, if any
+    """
+    delay = random.uniform(0, min(maximum, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def limiter_from_env() -> RateLimiter:
+    return RateLimiter(
+        rpm=int(os.environ.get('OPENAI_RPM', '500')),
+        tpm=int(os.environ.get('OPENAI_TPM', '200000')),
+        max_in_flight=int(os.environ.get('OPENAI_MAX_IN_FLIGHT', '8'))
+    )
@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Union
+
+# Number of render processes; 0 renders in the calling thread
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', '2'))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """Import ReportLab and build the report styles once per render process"""
+    from report_generator import get_report_styles
+    get_report_styles()
+
+
+def _render_in_worker(meeting_title: str, created_at: str, transcript: str,
+                      analysis_results: Dict[str, Any]) -> bytes:
+    from report_generator import render_report
+    # memoryviews cannot be pickled back to the parent process
+    return bytes(render_report(meeting_title, created_at, transcript, analysis_results))
+
+
+def _render_transcript_in_worker(transcript: str, meeting_title: str) -> bytes:
+    from transcript_renderer import render_transcript_attachment
+    return render_transcript_attachment(transcript, meeting_title)
+
+
+def _mp_context():
+    # Forking a threaded web worker can deadlock the child, so start render
+    # processes from a clean forkserver (or spawn where that is unavailable)
+    methods = multiprocessing.get_all_start_methods()
+    if 'forkserver' in methods:
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['report_generator', 'transcript_renderer'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared render pool, starting it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=_mp_context(),
+                initializer=_init_worker
+            )
+        return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    """Drop a broken pool so the next get_executor() starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        # Another thread may already have replaced it
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _run_in_pool(func, *args):
+    """
+    Run ``func`` in the render pool, restarting the pool once if it broke
+
+    A render process killed mid-job (OOM killer, segfault in a C extension)
+    leaves the pool broken and every later submit failing, so the broken
+    pool is replaced and the job retried once on the new one.
+    """
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            _reset_executor(executor)
+            if attempt:
+                raise
+            print("Render pool broke, restarting it and retrying the render")
+
+
+def render(meeting_title: str, created_at: str, transcript: str,
+           analysis_results: Dict[str, Any], in_process: bool = False) -> Union[bytes, memoryview]:
+    """
+    Render a PDF report off the web worker's GIL
+
+    ReportLab layout is CPU-bound, so with RENDER_WORKERS > 0 the render runs
+    in a separate process and the calling thread only waits on the result.
+    ``in_process`` renders in the calling thread regardless (for profiling).
+
+    Returns:
+        The PDF bytes
+    """
+    if RENDER_WORKERS <= 0 or in_process:
+        from report_generator import render_report
+        return render_report(meeting_title, created_at, transcript, analysis_results)
+    return _run_in_pool(_render_in_worker, meeting_title, created_at, transcript, analysis_results)
+
+
+def render_transcript(transcript: str, meeting_title: str = '', in_process: bool = False) -> bytes:
+    """Render the standalone transcript PDF (used when TRANSCRIPT_MODE is "attachment")"""
+    if RENDER_WORKERS <= 0 or in_process:
+        return _render_transcript_in_worker(transcript, meeting_title)
+    return _run_in_pool(_render_transcript_in_worker, transcript, meeting_title)
+
+
+def shutdown(wait: bool = True):
+    """Stop the render processes"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
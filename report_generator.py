@@ -1,39 +1,30 @@
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Frame, SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+import io
 import os
+import uuid
 from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, BinaryIO, Iterator, Optional, Union
+from transcript_renderer import TRANSCRIPT_MODE, draw_flowables, transcript_flowables
+from rubric import CATEGORY_NAMES, CATEGORY_WEIGHTS, TOTAL_WEIGHT, category_label, weighted_scores
 
-def generate_report(meeting_title: str, created_at: str, transcript: str, analysis_results: Dict[str, Any]) -> str:
+REPORTS_DIR = "reports"
+
+@lru_cache(maxsize=None)
+def get_report_styles() -> Dict[str, Any]:
     """
-    Generate a PDF report from the analysis results
+    Build the paragraph and table styles used by every report
     
-    Args:
-        meeting_title (str): Title of the meeting
-        created_at (str): Meeting creation timestamp
-        transcript (str): Full transcript text
-        analysis_results (Dict): Analysis results from the AI
-        
-    Returns:
-        str: Path to the generated PDF file
+    Cached so the sample stylesheet, custom paragraph styles and table
+    styles are constructed once per process rather than on every render.
     """
     
-    # Create reports directory if it doesn't exist
-    reports_dir = "reports"
-    os.makedirs(reports_dir, exist_ok=True)
-    
-    # Generate filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"sales_analysis_{timestamp}.pdf"
-    filepath = os.path.join(reports_dir, filename)
-    
-    # Create PDF document
-    doc = SimpleDocTemplate(filepath, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
     # Get styles
     styles = getSampleStyleSheet()
     
@@ -65,6 +56,126 @@ def generate_report(meeting_title: str, created_at: str, transcript: str, analys
         textColor=colors.darkgreen
     )
     
+    info_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    
+    score_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 1), (-1, -2), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    
+    return {
+        'base': styles,
+        'title': title_style,
+        'heading': heading_style,
+        'subheading': subheading_style,
+        'info_table': info_table_style,
+        'score_table': score_table_style
+    }
+
+def report_filename() -> str:
+    """Unique report filename (the random suffix keeps same-second reports apart)"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"sales_analysis_{timestamp}_{uuid.uuid4().hex[:8]}.pdf"
+
+def generate_report(meeting_title: str, created_at: str, transcript: str, analysis_results: Dict[str, Any]) -> str:
+    """
+    Generate a PDF report from the analysis results
+    
+    Args:
+        meeting_title (str): Title of the meeting
+        created_at (str): Meeting creation timestamp
+        transcript (str): Full transcript text
+        analysis_results (Dict): Analysis results from the AI
+        
+    Returns:
+        str: Path to the generated PDF file
+    """
+    
+    # Create reports directory if it doesn't exist
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    filepath = os.path.join(REPORTS_DIR, report_filename())
+    
+    build_report(filepath, meeting_title, created_at, transcript, analysis_results)
+    
+    return filepath
+
+def render_report(meeting_title: str, created_at: str, transcript: str, analysis_results: Dict[str, Any]) -> memoryview:
+    """
+    Render the PDF report into memory without touching the filesystem
+    
+    Returns:
+        memoryview: The PDF bytes, viewed directly over the render buffer (no copy)
+    """
+    buffer = io.BytesIO()
+    build_report(buffer, meeting_title, created_at, transcript, analysis_results)
+    return buffer.getbuffer()
+
+def save_report(report_data: Union[bytes, memoryview], filename: Optional[str] = None) -> str:
+    """Persist an in-memory report to the reports directory and return its path"""
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    filepath = os.path.join(REPORTS_DIR, filename or report_filename())
+    with open(filepath, 'wb') as f:
+        f.write(report_data)
+    return filepath
+
+def _transcript_canvas(doc: SimpleDocTemplate, transcript: str, title_style: ParagraphStyle):
+    """
+    Canvas class that appends the transcript pages when the report is saved
+
+    The report body is laid out by SimpleDocTemplate as usual; the
+    transcript, which can run to hundreds of pages, is streamed onto the
+    same canvas page by page (draw_flowables) instead of being added to the
+    document's flowable list, so its layout never holds more than the
+    current block in memory.
+    """
+    def flowables() -> Iterator:
+        yield Paragraph("Full Transcript", title_style)
+        # Consecutive lines from one speaker are batched into a single paragraph
+        yield from transcript_flowables(transcript, TRANSCRIPT_MODE)
+
+    def new_frame() -> Frame:
+        return Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height)
+
+    class TranscriptCanvas(canvas.Canvas):
+        def save(self):
+            # SimpleDocTemplate has closed its last page by now, so the transcript starts on a new one
+            draw_flowables(self, flowables(), new_frame)
+            super().save()
+
+    return TranscriptCanvas
+
+def build_report(output: Union[str, BinaryIO], meeting_title: str, created_at: str, transcript: str,
+                 analysis_results: Dict[str, Any]):
+    """
+    Lay out the report and write the PDF to a file path or binary stream
+    """
+    
+    # Create PDF document
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    
+    # Styles are built once per process
+    report_styles = get_report_styles()
+    styles = report_styles['base']
+    title_style = report_styles['title']
+    heading_style = report_styles['heading']
+    subheading_style = report_styles['subheading']
+    
     # Build the document content
     content = []
     
@@ -81,15 +192,7 @@ def generate_report(meeting_title: str, created_at: str, transcript: str, analys
     ]
     
     info_table = Table(meeting_info, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
+    info_table.setStyle(report_styles['info_table'])
     
     content.append(info_table)
     content.append(Spacer(1, 30))
@@ -104,51 +207,22 @@ def generate_report(meeting_title: str, created_at: str, transcript: str, analys
     content.append(Paragraph("Score Breakdown", heading_style))
     
     categories = analysis_results.get('categories', {})
-    category_names = {
-        'needs_discovery': 'Needs Discovery (25 pts)',
-        'pain_point_exploration': 'Pain Point Exploration (25 pts)',
-        'consequence_urgency': 'Consequence & Urgency (15 pts)',
-        'obstacle_handling': 'Obstacle Handling (15 pts)',
-        'objection_handling': 'Objection Handling (10 pts)',
-        'next_steps_closing': 'Next Steps & Closing (10 pts)'
-    }
+    category_names = {key: category_label(key) for key in CATEGORY_NAMES}
     
     score_data = [["Category", "Score", "Weighted Score"]]
-    total_weighted = 0
-    
-    weights = {
-        'needs_discovery': 25,
-        'pain_point_exploration': 25,
-        'consequence_urgency': 15,
-        'obstacle_handling': 15,
-        'objection_handling': 10,
-        'next_steps_closing': 10
-    }
+    # Points per category on the 100-point scale, from the shared rubric
+    points = weighted_scores(categories)
     
     for key, name in category_names.items():
         category_data = categories.get(key, {})
         score = category_data.get('score', 0)
-        weight = weights.get(key, 0)
-        weighted_score = (score * weight) / 10
-        total_weighted += weighted_score
-        
-        score_data.append([name, f"{score}/10", f"{weighted_score:.1f}/{weight}"])
+        weight = CATEGORY_WEIGHTS[key] * 100 / TOTAL_WEIGHT
+        score_data.append([name, f"{score}/10", f"{points[key]:.1f}/{weight:g}"])
     
-    score_data.append(["TOTAL", "", f"{total_weighted:.1f}/100"])
+    score_data.append(["TOTAL", "", f"{sum(points.values()):.1f}/100"])
     
     score_table = Table(score_data, colWidths=[3.5*inch, 1*inch, 1.5*inch])
-    score_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 1), (-1, -2), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
+    score_table.setStyle(report_styles['score_table'])
     
     content.append(score_table)
     content.append(Spacer(1, 20))
@@ -201,18 +275,13 @@ def generate_report(meeting_title: str, created_at: str, transcript: str, analys
         
         content.append(Spacer(1, 20))
     
-    # Full Transcript (on separate page)
-    content.append(PageBreak())
-    content.append(Paragraph("Full Transcript", heading_style))
-    
-    # Split transcript into smaller chunks for better formatting
-    transcript_lines = transcript.split('\n')
-    for line in transcript_lines:
-        if line.strip():
-            content.append(Paragraph(line, styles['Normal']))
+    # Full Transcript (on separate pages, streamed onto the canvas after the report body)
+    if TRANSCRIPT_MODE in ('full', 'truncate'):
+        doc.build(content, canvasmaker=_transcript_canvas(doc, transcript, heading_style))
+        return
+    if TRANSCRIPT_MODE == 'attachment':
+        content.append(Paragraph("The full transcript is attached as a separate PDF.", styles['Italic']))
     
     # Build PDF
     doc.build(content)
-    
-    return filepath
 
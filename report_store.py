@@ -0,0 +1,307 @@
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Any, Optional, Union
+
+from rubric import CATEGORY_NAMES, CATEGORY_WEIGHTS, TOTAL_WEIGHT, category_label, weighted_scores
+
+# Renditions kept per report; the PDF is only written once it is first asked for
+FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'json': 'application/json',
+    'txt': 'text/plain; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+REPORT_ID = re.compile(r'^[0-9a-f]{24}$')
+
+RenderFunc = Callable[[str, str, str, Dict[str, Any]], Union[bytes, memoryview]]
+
+
+def report_id(meeting_title: str, created_at: str, transcript: str, analysis_results: Dict[str, Any]) -> str:
+    """Content address of a report: the same analysis of the same call always maps to the same ID"""
+    content = json.dumps({
+        'meeting_title': meeting_title,
+        'created_at': created_at,
+        'transcript': hashlib.sha256(transcript.encode('utf-8')).hexdigest(),
+        'analysis_results': analysis_results,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:24]
+
+
+def _items(title: str, values) -> str:
+    if not values:
+        return ''
+    return f"<h4>{html.escape(title)}</h4><ul>" + ''.join(
+        f"<li>{html.escape(str(value))}</li>" for value in values
+    ) + "</ul>"
+
+
+def render_html(meeting_title: str, created_at: str, analysis_results: Dict[str, Any],
+                rid: Optional[str] = None) -> str:
+    """
+    Self-contained HTML version of the report (everything but the transcript)
+
+    Shows the same score table and category details as the PDF without
+    ReportLab; with ``rid`` it links to the PDF and transcript renditions.
+    """
+    categories = analysis_results.get('categories') or {}
+    points = weighted_scores(categories)
+    rows = ''.join(
+        f"<tr><td>{html.escape(category_label(key))}</td>"
+        f"<td>{(categories.get(key) or {}).get('score', 0)}/10</td>"
+        f"<td>{points[key]:.1f}/{CATEGORY_WEIGHTS[key] * 100 / TOTAL_WEIGHT:g}</td></tr>"
+        for key in CATEGORY_NAMES
+    )
+    details = ''.join(
+        f"<h3>{html.escape(category_label(key))}</h3>"
+        f"<p>Score: {categories[key].get('score', 0)}/10</p>"
+        + _items('What Went Well', categories[key].get('highlights'))
+        + _items('Missed Opportunities', categories[key].get('missed_opportunities'))
+        + _items('Actionable Feedback', categories[key].get('feedback'))
+        for key in CATEGORY_NAMES if categories.get(key)
+    )
+    payment = analysis_results.get('payment_detected', 'Unknown')
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>Sales Call Analysis - {html.escape(meeting_title)}</title>"
+        "<style>body{font-family:Helvetica,Arial,sans-serif;max-width:46em;margin:2em auto;color:#222}"
+        "table{border-collapse:collapse;width:100%}td,th{border:1px solid #ccc;padding:.4em;text-align:left}"
+        "th{background:#2c3e50;color:#fff}</style></head><body>"
+        "<h1>Sales Call Analysis Report</h1>"
+        f"<p><b>Meeting:</b> {html.escape(meeting_title)}<br><b>Date:</b> {html.escape(str(created_at))}<br>"
+        f"<b>Overall Score:</b> {analysis_results.get('overall_score', 0)}/100</p>"
+        "<h2>Overall Performance Summary</h2>"
+        f"<p>{html.escape(str(analysis_results.get('summary', 'No summary available.')))}</p>"
+        "<h2>Score Breakdown</h2><table><tr><th>Category</th><th>Score</th><th>Weighted Score</th></tr>"
+        f"{rows}<tr><td><b>TOTAL</b></td><td></td><td><b>{sum(points.values()):.1f}/100</b></td></tr></table>"
+        + (f"<p><b>Payment Method Detected:</b> {html.escape(str(payment))}</p>" if payment != 'Unknown' else '')
+        + f"<h2>Detailed Category Analysis</h2>{details}"
+        + (f"<p><a href=\"{rid}.pdf\">PDF report</a> &middot; <a href=\"{rid}.txt\">Transcript</a></p>"
+           if rid else '')
+        + "</body></html>"
+    )
+
+
+class ReportStore:
+    """
+    Content-addressed store of rendered reports with retention and size-based eviction
+
+    ``put`` writes the cheap renditions straight away: the analysis as JSON,
+    an HTML page and the transcript as text. The PDF is rendered by ``path``
+    the first time it is requested (or added with ``add_pdf`` when it was
+    rendered anyway for an attachment) and kept next to them. Files live
+    under ``directory/<id[:2]>/`` and are indexed in SQLite, so every worker
+    shares them. Reports older than ``retention_seconds`` are purged, and the
+    least recently used are evicted while the store exceeds ``max_bytes``.
+
+    Args:
+        directory (str): Root directory of the report files
+        max_bytes (int): Total size the store is kept under
+        retention_seconds (float): How long a report is kept after it is stored
+    """
+
+    def __init__(self, directory: str = 'cache/reports', max_bytes: int = 512 * 1024 * 1024,
+                 retention_seconds: float = 30 * 86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_seconds
+        self.rendered = 0
+        self.evicted = 0
+        # Guards the shared SQLite connection (re-entrant: _maintain -> purge -> _remove) and _rendering
+        self._lock = threading.RLock()
+        self._rendering: Dict[str, threading.Lock] = {}
+        self._next_purge = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS reports ('
+            ' id TEXT PRIMARY KEY,'
+            ' title TEXT,'
+            ' bytes INTEGER NOT NULL,'
+            ' stored_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS idx_reports_stored ON reports (stored_at);'
+            'CREATE INDEX IF NOT EXISTS idx_reports_accessed ON reports (accessed_at);'
+        )
+
+    def _file(self, report_id: str, fmt: str) -> str:
+        return os.path.join(self.directory, report_id[:2], f"{report_id}.{fmt}")
+
+    def _write(self, report_id: str, fmt: str, data: Union[bytes, memoryview]) -> int:
+        """Write one rendition atomically, so readers never see a partial file"""
+        path = self._file(report_id, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+        return len(data)
+
+    def put(self, meeting_title: str, created_at: str, transcript: str,
+            analysis_results: Dict[str, Any]) -> str:
+        """
+        Store a report's JSON, HTML and transcript renditions
+
+        Storing the same analysis again only refreshes its access time.
+
+        Returns:
+            str: The report ID
+        """
+        rid = report_id(meeting_title, created_at, transcript, analysis_results)
+        now = time.time()
+        with self._lock:
+            known = self._db.execute('UPDATE reports SET accessed_at = ? WHERE id = ?', (now, rid)).rowcount
+        if known and os.path.exists(self._file(rid, 'json')):
+            return rid
+        document = {
+            'report_id': rid,
+            'meeting_title': meeting_title,
+            'created_at': created_at,
+            'analysis_results': analysis_results,
+        }
+        size = self._write(rid, 'txt', transcript.encode('utf-8'))
+        size += self._write(rid, 'html', render_html(meeting_title, created_at, analysis_results, rid).encode('utf-8'))
+        # The JSON is written last; its presence marks the report complete
+        size += self._write(rid, 'json', json.dumps(document, default=str).encode('utf-8'))
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO reports (id, title, bytes, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (rid, meeting_title, size, now, now)
+            )
+            self._maintain(keep=rid)
+        return rid
+
+    def add_pdf(self, report_id: str, data: Union[bytes, memoryview]):
+        """Keep a PDF that was rendered anyway (e.g. for an email attachment)"""
+        if not os.path.exists(self._file(report_id, 'pdf')):
+            size = self._write(report_id, 'pdf', data)
+            with self._lock:
+                self._db.execute('UPDATE reports SET bytes = bytes + ? WHERE id = ?', (size, report_id))
+                self._maintain(keep=report_id)
+
+    def load(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """The stored JSON rendition (None if the report is unknown or evicted)"""
+        if not REPORT_ID.match(report_id or ''):
+            return None
+        try:
+            with open(self._file(report_id, 'json'), 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def path(self, report_id: str, fmt: str, render: Optional[RenderFunc] = None) -> Optional[str]:
+        """
+        File path of one rendition, rendering the PDF on first request
+
+        Concurrent first requests for one PDF in this process render it once;
+        across workers a duplicate render is possible but harmless.
+
+        Args:
+            report_id (str): Report ID
+            fmt (str): One of ``FORMATS``
+            render (callable): Renders the PDF from (title, created_at, transcript, results)
+
+        Returns:
+            The path, or None if the report (or a renderer for its PDF) is missing
+        """
+        if fmt not in FORMATS or not REPORT_ID.match(report_id or ''):
+            return None
+        path = self._file(report_id, fmt)
+        if fmt == 'pdf' and not os.path.exists(path):
+            if render is None:
+                return None
+            with self._lock:
+                lock = self._rendering.setdefault(report_id, threading.Lock())
+            try:
+                with lock:
+                    if not os.path.exists(path):
+                        document = self.load(report_id)
+                        if document is None:
+                            return None
+                        with open(self._file(report_id, 'txt'), encoding='utf-8') as f:
+                            transcript = f.read()
+                        self.add_pdf(report_id, render(document['meeting_title'], document['created_at'],
+                                                       transcript, document['analysis_results']))
+                        with self._lock:
+                            self.rendered += 1
+            finally:
+                with self._lock:
+                    self._rendering.pop(report_id, None)
+        if not os.path.exists(path):
+            return None
+        now = time.time()
+        # Access times only need minute precision for LRU eviction
+        with self._lock:
+            self._db.execute('UPDATE reports SET accessed_at = ? WHERE id = ? AND accessed_at < ?',
+                             (now, report_id, now - 60))
+        return path
+
+    def _remove(self, report_id: str):
+        """Delete one report's files and index row (caller holds ``_lock``)"""
+        for fmt in FORMATS:
+            try:
+                os.remove(self._file(report_id, fmt))
+            except FileNotFoundError:
+                pass
+        self._db.execute('DELETE FROM reports WHERE id = ?', (report_id,))
+
+    def _maintain(self, keep: Optional[str] = None):
+        """Purge expired reports (at most hourly) and evict LRU reports beyond ``max_bytes`` (caller holds ``_lock``)"""
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + 3600
+            self.purge(now - self.retention_seconds)
+        total = self._db.execute('SELECT COALESCE(SUM(bytes), 0) FROM reports').fetchone()[0]
+        while total > self.max_bytes:
+            victims = self._db.execute(
+                'SELECT id, bytes FROM reports WHERE id != ? ORDER BY accessed_at LIMIT 50', (keep or '',)
+            ).fetchall()
+            if not victims:
+                break
+            for rid, size in victims:
+                self._remove(rid)
+                self.evicted += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def purge(self, older_than: float) -> int:
+        """Delete reports stored before ``older_than`` (epoch seconds); returns how many"""
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                'SELECT id FROM reports WHERE stored_at < ?', (older_than,)
+            ).fetchall()]
+            for rid in expired:
+                self._remove(rid)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            reports, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM reports').fetchone()
+            return {
+                'reports': reports,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'pdfs_rendered': self.rendered,
+                'evicted': self.evicted,
+            }
+
+
+def report_store_from_env() -> Optional[ReportStore]:
+    """Build the report store from environment settings (None when disabled)"""
+    if os.environ.get('REPORT_STORE_DISABLED', '').lower() in ('1', 'true', 'yes'):
+        return None
+    return ReportStore(
+        directory=os.environ.get('REPORT_STORE_DIR', 'cache/reports'),
+        max_bytes=int(float(os.environ.get('REPORT_STORE_MAX_MB', '512')) * 1024 * 1024),
+        retention_seconds=float(os.environ.get('REPORT_RETENTION_DAYS', '30')) * 86400
+    )
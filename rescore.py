@@ -0,0 +1,139 @@
+"""
+Re-score stored analyses after a rubric change, without calling the model
+
+Overall scores are a weighted sum of the category scores, so a change to the
+weights in rubric.py (or RUBRIC_WEIGHTS) only needs arithmetic: the category
+scores of each batch of stored results are loaded into a NumPy matrix and
+multiplied by the weight vector in one step. Calls whose total changes are
+updated in the history store together with their rollups. Reports are not
+re-rendered in bulk; /history/calls/<id>/report (or --report here) renders
+one on demand from the updated results.
+
+    python rescore.py --dry-run
+    python rescore.py
+    python rescore.py --report 3f9c2a1b7d4e --output report.pdf
+"""
+import argparse
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from history_store import HistoryStore, history_store_from_env
+from rubric import CATEGORY_WEIGHTS, MAX_CATEGORY_SCORE, RUBRIC_VERSION, TOTAL_WEIGHT, category_score
+
+
+def score_matrix(results: List[Dict[str, Any]], keys: List[str]) -> np.ndarray:
+    """Category scores as an (n calls x n categories) float matrix; missing or invalid scores are NaN"""
+    matrix = np.full((len(results), len(keys)), np.nan)
+    for row, analysis in enumerate(results):
+        categories = analysis.get('categories')
+        if not isinstance(categories, dict):
+            continue
+        for column, key in enumerate(keys):
+            score = category_score(categories.get(key))
+            if score is not None:
+                matrix[row, column] = score
+    return matrix
+
+
+def weighted_totals(matrix: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Rubric totals (0-100) for every row at once, rounded like round(); missing scores count as 0"""
+    points = np.nan_to_num(matrix, nan=0.0) @ weights
+    return np.rint(points * 100 / (MAX_CATEGORY_SCORE * weights.sum())).astype(int)
+
+
+def rescore(history: HistoryStore, batch_size: int = 5000, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Recompute the overall score of every stored call from its category scores
+
+    Returns:
+        Dict with ``calls`` scanned, ``changed``, ``skipped`` (no category
+        scores), ``mean_delta`` of the changed totals and ``seconds``
+    """
+    keys = list(CATEGORY_WEIGHTS)
+    weights = np.array([CATEGORY_WEIGHTS[key] for key in keys], dtype=float)
+    started = time.perf_counter()
+    scanned = changed = skipped = 0
+    delta_sum = 0
+
+    for batch in history.iter_results(batch_size):
+        ids = [call_id for call_id, _, _ in batch]
+        stored = np.array([overall for _, overall, _ in batch])
+        results = [analysis for _, _, analysis in batch]
+        matrix = score_matrix(results, keys)
+
+        totals = weighted_totals(matrix, weights)
+        scored = ~np.isnan(matrix).all(axis=1)
+        stale = np.array([analysis.get('rubric_version') != RUBRIC_VERSION for analysis in results])
+        update = scored & ((totals != stored) | stale)
+
+        scanned += len(batch)
+        skipped += int((~scored).sum())
+        moved = scored & (totals != stored)
+        changed += int(moved.sum())
+        delta_sum += int((totals[moved] - stored[moved]).sum())
+
+        if dry_run or not update.any():
+            continue
+        history.update_overall_scores([
+            (ids[i], int(totals[i]), dict(results[i], overall_score=int(totals[i]), rubric_version=RUBRIC_VERSION))
+            for i in np.flatnonzero(update)
+        ])
+
+    return {
+        'calls': scanned,
+        'changed': changed,
+        'skipped': skipped,
+        'mean_delta': round(delta_sum / changed, 2) if changed else 0.0,
+        'rubric_version': RUBRIC_VERSION,
+        'total_weight': TOTAL_WEIGHT,
+        'dry_run': dry_run,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def regenerate_report(history: HistoryStore, call_id: str, transcript: str = '') -> Optional[bytes]:
+    """Render the PDF for one stored call from its current results (None if the call is unknown)"""
+    call = history.get_call(call_id)
+    if call is None:
+        return None
+    from report_generator import render_report
+    return bytes(render_report(call['title'] or 'Sales Call', call['meeting_at'], transcript, call['results']))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score stored analyses with the current rubric weights")
+    parser.add_argument('--history', help="History database path (default: HISTORY_PATH or cache/history.db)")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Calls loaded per NumPy batch")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+    parser.add_argument('--report', metavar='CALL_ID', help="Regenerate the PDF report of one call instead")
+    parser.add_argument('--output', help="Where to write the regenerated report (default: <CALL_ID>.pdf)")
+    args = parser.parse_args(argv)
+
+    history = HistoryStore(args.history) if args.history else history_store_from_env()
+    if history is None:
+        print("Analysis history is disabled (HISTORY_DISABLED)", file=sys.stderr)
+        return 1
+
+    if args.report:
+        pdf = regenerate_report(history, args.report)
+        if pdf is None:
+            print(f"No stored call with ID {args.report}", file=sys.stderr)
+            return 1
+        output = args.output or f"{args.report}.pdf"
+        with open(output, 'wb') as f:
+            f.write(pdf)
+        print(f"Report written to {output}")
+        return 0
+
+    summary = rescore(history, batch_size=args.batch_size, dry_run=args.dry_run)
+    print(f"Scanned {summary['calls']} calls in {summary['seconds']}s: {summary['changed']} totals "
+          f"{'would change' if args.dry_run else 'changed'} (mean delta {summary['mean_delta']:+}), "
+          f"{summary['skipped']} without category scores; rubric {summary['rubric_version']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Awaitable, Callable, Dict, Any, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"OpenAI circuit breaker is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """The overall deadline for a request, including retries, has passed"""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker
+
+    Outcomes of the last ``window`` calls are kept. Once at least
+    ``min_requests`` have been seen and the failure share reaches
+    ``failure_rate`` the breaker opens and ``check`` raises CircuitOpenError
+    for ``cooldown`` seconds. After that a single probe call is let through
+    (half-open): success closes the breaker, failure opens it again. The
+    caller holding the probe must hand it back with ``release_probe`` once
+    the attempt is over, so an outcome ``record`` never sees (a 429, a
+    non-retryable error, a deadline) still reopens the breaker instead of
+    leaving it half-open forever.
+
+    Args:
+        failure_rate (float): Failure share that opens the breaker (0-1)
+        window (int): Number of recent outcomes considered
+        min_requests (int): Outcomes needed before the breaker can open
+        cooldown (float): Seconds to stay open before probing
+    """
+
+    def __init__(self, failure_rate: float = 0.5, window: int = 20, min_requests: int = 10,
+                 cooldown: float = 30):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe = 0
+        self._lock = threading.Lock()
+
+    def check(self) -> Optional[int]:
+        """
+        Raise CircuitOpenError if calls should not be attempted right now
+
+        Returns:
+            A probe token when this call is the half-open probe (pass it to
+            ``release_probe`` when the attempt is over), otherwise None
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return None
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                self._probe += 1
+                return self._probe
+            self.rejected += 1
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def release_probe(self, probe: Optional[int]):
+        """Reopen the breaker if the probe ``probe`` ended without ``record`` resolving it"""
+        with self._lock:
+            if probe is not None and probe == self._probe and self.state == 'half_open' and self._probing:
+                self._probing = False
+                self._open()
+
+    def record(self, success: bool):
+        with self._lock:
+            if self.state == 'half_open':
+                if not self._probing:
+                    # A late outcome of a call started before the breaker opened
+                    return
+                self._probing = False
+                if success:
+                    self.state = 'closed'
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (self.state == 'closed' and len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'recent_failure_rate': round(
+                    self._outcomes.count(False) / len(self._outcomes), 3) if self._outcomes else 0.0
+            }
+
+    def _open(self):
+        self.state = 'open'
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        print(f"OpenAI circuit breaker opened for {self.cooldown:.0f}s")
+
+
+class HedgePolicy:
+    """
+    Decides when to send a hedged (duplicate) request
+
+    Latencies of successful calls are tracked per request class (e.g. the
+    max_tokens budget) and the hedge fires once a call has been outstanding
+    longer than the chosen percentile of its class. Until ``min_samples``
+    latencies are known, ``initial_delay`` is used.
+
+    Args:
+        enabled (bool): Hedging on or off
+        percentile (float): Latency percentile after which to hedge
+        initial_delay (float): Hedge delay in seconds before enough samples exist
+        min_delay (float): Lower bound on the hedge delay in seconds
+        min_samples (int): Samples needed before the percentile is trusted
+        window (int): Recent latencies kept per request class
+    """
+
+    def __init__(self, enabled: bool = False, percentile: float = 95, initial_delay: float = 30,
+                 min_delay: float = 2, min_samples: int = 20, window: int = 200):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadlines_exceeded = 0
+        self._latencies: Dict[Any, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: Any, seconds: float):
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None:
+                samples = self._latencies[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, key: Any) -> Optional[float]:
+        """Seconds to wait before hedging a call of this class (None when hedging is off)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        rank = max(1, math.ceil(self.percentile / 100 * len(samples)))
+        return max(self.min_delay, samples[rank - 1])
+
+    def record_hedge(self, won: bool):
+        with self._lock:
+            self.hedges += 1
+            self.hedge_wins += int(won)
+
+    def record_deadline(self):
+        with self._lock:
+            self.deadlines_exceeded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hedging': self.enabled,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'deadlines_exceeded': self.deadlines_exceeded
+            }
+
+
+def hedged_call(call: Callable[[], T], hedge_delay: Optional[float], executor: ThreadPoolExecutor,
+                policy: HedgePolicy) -> T:
+    """
+    Run ``call``, starting a second copy if the first is slower than ``hedge_delay``
+
+    The first successful result wins. A blocking HTTP call cannot be
+    interrupted, so the losing copy finishes in the background and its result
+    is discarded. If both copies fail, the last error is raised.
+    """
+    if hedge_delay is None:
+        return call()
+    primary = executor.submit(call)
+    try:
+        return primary.result(timeout=hedge_delay)
+    except FutureTimeout:
+        pass
+
+    backup = executor.submit(call)
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                policy.record_hedge(won=future is backup)
+                return future.result()
+            error = future.exception()
+    policy.record_hedge(won=False)
+    raise error
+
+
+async def hedged_call_async(call: Callable[[], Awaitable[T]], hedge_delay: Optional[float],
+                            policy: HedgePolicy) -> T:
+    """Async variant of hedged_call; the losing request is cancelled"""
+    if hedge_delay is None:
+        return await call()
+    primary = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    backup = asyncio.ensure_future(call())
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    policy.record_hedge(won=task is backup)
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    policy.record_hedge(won=False)
+    raise error
+
+
+def breaker_from_env() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_rate=float(os.environ.get('OPENAI_BREAKER_FAILURE_RATE', '0.5')),
+        window=int(os.environ.get('OPENAI_BREAKER_WINDOW', '20')),
+        min_requests=int(os.environ.get('OPENAI_BREAKER_MIN_REQUESTS', '10')),
+        cooldown=float(os.environ.get('OPENAI_BREAKER_COOLDOWN', '30'))
+    )
+
+
+def hedge_policy_from_env() -> HedgePolicy:
+    return HedgePolicy(
+        enabled=os.environ.get('OPENAI_HEDGE', '').lower() in ('1', 'true', 'yes'),
+        percentile=float(os.environ.get('OPENAI_HEDGE_PERCENTILE', '95')),
+        initial_delay=float(os.environ.get('OPENAI_HEDGE_INITIAL_DELAY', '30')),
+        min_delay=float(os.environ.get('OPENAI_HEDGE_MIN_DELAY', '2'))
+    )
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+# The scoring rubric: (key, display name, weight, criteria). This is the only
+# place weights are defined; prompts, overall scores, reports and re-scoring
+# all read them from here.
+CATEGORIES: List[Tuple[str, str, int, str]] = [
+    ('needs_discovery', 'Needs Discovery', 25,
+     "Did the coach effectively uncover the client's goals, struggles, and current situation?"),
+    ('pain_point_exploration', 'Pain Point Exploration', 25,
+     "How well did the coach dig into the client's pain points and their impact?"),
+    ('consequence_urgency', 'Consequence & Urgency', 15,
+     "Did the coach effectively communicate consequences of inaction and create urgency?"),
+    ('obstacle_handling', 'Obstacle Handling', 15,
+     "How well did the coach address potential obstacles and concerns before the pitch?"),
+    ('objection_handling', 'Objection Handling', 10,
+     "How effectively did the coach handle objections after the pitch?"),
+    ('next_steps_closing', 'Next Steps & Closing', 10,
+     "How clearly were next steps outlined and buying decision reinforced?"),
+]
+
+# Categories are scored 1-10 by the model
+MAX_CATEGORY_SCORE = 10
+
+
+def _weights_from_env() -> Dict[str, int]:
+    """Default weights, optionally overridden with RUBRIC_WEIGHTS="needs_discovery=30,objection_handling=5" """
+    weights = {key: weight for key, _, weight, _ in CATEGORIES}
+    override = os.environ.get('RUBRIC_WEIGHTS', '').strip()
+    for pair in filter(None, (part.strip() for part in override.split(','))):
+        key, _, value = pair.partition('=')
+        if key.strip() not in weights:
+            raise ValueError(f"RUBRIC_WEIGHTS names an unknown category: {key.strip()}")
+        weights[key.strip()] = int(value)
+    return weights
+
+
+CATEGORY_WEIGHTS: Dict[str, int] = _weights_from_env()
+CATEGORY_NAMES: Dict[str, str] = {key: name for key, name, _, _ in CATEGORIES}
+CATEGORY_CRITERIA: Dict[str, str] = {key: criteria for key, _, _, criteria in CATEGORIES}
+TOTAL_WEIGHT = sum(CATEGORY_WEIGHTS.values())
+
+# Short fingerprint of the weights, stored with each result so stale totals can be found
+RUBRIC_VERSION = hashlib.sha256(json.dumps(CATEGORY_WEIGHTS, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def prompt_lines() -> str:
+    """The "- Name (N points): criteria" lines used in the analysis prompt"""
+    return '\n'.join(
+        f"- {name} ({CATEGORY_WEIGHTS[key]} points): {criteria}" for key, name, _, criteria in CATEGORIES
+    )
+
+
+def category_label(key: str) -> str:
+    """"Needs Discovery (25 pts)" """
+    return f"{CATEGORY_NAMES[key]} ({CATEGORY_WEIGHTS[key]} pts)"
+
+
+def category_score(category: Any) -> Optional[float]:
+    """
+    A category's score as a float clamped to 0..MAX_CATEGORY_SCORE
+
+    Model output is not trusted to be well typed: numeric strings ("8") are
+    accepted, and a missing, non-numeric or non-finite score gives None.
+    """
+    if not isinstance(category, dict):
+        return None
+    value = category.get('score')
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(score):
+        return None
+    return min(max(score, 0.0), float(MAX_CATEGORY_SCORE))
+
+
+def _score(categories: Dict[str, Any], key: str) -> float:
+    score = category_score(categories.get(key))
+    return 0.0 if score is None else score
+
+
+def weighted_scores(categories: Dict[str, Any], weights: Optional[Dict[str, int]] = None) -> Dict[str, float]:
+    """Points each category contributes to the 100-point total (missing categories score 0)"""
+    weights = weights or CATEGORY_WEIGHTS
+    scale = 100 / (MAX_CATEGORY_SCORE * (sum(weights.values()) or 1))
+    return {key: _score(categories, key) * weight * scale for key, weight in weights.items()}
+
+
+def overall_score(categories: Dict[str, Any], weights: Optional[Dict[str, int]] = None) -> float:
+    """
+    Weighted 0-100 total of the category scores
+
+    Computed as one integer weighted sum scaled once, the same operations
+    rescore.py performs on arrays, so both round to the same total.
+    """
+    weights = weights or CATEGORY_WEIGHTS
+    points = sum(_score(categories, key) * weight for key, weight in weights.items())
+    return points * 100 / (MAX_CATEGORY_SCORE * (sum(weights.values()) or 1))
+
+
+def apply_rubric(analysis_results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Set ``overall_score`` to the rubric's weighted total of the category scores
+
+    The model's own total is not trusted: it can disagree with its category
+    scores, and it goes stale when the weights change. Results without
+    usable category scores (failed analyses) are returned unchanged; invalid
+    scores count as 0 and out-of-range ones are clamped (see category_score).
+    """
+    categories = analysis_results.get('categories')
+    if not isinstance(categories, dict) or not any(
+            category_score(category) is not None for category in categories.values()):
+        return analysis_results
+    analysis_results = dict(analysis_results)
+    analysis_results['overall_score'] = round(overall_score(categories))
+    analysis_results['rubric_version'] = RUBRIC_VERSION
+    return analysis_results
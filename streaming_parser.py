@@ -0,0 +1,109 @@
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from analysis_schema import validate_category
+
+
+class IncrementalAnalysisParser:
+    """
+    Incremental parser for a streamed analysis JSON document
+
+    Text is fed in as it arrives from the model. The parser tracks JSON
+    nesting (ignoring braces inside strings) and, as soon as an object under
+    ``categories`` closes, parses and validates it on its own. Each completed
+    category is returned from ``feed`` as a ``('category', key, data)`` or
+    ``('invalid', key, errors)`` event, so callers can show results before the
+    model has finished and repair only the categories that came out wrong.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.categories: Dict[str, Dict[str, Any]] = {}
+        self.invalid: Dict[str, List[str]] = {}
+        # Each entry is [opening character, current key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = ''
+        self._capture_start: Optional[int] = None
+        self._capture_key: Optional[str] = None
+
+    def feed(self, delta: str) -> List[Tuple[str, str, Any]]:
+        """Consume the next piece of streamed text and return any completed category events"""
+        events = []
+        start = len(self.text)
+        self.text += delta
+
+        for pos in range(start, len(self.text)):
+            char = self.text[pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = self.text[self._string_start + 1:pos]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ':':
+                if self._stack and self._stack[-1][0] == '{':
+                    self._stack[-1][1] = self._decode_key(self._last_string)
+            elif char in '{[':
+                self._stack.append([char, None])
+                # root object -> "categories" object -> category object
+                if (char == '{' and len(self._stack) == 3
+                        and self._stack[0][1] == 'categories' and self._stack[1][0] == '{'):
+                    self._capture_start = pos
+                    self._capture_key = self._stack[1][1]
+            elif char in '}]':
+                if char == '}' and len(self._stack) == 3 and self._capture_start is not None:
+                    events.append(self._complete_category(self.text[self._capture_start:pos + 1]))
+                    self._capture_start = None
+                if self._stack:
+                    self._stack.pop()
+
+        return events
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Parse the full document once streaming has finished (None if it is not valid JSON)"""
+        start_idx = self.text.find('{')
+        end_idx = self.text.rfind('}') + 1
+        if start_idx == -1 or end_idx <= start_idx:
+            return None
+        try:
+            return json.loads(self.text[start_idx:end_idx])
+        except json.JSONDecodeError:
+            return None
+
+    def _complete_category(self, text: str) -> Tuple[str, str, Any]:
+        key = self._capture_key
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.invalid[key] = [f"invalid JSON: {e.msg}"]
+            return ('invalid', key, self.invalid[key])
+        errors = validate_category(data)
+        if errors:
+            self.invalid[key] = errors
+            return ('invalid', key, errors)
+        self.categories[key] = data
+        return ('category', key, data)
+
+    @staticmethod
+    def _decode_key(raw: str) -> str:
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return raw
+
+
+def salvage_categories(text: str) -> Dict[str, Dict[str, Any]]:
+    """Recover every complete, valid category from a truncated or malformed analysis response"""
+    parser = IncrementalAnalysisParser()
+    parser.feed(text)
+    return parser.categories
@@ -0,0 +1,38 @@
+"""
+Tests for the analysis history store
+"""
+import os
+
+from history_store import HistoryStore
+from rubric import CATEGORY_NAMES, overall_score
+
+
+def test_record_coerces_and_clamps_non_integer_scores(tmp_path):
+    history = HistoryStore(os.path.join(tmp_path, 'history.db'))
+    keys = list(CATEGORY_NAMES)
+    results = {
+        'overall_score': '81.5',
+        'payment_detected': 'PIF',
+        'categories': {
+            keys[0]: {'score': '8.5'},
+            keys[1]: {'score': 7.2},
+            keys[2]: {'score': 14},
+            keys[3]: {'score': 'n/a'},
+            keys[4]: 'not a category',
+        },
+        'call_stats': {'coach': 'Sarah Jones'},
+    }
+
+    assert history.record('job-1', 'Discovery call', '2026-03-02T10:00:00', results)
+
+    [call] = history.calls()
+    assert call['coach'] == 'Sarah Jones'
+    # The overall score is recomputed from the clamped category scores, not taken from the model
+    assert call['overall_score'] == round(overall_score(results['categories']))
+
+    scores = {entry['category_score'] for entry in history.calls(category=keys[2])}
+    assert scores == {10}
+    assert history.calls(category=keys[3]) == []
+
+    [rollup] = history.rollups(period='day')
+    assert rollup['calls'] == 1
@@ -0,0 +1,41 @@
+"""
+Tests for PDF report rendering
+"""
+import tracemalloc
+
+import pytest
+
+pytest.importorskip('reportlab')
+
+import report_generator
+
+# Peak traced memory allowed for rendering a 180-minute call with its full transcript
+MAX_RENDER_BYTES = 8 * 1024 * 1024
+
+
+def long_transcript(minutes: int = 180, seconds_per_line: int = 4) -> str:
+    speakers = ('Coach', 'Sarah')
+    lines = []
+    for n in range(minutes * 60 // seconds_per_line):
+        seconds = n * seconds_per_line
+        stamp = f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        lines.append(f"[{stamp}] {speakers[n // 3 % 2]}: Line {n} of the call, where we talk through "
+                     f"goals, past attempts, the program and what getting started would look like.")
+    return '\n'.join(lines)
+
+
+def test_full_transcript_render_stays_within_memory_bound(monkeypatch):
+    monkeypatch.setattr(report_generator, 'TRANSCRIPT_MODE', 'full')
+    transcript = long_transcript()
+    results = {'overall_score': 70, 'summary': 'Solid discovery.', 'categories': {}}
+    report_generator.get_report_styles()
+
+    tracemalloc.start()
+    try:
+        pdf = report_generator.render_report('Long call', '2026-03-02T10:00:00', transcript, results)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert bytes(pdf[:5]) == b'%PDF-'
+    assert peak < MAX_RENDER_BYTES
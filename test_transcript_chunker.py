@@ -0,0 +1,22 @@
+"""
+Tests for transcript chunking
+"""
+from transcript_chunker import chunk_transcript
+
+MAX_TOKENS = 200
+
+
+def test_chunks_stay_within_budget_when_a_stage_overflows():
+    # The opening stage fills most of a chunk; the next stage then ends on one
+    # long turn, so cutting at the stage boundary alone leaves an oversized chunk
+    lines = ["Coach: Tell me about where you are right now with your health."]
+    lines += ["Client: " + "I work long shifts and eat late most nights. " * 2] * 4
+    lines += ["Coach: It sounds like evenings are the hardest part."]
+    lines += ["Client: " + "I snack a lot after the kids go to bed. " * 2] * 2
+    lines += ["Client: " + "It is hard to stop snacking once the house is quiet and everyone is asleep. " * 8]
+
+    chunks = chunk_transcript('\n'.join(lines), MAX_TOKENS)
+
+    assert all(chunk['tokens'] <= MAX_TOKENS for chunk in chunks)
+    assert '\n'.join(chunk['text'] for chunk in chunks) == '\n'.join(lines)
+    assert chunks[0]['stages'] == ['where_are_they_now']
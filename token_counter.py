@@ -0,0 +1,44 @@
+from functools import lru_cache
+
+# Rough characters-per-token ratio for English text, used without tiktoken
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    """
+    The tiktoken encoding, or None to use the character-based estimate
+
+    tiktoken is optional and imported here, on first use, so importing this
+    module (and everything that counts tokens) stays cheap. tiktoken downloads its BPE files on first use, which fails without
+    network access or a writable cache. Any failure is treated as "no
+    tiktoken" and, being a return value, is cached like a success, so the
+    download is not retried on every call.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        print("tiktoken is not installed; counting tokens with the character-based estimate")
+        return None
+    for name in ('o200k_base', 'cl100k_base'):
+        try:
+            return tiktoken.get_encoding(name)
+        except Exception as e:
+            print(f"tiktoken encoding {name} unavailable ({type(e).__name__}: {str(e)[:200]})")
+    print("Counting tokens with the character-based estimate")
+    return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the prompt tokens in a piece of text
+
+    Uses tiktoken when its encoding can be loaded and falls back to a character-based
+    estimate otherwise, which is close enough for budgeting decisions.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
@@ -0,0 +1,158 @@
+import re
+from typing import Dict, Any, List, Optional
+from rubric import category_score, overall_score
+from token_counter import count_tokens
+
+# Sales framework stages with the phrases that typically open them. The order
+# matches the framework in the system prompt; detection only moves forward.
+FRAMEWORK_STAGES = [
+    ('where_are_they_now', re.compile(
+        r"where are you|right now|currently|tell me (a bit )?about|how long have you", re.I)),
+    ('clarify_and_label', re.compile(
+        r"what i'?m hearing|it sounds like|when you say|how is that affecting|what does that mean", re.I)),
+    ('past_experiences', re.compile(
+        r"have you tried|tried in the past|in the past|what worked|didn'?t work|what have you tried", re.I)),
+    ('sell_the_vacation', re.compile(
+        r"imagine|picture|what would your life look like|how would that (change|feel)|if we could", re.I)),
+    ('explain_concerns', re.compile(
+        r"concern|worried|get in the way|support at home|willing and able|ready to commit", re.I)),
+    ('reinforce_decision', re.compile(
+        r"great decision|welcome (to|aboard)|onboarding|excited to help|get you started|first (coaching )?call", re.I)),
+]
+
+# Maximum list items kept per category field when merging chunk results
+MAX_ITEMS_PER_FIELD = 5
+
+
+def split_turns(transcript: str) -> List[str]:
+    """Split a formatted transcript into speaker turns (one per non-empty line)"""
+    return [line for line in transcript.split('\n') if line.strip()]
+
+
+def detect_stage(turn: str, current: int = -1) -> int:
+    """
+    Return the index of the latest framework stage a turn opens
+
+    Only stages after ``current`` are considered so a late callback to an
+    earlier topic does not move the conversation backwards.
+    """
+    for index in range(len(FRAMEWORK_STAGES) - 1, current, -1):
+        if FRAMEWORK_STAGES[index][1].search(turn):
+            return index
+    return current
+
+
+def chunk_transcript(transcript: str, max_tokens: int) -> List[Dict[str, Any]]:
+    """
+    Split a transcript into chunks of at most ``max_tokens`` tokens
+
+    Chunks always end on a speaker-turn boundary. When a chunk is full it is
+    cut at the most recent framework stage transition if that keeps it at
+    least half full, so each chunk tends to cover whole framework stages.
+    Only a single turn longer than ``max_tokens`` yields a larger chunk.
+
+    Returns:
+        List of dicts with ``text``, ``tokens`` and the ``stages`` each chunk covers
+    """
+    chunks = []
+    turns: List[str] = []
+    turn_tokens: List[int] = []
+    turn_stages: List[int] = []
+    boundaries: List[int] = []
+    stage = -1
+
+    def emit(count: int):
+        chunks.append({
+            'text': '\n'.join(turns[:count]),
+            'tokens': sum(turn_tokens[:count]),
+            'stages': [FRAMEWORK_STAGES[s][0] for s in sorted(set(turn_stages[:count])) if s >= 0]
+        })
+        del turns[:count], turn_tokens[:count], turn_stages[:count]
+        boundaries[:] = [b - count for b in boundaries if b > count]
+
+    for turn in split_turns(transcript):
+        tokens = count_tokens(turn) + 1
+        new_stage = detect_stage(turn, stage)
+
+        # A stage cut can leave a remainder that still overflows with this turn,
+        # so keep cutting (down to single turns) until the turn fits
+        while turns and sum(turn_tokens) + tokens > max_tokens:
+            cut = boundaries[-1] if boundaries else len(turns)
+            if sum(turn_tokens[:cut]) < max_tokens // 2:
+                cut = len(turns)
+            emit(cut)
+
+        if new_stage != stage and turns:
+            boundaries.append(len(turns))
+        stage = new_stage
+        turns.append(turn)
+        turn_tokens.append(tokens)
+        turn_stages.append(stage)
+
+    if turns:
+        emit(len(turns))
+    return chunks
+
+
+def _merge_items(values: List[List[str]]) -> List[str]:
+    merged = []
+    seen = set()
+    for items in values:
+        for item in items or []:
+            key = str(item).strip().lower()
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged[:MAX_ITEMS_PER_FIELD]
+
+
+def reduce_chunk_results(partials: List[Dict[str, Any]], weights: Dict[str, int],
+                         chunk_tokens: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Combine per-chunk analysis results into a single result
+
+    Category scores are averaged across the chunks that scored them, weighted
+    by chunk length; list fields are concatenated in call order and
+    de-duplicated; the last detected payment method wins; the overall score
+    is the rubric total (rubric.overall_score) for ``weights``.
+    """
+    chunk_tokens = chunk_tokens or [1] * len(partials)
+    categories = {}
+
+    for key in weights:
+        total = 0.0
+        weight_sum = 0
+        fields = {'highlights': [], 'missed_opportunities': [], 'feedback': []}
+        for partial, tokens in zip(partials, chunk_tokens):
+            category = (partial.get('categories') or {}).get(key)
+            if not category or not isinstance(category, dict):
+                continue
+            score = category_score(category)
+            if score is not None:
+                total += score * tokens
+                weight_sum += tokens
+            for field in fields:
+                fields[field].append(category.get(field, []))
+
+        categories[key] = {
+            'score': round(total / weight_sum) if weight_sum else 0,
+            'highlights': _merge_items(fields['highlights']),
+            'missed_opportunities': _merge_items(fields['missed_opportunities']),
+            'feedback': _merge_items(fields['feedback'])
+        }
+
+    payment_detected = 'Unknown'
+    for partial in partials:
+        payment = partial.get('payment_detected')
+        if payment and payment not in ('Unknown', 'None', 'null'):
+            payment_detected = payment
+
+    summaries = [p.get('summary', '') for p in partials if p.get('summary')]
+
+    return {
+        'overall_score': round(overall_score(categories, weights)),
+        'categories': categories,
+        'payment_detected': payment_detected,
+        'summary': ' '.join(summaries),
+        'chunks_analyzed': len(partials)
+    }
@@ -0,0 +1,180 @@
+import os
+import re
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+
+from token_counter import count_tokens
+
+# Send the compact transcript to the model (the PDF keeps the full one)
+TRANSCRIPT_COMPACT = os.environ.get('TRANSCRIPT_COMPACT', 'true').lower() in ('1', 'true', 'yes')
+# Longest merged line; keeps monologues splittable by the long-transcript chunker
+MAX_MERGED_CHARS = int(os.environ.get('TRANSCRIPT_MAX_MERGED_CHARS', '1200'))
+
+# Pure hesitation sounds and verbal tics that carry no meaning for the rubric
+_FILLER_RE = re.compile(
+    r"(?<![\w'-])(?:u+m+|u+h+|e+r+m+|h+m+|m+hm+|uh-huh|mm-hmm)(?![\w'-])[,.]?\s*"
+    r"|(?<![\w'-])(?:you know|i mean),\s*",
+    re.I
+)
+_SPACES_RE = re.compile(r'\s{2,}')
+_TEXT_LINE_RE = re.compile(r'^\s*(?:\[(?P<timestamp>[^\]]*)\]\s*)?(?P<speaker>[^:\[\]]{1,60}):\s*(?P<text>.*)$')
+
+LEGEND_PREFIX = 'Speakers: '
+_LEGEND_ENTRY_RE = re.compile(r'(?:^|, )([^\s,=]+) = ')
+
+Turn = Tuple[str, str, str]
+
+
+def iter_turns(transcript: Union[list, str]) -> Iterator[Turn]:
+    """
+    Yield ``(speaker, timestamp, text)`` for each fragment of a transcript
+
+    Accepts Fathom's webhook list format or already formatted
+    ``[timestamp] Speaker: text`` lines.
+    """
+    if isinstance(transcript, list):
+        for entry in transcript:
+            speaker = entry.get('speaker', {}).get('display_name', 'Unknown')
+            yield speaker, str(entry.get('timestamp', '')), entry.get('text', '')
+        return
+    for line in str(transcript).splitlines():
+        if not line.strip():
+            continue
+        match = _TEXT_LINE_RE.match(line)
+        if match:
+            yield match.group('speaker').strip(), match.group('timestamp') or '', match.group('text')
+        else:
+            yield '', '', line.strip()
+
+
+def format_transcript(transcript: Union[list, str], compact: bool = False) -> str:
+    """
+    Convert Fathom transcript format to readable text
+
+    With compact=True, return the token-reduced form sent to the model:
+    merged speaker turns, short timestamps, speaker aliases and no filler words.
+    """
+    if compact:
+        return compact_transcript(transcript)[0]
+    if isinstance(transcript, list):
+        formatted_lines = []
+        for entry in transcript:
+            speaker = entry.get('speaker', {}).get('display_name', 'Unknown')
+            text = entry.get('text', '')
+            timestamp = entry.get('timestamp', '')
+            formatted_lines.append(f"[{timestamp}] {speaker}: {text}")
+        return '\n'.join(formatted_lines)
+    else:
+        return str(transcript)
+
+
+def shorten_timestamp(timestamp: str) -> str:
+    """"00:01:30" -> "1:30", "01:02:03.500" -> "1:02:03", 90 -> "1:30" """
+    value = str(timestamp).strip()
+    if not value:
+        return ''
+    if re.fullmatch(r'\d+(\.\d+)?', value):
+        seconds = int(float(value))
+        hours, rest = divmod(seconds, 3600)
+        value = f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+    value = value.split('.', 1)[0]
+    parts = value.split(':')
+    while len(parts) > 2 and parts[0].lstrip('0') == '':
+        parts.pop(0)
+    parts[0] = parts[0].lstrip('0') or '0'
+    return ':'.join(parts)
+
+
+def strip_fillers(text: str) -> str:
+    return _SPACES_RE.sub(' ', _FILLER_RE.sub('', text)).strip()
+
+
+def speaker_aliases(turns: Iterable[Turn]) -> Dict[str, str]:
+    """Map each speaker name to a short alias built from its initials (S, S2, JD...)"""
+    aliases: Dict[str, str] = {}
+    used = set()
+    for speaker, _, _ in turns:
+        if not speaker or speaker in aliases:
+            continue
+        initials = ''.join(word[0] for word in re.findall(r'\w+', speaker)).upper()[:3] or 'S'
+        alias, n = initials, 2
+        while alias in used:
+            alias, n = f"{initials}{n}", n + 1
+        aliases[speaker] = alias
+        used.add(alias)
+    return aliases
+
+
+def iter_compact_lines(transcript: Union[list, str], aliases: Dict[str, str],
+                       stats: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """
+    Yield compact transcript lines in a single pass over the fragments
+
+    Consecutive fragments from one speaker are merged into one line (up to
+    MAX_MERGED_CHARS) under the first fragment's shortened timestamp, the
+    speaker is replaced by its alias and filler words are removed. When
+    ``stats`` is given, ``original_tokens`` accumulates the token count of the
+    uncompacted ``[timestamp] Speaker: text`` lines as they stream past.
+    """
+    speaker, timestamp, parts, length = None, '', [], 0
+    for turn_speaker, turn_timestamp, text in iter_turns(transcript):
+        if stats is not None:
+            original = f"[{turn_timestamp}] {turn_speaker}: {text}" if turn_speaker else text
+            stats['original_tokens'] = stats.get('original_tokens', 0) + count_tokens(original) + 1
+        text = strip_fillers(text)
+        if not text:
+            continue
+        if not turn_speaker and speaker is not None:
+            # Continuation line without a speaker prefix
+            turn_speaker, turn_timestamp = speaker, ''
+        if parts and (turn_speaker != speaker or length + len(text) > MAX_MERGED_CHARS):
+            yield _compact_line(aliases.get(speaker, speaker), timestamp, parts)
+            parts, length = [], 0
+        if not parts:
+            speaker, timestamp = turn_speaker, shorten_timestamp(turn_timestamp)
+        parts.append(text)
+        length += len(text) + 1
+    if parts:
+        yield _compact_line(aliases.get(speaker, speaker), timestamp, parts)
+
+
+def _compact_line(alias: str, timestamp: str, parts: list) -> str:
+    prefix = f"[{timestamp}] " if timestamp else ''
+    return f"{prefix}{alias}: {' '.join(parts)}" if alias else prefix + ' '.join(parts)
+
+
+def compact_transcript(transcript: Union[list, str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the token-reduced transcript sent to the model
+
+    The text starts with a speaker legend (``Speakers: S = Sarah, C = Coach``)
+    followed by the compact lines. Speaker names are collected in a cheap
+    first scan; the lines themselves are produced and joined in one pass.
+
+    Returns:
+        Tuple of the compact text and stats with ``original_tokens``,
+        ``compact_tokens`` and ``tokens_saved``
+    """
+    aliases = speaker_aliases(iter_turns(transcript))
+    stats: Dict[str, Any] = {'original_tokens': 0}
+    legend = ', '.join(f"{alias} = {name}" for name, alias in aliases.items())
+    body = '\n'.join(iter_compact_lines(transcript, aliases, stats))
+    text = f"{LEGEND_PREFIX}{legend}\n{body}" if legend else body
+    stats['compact_tokens'] = count_tokens(text)
+    stats['tokens_saved'] = max(0, stats['original_tokens'] - stats['compact_tokens'])
+    return text, stats
+
+
+def split_legend(transcript: str) -> Tuple[str, str]:
+    """Separate the speaker legend line from a compact transcript ("" if there is none)"""
+    if transcript.startswith(LEGEND_PREFIX):
+        legend, _, body = transcript.partition('\n')
+        return legend, body
+    return '', transcript
+
+
+def legend_names(legend: str) -> Dict[str, str]:
+    """Map each alias in a speaker legend ("Speakers: S = Sarah, JD = John Doe") back to its speaker name"""
+    if legend.startswith(LEGEND_PREFIX):
+        legend = legend[len(LEGEND_PREFIX):]
+    parts = _LEGEND_ENTRY_RE.split(legend.strip())
+    return dict(zip(parts[1::2], parts[2::2]))
@@ -0,0 +1,207 @@
+import io
+import os
+import re
+from collections import deque
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Frame, Paragraph, Flowable
+
+# Transcript appendix mode: "full", "truncate", "off" or "attachment"
+TRANSCRIPT_MODE = os.environ.get('TRANSCRIPT_MODE', 'full')
+# Lines kept when TRANSCRIPT_MODE is "truncate"
+TRANSCRIPT_MAX_LINES = int(os.environ.get('TRANSCRIPT_MAX_LINES', '500'))
+# Consecutive lines from one speaker merged into a single paragraph
+LINES_PER_BLOCK = int(os.environ.get('TRANSCRIPT_LINES_PER_BLOCK', '12'))
+
+_LINE_RE = re.compile(r'^\s*(?:\[(?P<timestamp>[^\]]*)\]\s*)?(?P<speaker>[^:\[\]]{1,60}):\s*(?P<text>.*)$')
+
+
+@lru_cache(maxsize=None)
+def get_transcript_styles() -> Dict[str, ParagraphStyle]:
+    """Compact paragraph styles for transcript blocks (built once per process)"""
+    styles = getSampleStyleSheet()
+    return {
+        'heading': ParagraphStyle(
+            'TranscriptHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=12,
+            textColor=colors.darkblue
+        ),
+        'block': ParagraphStyle(
+            'TranscriptBlock',
+            parent=styles['Normal'],
+            fontSize=9,
+            leading=11,
+            spaceAfter=6
+        ),
+        'note': ParagraphStyle(
+            'TranscriptNote',
+            parent=styles['Italic'],
+            fontSize=9,
+            textColor=colors.grey
+        )
+    }
+
+
+def iter_turn_blocks(transcript: str, lines_per_block: int = LINES_PER_BLOCK,
+                     max_lines: Optional[int] = None) -> Iterator[Tuple[str, str, List[str]]]:
+    """
+    Group consecutive transcript lines from the same speaker
+
+    Yields ``(speaker, first_timestamp, texts)`` one block at a time, so a
+    multi-hour transcript is never materialized as a list of lines.
+    """
+    speaker, timestamp, texts = None, '', []
+    count = 0
+    for line in transcript.splitlines():
+        if not line.strip():
+            continue
+        if max_lines is not None and count >= max_lines:
+            break
+        count += 1
+
+        match = _LINE_RE.match(line)
+        if match:
+            line_speaker = match.group('speaker').strip()
+            line_timestamp = match.group('timestamp') or ''
+            text = match.group('text')
+        else:
+            # Continuation line without a speaker prefix
+            line_speaker, line_timestamp, text = speaker or '', '', line.strip()
+
+        if texts and (line_speaker != speaker or len(texts) >= lines_per_block):
+            yield speaker, timestamp, texts
+            texts = []
+        if not texts:
+            speaker, timestamp = line_speaker, line_timestamp
+        texts.append(text)
+
+    if texts:
+        yield speaker, timestamp, texts
+
+
+def count_transcript_lines(transcript: str) -> int:
+    return sum(1 for line in transcript.splitlines() if line.strip())
+
+
+def transcript_flowables(transcript: str, mode: str = TRANSCRIPT_MODE,
+                         max_lines: int = TRANSCRIPT_MAX_LINES) -> Iterator[Flowable]:
+    """
+    Yield compact paragraphs for the transcript, one per speaker block
+
+    Args:
+        transcript (str): Formatted transcript text
+        mode (str): "full" or "truncate" (other modes yield nothing)
+        max_lines (int): Line limit used in "truncate" mode
+    """
+    if mode not in ('full', 'truncate'):
+        return
+    styles = get_transcript_styles()
+    limit = max_lines if mode == 'truncate' else None
+
+    for speaker, timestamp, texts in iter_turn_blocks(transcript, max_lines=limit):
+        label = escape(f"[{timestamp}] {speaker}" if timestamp else speaker)
+        body = '<br/>'.join(escape(text) for text in texts)
+        yield Paragraph(f"<b>{label}:</b> {body}" if label else body, styles['block'])
+
+    if limit is not None:
+        total = count_transcript_lines(transcript)
+        if total > limit:
+            yield Paragraph(
+                f"Transcript truncated: showing {limit} of {total} lines.", styles['note']
+            )
+
+
+def transcript_note(mode: str = TRANSCRIPT_MODE, separate_pdf: bool = False) -> Optional[str]:
+    """
+    How a report email describes the transcript it carries
+
+    Args:
+        mode (str): TRANSCRIPT_MODE the report was rendered with
+        separate_pdf (bool): The standalone transcript PDF is attached too
+
+    Returns:
+        The line for the email's contents list, or None when no transcript is included
+    """
+    if separate_pdf:
+        return "Full transcript (separate PDF)"
+    if mode == 'full':
+        return "Full transcript"
+    if mode == 'truncate':
+        return f"Transcript (first {TRANSCRIPT_MAX_LINES} lines)"
+    return None
+
+
+def draw_flowables(pdf: canvas.Canvas, source: Iterator[Flowable], new_frame: Callable[[], Frame]):
+    """
+    Lay flowables out onto ``pdf`` one page at a time, starting on its current page
+
+    Flowables are pulled from ``source`` and drawn straight onto the current
+    page's frame, so only the block being placed is held in memory rather
+    than a flowable list for the whole transcript. The last page is left
+    open; ``pdf.save()`` finishes it.
+    """
+    frame = new_frame()
+    page_empty = True
+    pending = deque()
+    while True:
+        if not pending:
+            flowable = next(source, None)
+            if flowable is None:
+                break
+            pending.append(flowable)
+        flowable = pending.popleft()
+
+        if frame.add(flowable, pdf):
+            page_empty = False
+            continue
+
+        # Place whatever fits on this page and carry the remainder over
+        parts = frame.split(flowable, pdf)
+        if parts and frame.add(parts[0], pdf):
+            pending.extendleft(reversed(parts[1:]))
+        elif page_empty:
+            # Cannot fit even on an empty page; drop it rather than loop forever
+            print("Skipping transcript block too large to lay out")
+            continue
+        else:
+            pending.appendleft(flowable)
+        pdf.showPage()
+        frame = new_frame()
+        page_empty = True
+
+
+def render_transcript_pdf(output: Union[str, BinaryIO], transcript: str, meeting_title: str = ''):
+    """Render the full transcript as a standalone PDF, laying it out one page at a time"""
+    page_width, page_height = A4
+    margin = 0.5 * inch
+    pdf = canvas.Canvas(output, pagesize=A4)
+
+    def new_frame() -> Frame:
+        return Frame(margin, margin, page_width - 2 * margin, page_height - 2 * margin, showBoundary=0)
+
+    styles = get_transcript_styles()
+    title = escape(f"Transcript - {meeting_title}" if meeting_title else "Transcript")
+
+    def flowables() -> Iterator[Flowable]:
+        yield Paragraph(title, styles['heading'])
+        yield from transcript_flowables(transcript, mode='full')
+
+    draw_flowables(pdf, flowables(), new_frame)
+    pdf.save()
+
+
+def render_transcript_attachment(transcript: str, meeting_title: str = '') -> bytes:
+    """Render the standalone transcript PDF into memory"""
+    buffer = io.BytesIO()
+    render_transcript_pdf(buffer, transcript, meeting_title)
+    return buffer.getvalue()
+
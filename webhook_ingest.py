@@ -0,0 +1,140 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Largest webhook body accepted; a 3 hour transcript is well under this
+WEBHOOK_MAX_BYTES = int(os.environ.get('WEBHOOK_MAX_BYTES', str(16 * 1024 * 1024)))
+WEBHOOK_SIGNATURE_HEADER = os.environ.get('WEBHOOK_SIGNATURE_HEADER', 'X-Fathom-Signature')
+# Placeholder secrets from the example configs; signatures are only enforced with a real one
+PLACEHOLDER_SECRETS = ('your-webhook-secret', 'your-webhook-secret-from-fathom')
+# Payload fields tried in order for the meeting identity used to drop repeated deliveries
+MEETING_ID_FIELDS = ('recording_id', 'meeting_id', 'id')
+
+
+class WebhookRejected(Exception):
+    """The webhook request is refused before any processing; carries the HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def read_body(stream, content_length: Optional[int], max_bytes: int = WEBHOOK_MAX_BYTES) -> bytes:
+    """
+    Read the raw request body, refusing it as soon as it is known to be too large
+
+    A declared Content-Length over the limit is rejected without reading;
+    chunked bodies are read up to one byte past the limit.
+
+    Raises:
+        WebhookRejected: 413 if the body exceeds ``max_bytes``
+    """
+    if content_length is not None and content_length > max_bytes:
+        raise WebhookRejected(413, f"Body of {content_length} bytes exceeds the {max_bytes} byte limit")
+    body = stream.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        raise WebhookRejected(413, f"Body exceeds the {max_bytes} byte limit")
+    return body
+
+
+def sign(body: bytes, secret: str) -> str:
+    """HMAC-SHA256 signature of a raw body, as sent in the signature header"""
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    """Check a ``sha256=<hex>`` (or bare hex) signature against the raw body in constant time"""
+    if not signature:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    provided = signature.strip()
+    if provided.startswith('sha256='):
+        provided = provided[len('sha256='):]
+    return hmac.compare_digest(expected, provided.lower())
+
+
+def loads(body: bytes) -> Any:
+    """Decode JSON with orjson when it is installed, else the standard library"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def meeting_id(data: Dict[str, Any]) -> Optional[str]:
+    """The meeting's own ID from the payload (None if it has none)"""
+    for field in MEETING_ID_FIELDS:
+        value = data.get(field)
+        if value not in (None, ''):
+            return str(value)
+    return None
+
+
+def meeting_key(data: Dict[str, Any], body: bytes) -> str:
+    """Identity of the meeting a webhook describes (body hash if the payload has no ID)"""
+    for field in MEETING_ID_FIELDS:
+        value = data.get(field)
+        if value not in (None, ''):
+            return f"{field}:{value}"
+    return 'sha256:' + hashlib.sha256(body).hexdigest()
+
+
+class SeenSet:
+    """
+    Bounded set of recently seen keys with a time window
+
+    ``reserve`` atomically records a key and says whether it was new, so of
+    several concurrent deliveries of one meeting only the first proceeds. A
+    reservation that does not lead to an accepted job is undone with
+    ``forget`` so the sender's retry is not dropped. Keys expire after
+    ``ttl`` seconds and the oldest are evicted beyond ``max_size``.
+
+    Args:
+        ttl (float): Seconds a key is remembered
+        max_size (int): Maximum number of keys kept
+    """
+
+    def __init__(self, ttl: float = 86400, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.duplicates = 0
+        self._keys: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            # Insertion order is expiry order, so expired keys sit at the front
+            while self._keys and next(iter(self._keys.values())) <= now:
+                self._keys.popitem(last=False)
+            if key in self._keys:
+                self.duplicates += 1
+                return False
+            self._keys[key] = now + self.ttl
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+            return True
+
+    def forget(self, key: str):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._keys), 'duplicates': self.duplicates}
+
+
+def seen_set_from_env() -> SeenSet:
+    return SeenSet(
+        ttl=float(os.environ.get('WEBHOOK_DEDUPE_TTL', '86400')),
+        max_size=int(os.environ.get('WEBHOOK_DEDUPE_SIZE', '10000'))
+    )